@@ -0,0 +1,78 @@
+# -*- mode:python; coding:utf-8 -*-
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""OSCAL Exchange Protocol."""
+import logging
+import tarfile
+import zipfile
+
+logger = logging.getLogger(__name__)
+
+
+class BulkError(Exception):
+    """Bulk error."""
+
+
+def _read_zip(fileobj, max_size):
+    """Read json members of zip archive."""
+    documents = []
+    with zipfile.ZipFile(fileobj) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or not info.filename.endswith('.json'):
+                continue
+            if info.file_size > max_size:
+                raise BulkError(f'{info.filename} exceeds {max_size} bytes')
+            documents.append((info.filename, archive.read(info)))
+    return documents
+
+
+def _read_tar(fileobj, max_size):
+    """Read json members of (optionally compressed) tar archive."""
+    documents = []
+    with tarfile.open(fileobj=fileobj, mode='r:*') as archive:
+        for info in archive:
+            if not info.isfile() or not info.name.endswith('.json'):
+                continue
+            if info.size > max_size:
+                raise BulkError(f'{info.name} exceeds {max_size} bytes')
+            documents.append((info.name, archive.extractfile(info).read()))
+    return documents
+
+
+def _read_ndjson(fileobj, max_size):
+    """Read one json document per line."""
+    documents = []
+    for number, line in enumerate(iter(lambda: fileobj.readline(max_size + 1), b''), start=1):
+        if len(line) > max_size:
+            raise BulkError(f'line {number} exceeds {max_size} bytes')
+        if line.strip():
+            documents.append((f'line {number}', line))
+    return documents
+
+
+def read_documents(fileobj, max_size):
+    """Read (name, contents) documents from a zip, tar or ndjson file object."""
+    try:
+        if zipfile.is_zipfile(fileobj):
+            fileobj.seek(0)
+            return _read_zip(fileobj, max_size)
+        fileobj.seek(0)
+        try:
+            return _read_tar(fileobj, max_size)
+        except tarfile.ReadError:
+            pass
+        fileobj.seek(0)
+        return _read_ndjson(fileobj, max_size)
+    except (OSError, zipfile.BadZipFile, tarfile.TarError) as e:
+        raise BulkError(f'unreadable archive: {e}')
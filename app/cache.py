@@ -0,0 +1,207 @@
+# -*- mode:python; coding:utf-8 -*-
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""OSCAL Exchange Protocol."""
+import logging
+import threading
+from collections import OrderedDict
+from importlib import metadata
+
+logger = logging.getLogger(__name__)
+
+
+class ValidationCache():
+    """LRU cache of validated uploads keyed by content hash, model type and trestle version.
+
+    Only used from the event loop, so no locking is needed.
+    """
+
+    def __init__(self, logger, max_entries, max_bytes):
+        """Init."""
+        self.logger = logger
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.trestle_version = metadata.version('compliance-trestle')
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, oscal_path, digest):
+        """Get key for sha256 digest of upload."""
+        return (digest, oscal_path, self.trestle_version)
+
+    def get(self, key):
+        """Get validated entry, or None."""
+        validated = self.entries.get(key)
+        if validated is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return validated
+
+    def put(self, key, validated):
+        """Put validated entry, evicting least recently used as needed."""
+        size = len(validated.payload)
+        if size > self.max_bytes or self.max_entries < 1:
+            return
+        if key in self.entries:
+            self.bytes -= len(self.entries.pop(key).payload)
+        self.entries[key] = validated
+        self.bytes += size
+        while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.bytes -= len(evicted.payload)
+            self.evictions += 1
+
+    def stats(self):
+        """Get statistics."""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self.entries),
+            'bytes': self.bytes,
+            'max-entries': self.max_entries,
+            'max-bytes': self.max_bytes,
+            'trestle-version': self.trestle_version,
+        }
+
+
+class FragmentCache():
+    """LRU cache of the text of stored fragments keyed by digest, bounded in bytes.
+
+    Shared by the threads of the db pool, so locked. Fragments are content addressed, so entries never go stale.
+    """
+
+    def __init__(self, max_bytes):
+        """Init."""
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, digest):
+        """Get text of fragment, or None."""
+        with self.lock:
+            text = self.entries.get(digest)
+            if text is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.entries.move_to_end(digest)
+            return text
+
+    def put(self, digest, text):
+        """Put text of fragment, evicting least recently used as needed."""
+        size = len(text)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if digest in self.entries:
+                return
+            self.entries[digest] = text
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.bytes -= len(evicted)
+                self.evictions += 1
+
+    def stats(self):
+        """Get statistics."""
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'bytes': self.bytes,
+                'max-bytes': self.max_bytes,
+            }
+
+
+class DocumentCache():
+    """LRU cache of parsed stored documents keyed by (table, id), bounded in entries and in bytes of their payloads.
+
+    Shared by the threads of the db pool, so locked. Writes invalidate the documents they change, and a document
+    read before an invalidation is not cached after it, so entries never go stale.
+    """
+
+    def __init__(self, max_entries, max_bytes):
+        """Init."""
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # key -> (payload size, parsed document)
+        self.entries = OrderedDict()
+        self.bytes = 0
+        # count of invalidations, compared by put with the count when the document was read
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Get parsed document, or None."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, document, size, generation):
+        """Put parsed document of payload size, read at generation, evicting least recently used as needed."""
+        if size > self.max_bytes or self.max_entries < 1:
+            return
+        with self.lock:
+            if generation != self.generation:
+                return
+            if key in self.entries:
+                self.bytes -= self.entries.pop(key)[0]
+            self.entries[key] = (size, document)
+            self.bytes += size
+            while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+                _, (evicted, _) = self.entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def invalidate(self, keys):
+        """Invalidate documents."""
+        with self.lock:
+            self.generation += 1
+            for key in keys:
+                entry = self.entries.pop(key, None)
+                if entry is not None:
+                    self.bytes -= entry[0]
+
+    def stats(self):
+        """Get statistics."""
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'bytes': self.bytes,
+                'max-entries': self.max_entries,
+                'max-bytes': self.max_bytes,
+            }
@@ -0,0 +1,146 @@
+# -*- mode:python; coding:utf-8 -*-
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""OSCAL Exchange Protocol."""
+import functools
+import io
+import logging
+import re
+import zlib
+from collections import Counter
+
+try:
+    import zstandard
+except ImportError:  # optional, pip install oxp_demo[zstd]
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# codec tag of uncompressed rows, stored as NULL so rows written before compression remain readable
+identity = None
+
+codecs = ['zlib', 'zstd']
+
+# zlib uses at most the last 32 KiB of a preset dictionary
+zlib_dictionary_size = 32768
+
+# json text up to and including a structural character
+_fragment = re.compile(rb'[^,{}\[\]]{4,}[,{}\[\]]')
+
+
+class CodecError(Exception):
+    """Codec error."""
+
+
+def check(codec):
+    """Check codec is known and its module installed."""
+    if codec is identity:
+        return
+    if codec not in codecs:
+        raise CodecError(f'unknown codec {codec}, expected one of {", ".join(codecs)}')
+    if codec == 'zstd' and zstandard is None:
+        raise CodecError('codec zstd requires the zstandard package')
+
+
+def compress(payload, codec, level, dictionary=None):
+    """Compress str or bytes payload, optionally with a dictionary trained for the codec."""
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    if codec is identity:
+        return payload
+    if codec == 'zlib':
+        if dictionary is None:
+            return zlib.compress(payload, level)
+        compressor = zlib.compressobj(level, zdict=dictionary)
+        return compressor.compress(payload) + compressor.flush()
+    if codec == 'zstd':
+        dict_data = None if dictionary is None else _zstd_dictionary(dictionary, level)
+        return zstandard.ZstdCompressor(level=level, dict_data=dict_data).compress(payload)
+    raise CodecError(f'unknown codec {codec}')
+
+
+def decompress_reader(reader, codec, dictionary=None, chunk_size=1048576):
+    """Decompress data read incrementally from a file-like reader, yielding bytes of at most chunk size."""
+    if codec is identity:
+        for chunk in iter(functools.partial(reader.read, chunk_size), b''):
+            yield chunk
+    elif codec == 'zlib':
+        decompressor = zlib.decompressobj() if dictionary is None else zlib.decompressobj(zdict=dictionary)
+        for pending in iter(functools.partial(reader.read, chunk_size), b''):
+            while pending:
+                chunk = decompressor.decompress(pending, chunk_size)
+                pending = decompressor.unconsumed_tail
+                if chunk:
+                    yield chunk
+        chunk = decompressor.flush()
+        if chunk:
+            yield chunk
+    elif codec == 'zstd':
+        check(codec)
+        dict_data = None if dictionary is None else _zstd_dictionary(dictionary)
+        decompressor = zstandard.ZstdDecompressor(dict_data=dict_data)
+        yield from decompressor.read_to_iter(reader, read_size=chunk_size, write_size=chunk_size)
+    else:
+        raise CodecError(f'unknown codec {codec}')
+
+
+def decompress_chunks(data, codec, dictionary=None, chunk_size=1048576):
+    """Decompress data incrementally, yielding bytes of at most chunk size."""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    yield from decompress_reader(io.BytesIO(data), codec, dictionary, chunk_size)
+
+
+@functools.lru_cache(maxsize=16)
+def _zstd_dictionary(dictionary, level=None):
+    """Get zstd dictionary, precomputed for compression at level if given, shared since it is read only."""
+    dict_data = zstandard.ZstdCompressionDict(dictionary)
+    if level is not None:
+        dict_data.precompute_compress(level=level)
+    return dict_data
+
+
+def decompress(data, codec, dictionary=None):
+    """Decompress data as str."""
+    if codec is identity and isinstance(data, str):
+        return data
+    return b''.join(decompress_chunks(data, codec, dictionary)).decode('utf-8')
+
+
+def train(codec, samples, size):
+    """Train dictionary for codec on samples of payload bytes."""
+    if codec == 'zstd':
+        check(codec)
+        return zstandard.train_dictionary(size, samples).as_bytes()
+    if codec == 'zlib':
+        return _train_zlib(samples, min(size, zlib_dictionary_size))
+    raise CodecError(f'codec {codec} does not use a dictionary')
+
+
+def _train_zlib(samples, size):
+    """Train zlib preset dictionary from json fragments common to samples.
+
+    Fragments between structural characters are ranked by the bytes they would save across samples,
+    the most valuable are placed last since zlib references nearer bytes more cheaply.
+    """
+    counts = Counter()
+    for sample in samples:
+        counts.update(set(_fragment.findall(sample)))
+    ranked = sorted((count * len(fragment), fragment) for fragment, count in counts.items() if count > 1)
+    dictionary = b''
+    for _, fragment in reversed(ranked):
+        if len(dictionary) + len(fragment) > size:
+            continue
+        dictionary = fragment + dictionary
+    return dictionary
@@ -13,348 +13,811 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 """OSCAL Exchange Protocol."""
+import asyncio
+import contextlib
+import functools
+import json
 import logging
-import sqlite3 as db
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import DocumentCache
+
+import codec
 
 from fastapi import HTTPException
 
 from helper import helper
 
+import patch
+
+import projection
+
+from registry import dumps, models, search_fields
+
+from storage import Connections, MemoryEngine, Replica, ShardedEngine, SqliteEngine, get_engine
+
 logger = logging.getLogger(__name__)
 
+# fields of the full text search index, and their bm25 weights
+search_weights = {'ids': 10.0, 'titles': 5.0, 'text': 1.0}
+
+
+def search_expression(query):
+    """Get fts5 match expression of query, requiring each of its terms.
+
+    Terms are quoted, so ids like ac-2.1 match as the phrase of their tokens, and a term ending in * is a prefix.
+    """
+    terms = []
+    for term in query.split():
+        prefix = len(term) > 1 and term.endswith('*')
+        term = term[:-1] if prefix else term
+        terms.append('"' + term.replace('"', '""') + '"' + ('*' if prefix else ''))
+    return ' '.join(terms)
+
 
 class Db():
-    """Db."""
+    """Db, storing documents in the storage engine of app.yaml, and jobs, revisions and the search index in sqlite."""
 
     def __init__(self, logger):
         """Init."""
         self.logger = logger
-        self.con = db.connect('oscal.sqlite')
-        self._init_catalog()
-        self._init_profile()
-        self._init_component_definition()
-        self._init_system_security_plan()
-        self._init_assessment_plan()
-        self._init_assessment_results()
-        self._init_plan_of_action_and_milestones()
-
-    # TABLES
-
-    def _init_table(self, tname, qcol=None):
-        """Init table."""
-        con = self.con
-        with con:
-            cur = con.cursor()
-            query = f'SELECT name FROM sqlite_master WHERE type="table" AND name="{tname}";'  # noqa: S608
-            list_tables = cur.execute(query).fetchall()
-            if list_tables != []:
-                con.commit()
-                return
-            if qcol is None:
-                query = f'CREATE TABLE IF NOT EXISTS {tname} (id TEXT NOT NULL PRIMARY KEY, payload BLOB);'  # noqa: S608
+        self.engine = get_engine(logger, helper.get_db_engine())
+        # the job queue, revisions and search index are always in sqlite, sharing the connections of the sqlite engine
+        if isinstance(self.engine, SqliteEngine):
+            self.connections = self.engine.connections
+        elif isinstance(self.engine, ShardedEngine):
+            self.connections = self.engine.default.connections
+        else:
+            self.connections = Connections(helper.get_db_path())
+        # parsed documents, projections are read from
+        self.documents = DocumentCache(helper.get_document_cache_entries(), helper.get_document_cache_bytes())
+        for model in models.values():
+            self.engine.init_table(model.table, list(model.indexes))
+        self._init_jobs()
+        self._init_revisions()
+        self.search_index = helper.get_search_index()
+        self._init_search()
+        self.replica = None
+        if helper.get_db_replica_path():
+            if isinstance(self.engine, SqliteEngine):
+                self.replica = Replica(logger, self.engine)
             else:
-                query = f'CREATE TABLE IF NOT EXISTS {tname} (id TEXT NOT NULL PRIMARY KEY, payload BLOB, {qcol} TEXT);'  # noqa: S608
-            con.execute(query)
-
-    def _key_exists_table(
-        self,
-        tname,
-        oid,
-    ):
-        result = False
-        con = self.con
-        cur = con.cursor()
-        query = f'SELECT * FROM {tname} WHERE id=?;'  # noqa: S608
-        cur.execute(query, [oid])
-        rows = cur.fetchall()
-        if len(rows) == 1:
-            result = True
-        return result
-
-    def _add_table(self, tname, oid, payload, cname=None, cvalue=None):
-        """Add table."""
-        try:
-            con = self.con
-            cur = con.cursor()
-            if cname is None:
-                query = f'INSERT INTO {tname} (id, payload) VALUES (?, ?);'  # noqa: S608
-                cur.execute(query, [oid, payload])
-            else:
-                query = f'INSERT INTO {tname} (id, payload, {cname}) VALUES (?, ?, ?);'  # noqa: S608
-                cur.execute(query, [oid, payload, cvalue])
-            con.commit()
-            result = oid
-        except Exception:
-            raise HTTPException(status_code=400, detail=f'{oid} already exists')
+                self.logger.warning('db: replica requires the sqlite engine, replica reads are served by the primary')
+        self.logger.info(f'db: engine={helper.get_db_engine()}')
+
+    @property
+    def con(self):
+        """Get sqlite connection of the calling thread."""
+        return self.connections.get()
+
+    def close(self):
+        """Close engine, replica and connections."""
+        if self.replica is not None:
+            self.replica.close()
+        self.engine.close()
+        self.connections.close()
+
+    # REPLICA
+
+    def _reader(self, replica):
+        """Get engine to read from, the replica if asked for and configured."""
+        return self.replica.engine if replica and self.replica is not None else self.engine
+
+    def _written(self, keys):
+        """Record writes of (table, id) documents, which the replica lacks until its next refresh."""
+        self.documents.invalidate(keys)
+        if self.replica is not None:
+            self.replica.record(len(keys))
+
+    def replica_age(self, replica=True):
+        """Get seconds since the snapshot of the replica, if asked for and configured, else None."""
+        return self.replica.age() if replica and self.replica is not None else None
+
+    def refresh_replica(self):
+        """Refresh the replica."""
+        self.replica.refresh()
+
+    # DOCUMENTS
+
+    def add(self, oscal_path, oid, payload, columns=None, props=None, summary=None):
+        """Add document."""
+        table = models[oscal_path].table
+        result = self.engine.add(table, oid, payload, columns, props, summary)
+        if result is not None:
+            self._index([(table, oid, payload)])
+            self._written([(table, oid)])
         return result
 
-    def _replace_table(self, tname, oid, payload):
-        """Replace table."""
-        result = None
-        try:
-            if self._key_exists_table(tname, oid):
-                con = self.con
-                cur = con.cursor()
-                query = f'REPLACE INTO {tname} (id, payload) VALUES (?, ?);'  # noqa: S608
-                cur.execute(query, [oid, payload])
-                con.commit()
-                result = oid
-        except Exception:
-            raise HTTPException(status_code=400, detail=f'{oid} unable to replace')
-        return result
+    def replace(self, oscal_path, oid, payload, columns=None, props=None, summary=None, expected=None):
+        """Replace document, keeping the replaced version as a revision.
 
-    def _delete_table(self, tname, oid):
-        """Delete table."""
-        result = None
-        try:
-            if self._key_exists_table(tname, oid):
-                con = self.con
-                cur = con.cursor()
-                query = f'DELETE FROM {tname} WHERE id=?;'  # noqa: S608
-                cur.execute(query, [oid])
-                con.commit()
-                result = oid
-        except Exception:
-            raise HTTPException(status_code=400, detail=f'{oid} unable to delete')
+        If expected is given, the document is replaced only if it still is expected, else HTTPException 409 is raised.
+        """
+        table = models[oscal_path].table
+        result = self._write_revision(self.engine.replace, table, oid, payload, columns, props, summary, expected)
+        if result is not None:
+            self._index([(table, oid, payload)])
+            self._written([(table, oid)])
         return result
 
-    def _get_table(self, tname, oid):
-        """Get table."""
-        result = None
-        try:
-            con = self.con
-            cur = con.cursor()
-            query = f'SELECT * FROM {tname} WHERE id=?;'  # noqa: S608
-            cur.execute(query, [oid])
-            rows = cur.fetchall()
-            if len(rows) == 1:
-                result = rows[0][1]
-        except Exception:
-            raise HTTPException(status_code=400, detail=f'{oid} unable to get')
+    def upsert(self, oscal_path, oid, payload, columns=None, props=None, summary=None):
+        """Add document, or replace it if it exists keeping the replaced version as a revision."""
+        table = models[oscal_path].table
+        result = self._write_revision(self.engine.upsert, table, oid, payload, columns, props, summary)
+        self._index([(table, oid, payload)])
+        self._written([(table, oid)])
         return result
 
-    def _get_table_id_list(self, tname):
-        """Get table ids."""
-        result = []
-        try:
-            con = self.con
-            cur = con.cursor()
-            query = f'SELECT * FROM {tname};'  # noqa: S608
-            cur.execute(query)
-            rows = cur.fetchall()
-            for row in rows:
-                result.append(row[0])
-        except Exception:
-            raise HTTPException(status_code=400, detail='unable to produce list')
+    def get(self, oscal_path, oid):
+        """Get document."""
+        return self.engine.get(models[oscal_path].table, oid)
+
+    def delete(self, oscal_path, oid):
+        """Delete document and its revisions."""
+        table = models[oscal_path].table
+        with self._revision_guard(table, oid):
+            result = self.engine.delete(table, oid)
+            if result is not None:
+                with self._revision_con(table, oid) as con:
+                    con.execute('DELETE FROM REVISIONS WHERE table_name=? AND doc_id=?;', [table, oid])
+                with self.con as con:
+                    self._unindex(con, table, oid)
+                self._written([(table, oid)])
         return result
 
-    def _get_table_id_list_str(self, tname):
-        """Get table ids as string."""
-        return str(self._get_table_id_list(tname))
-
-    def _get_table_by_column(self, tname, cname, cvalue):
-        """Get table."""
-        result = []
-        try:
-            con = self.con
-            cur = con.cursor()
-            query = f'SELECT * FROM {tname} WHERE {cname}=?;'  # noqa: S608
-            cur.execute(query, [cvalue])
-            rows = cur.fetchall()
-            for row in rows:
-                result.append(row[1])
-        except Exception:
-            raise HTTPException(status_code=400, detail=f'{tname} unable to get {cname} == {cvalue}')
+    def get_stream(self, oscal_path, oid, chunk_size, replica=False):
+        """Get (size, Stream) of document bytes in chunks, or None if not found."""
+        return self._reader(replica).get_stream(models[oscal_path].table, oid, chunk_size)
+
+    def get_projection(self, oscal_path, oid, steps, replica=False):
+        """Get json array of the values at projection steps of document, or None if not found.
+
+        Documents of the primary are parsed once and kept in the document cache, so a projection costs the walk to
+        its values. Documents of the replica are parsed on each read.
+        """
+        table = models[oscal_path].table
+        if replica and self.replica is not None:
+            payload = self.replica.engine.get(table, oid)
+            document = None if payload is None else json.loads(payload)
+        else:
+            document = self._parsed(table, oid)
+        if document is None:
+            return None
+        values = projection.select(document, steps)
+        return dumps(values).encode('utf-8')
+
+    def _parsed(self, table, oid):
+        """Get parsed document, from the document cache or else read and cached, or None if not found."""
+        key = (table, oid)
+        document = self.documents.get(key)
+        if document is None:
+            generation = self.documents.generation
+            payload = self.engine.get(table, oid)
+            if payload is None:
+                return None
+            document = json.loads(payload)
+            self.documents.put(key, document, len(payload), generation)
+        return document
+
+    def get_id_list(self, oscal_path, limit=None, cursor=None, order='id', replica=False):
+        """Get page of document ids and the cursor of the next page, if any."""
+        ids, next_cursor = self._reader(replica).get_id_list(models[oscal_path].table, limit, cursor, order)
+        return {'ids': ids, 'next-cursor': next_cursor}
+
+    def list_summaries(
+        self, oscal_path, filters=None, sort='id', descending=False, limit=None, cursor=None, replica=False
+    ):
+        """Get page of document summaries and the cursor of the next page, if any."""
+        table = models[oscal_path].table
+        engine = self._reader(replica)
+        summaries, next_cursor = engine.list_summaries(table, filters, sort, descending, limit, cursor)
+        return {'summaries': summaries, 'next-cursor': next_cursor}
+
+    def add_documents(self, documents):
+        """Add (oscal_path, oid, payload, columns, props, summary) documents, in one transaction where supported."""
+        rows = [(models[oscal_path].table, *document) for oscal_path, *document in documents]
+        result = self.engine.add_many(rows)
+        added = [(table, oid, payload) for (table, oid, payload, *_), error in zip(rows, result) if error is None]
+        self._index(added)
+        self._written([(table, oid) for table, oid, _ in added])
         return result
 
-    # CATALOGS
-
-    def _init_catalog(self):
-        """Init catalog."""
-        self._init_table('CATALOGS')
-
-    def add_catalog(self, oid, payload):
-        """Add catalog."""
-        return self._add_table('CATALOGS', oid, payload)
-
-    def replace_catalog(self, oid, payload):
-        """Replace catalog."""
-        return self._replace_table('CATALOGS', oid, payload)
-
-    def get_catalog(self, oid):
-        """Get catalog."""
-        return self._get_table('CATALOGS', oid)
-
-    def delete_catalog(self, oid):
-        """Delete catalog."""
-        return self._delete_table('CATALOGS', oid)
-
-    def get_catalog_id_list(self):
-        """Get catalog ids."""
-        return self._get_table_id_list_str('CATALOGS')
-
-    # PROFILES
-
-    def _init_profile(self):
-        """Init profile."""
-        self._init_table('PROFILES', helper.get_profile_mnemonic())
-
-    def add_profile(self, oid, payload, profile_mnemonic):
-        """Add profile."""
-        return self._add_table('PROFILES', oid, payload, cname=helper.get_profile_mnemonic(), cvalue=profile_mnemonic)
-
-    def replace_profile(self, oid, payload):
-        """Replace profile."""
-        return self._replace_table('PROFILES', oid, payload)
-
-    def get_profile(self, oid):
-        """Get profile."""
-        return self._get_table('PROFILES', oid)
-
-    def delete_profile(self, oid):
-        """Delete profile."""
-        return self._delete_table('PROFILES', oid)
+    def find_by_prop(self, oscal_path, name, value, ns=None):
+        """Get ids of documents with a metadata prop of name and value, and of namespace ns if given."""
+        return self.engine.find_by_prop(models[oscal_path].table, name, value, ns)
 
-    def get_profile_id_list(self):
-        """Get profile ids."""
-        return self._get_table_id_list_str('PROFILES')
+    def train_dictionary(self):
+        """Train compression dictionary of the engine."""
+        return self.engine.train_dictionary()
 
-    # COMPONENT DEFINITIONS
+    def fragment_stats(self):
+        """Get fragment statistics of the engine."""
+        return self.engine.fragment_stats()
 
-    def _init_component_definition(self):
-        """Init component_definition."""
-        self._init_table('COMPONENT_DEFINITIONS')
+    # JOBS
 
-    def add_component_definition(self, oid, payload):
-        """Add component_definition."""
-        return self._add_table('COMPONENT_DEFINITIONS', oid, payload)
+    def _init_jobs(self):
+        """Init jobs.
 
-    def replace_component_definition(self, oid, payload):
-        """Replace component_definition."""
-        return self._replace_table('COMPONENT_DEFINITIONS', oid, payload)
-
-    def get_component_definition(self, oid):
-        """Get component_definition."""
-        return self._get_table('COMPONENT_DEFINITIONS', oid)
-
-    def delete_component_definition(self, oid):
-        """Delete component_definition."""
-        return self._delete_table('COMPONENT_DEFINITIONS', oid)
-
-    def get_component_definition_id_list(self):
-        """Get component_definition ids."""
-        return self._get_table_id_list_str('COMPONENT_DEFINITIONS')
+        A claimed job is leased to the process claiming it, which renews the lease while it runs. Jobs whose lease
+        expired, as their process stopped, are queued again, jobs of live processes sharing the db are left to them.
+        """
+        con = self.con
+        with con:
+            query = (
+                'CREATE TABLE IF NOT EXISTS JOBS (id TEXT NOT NULL PRIMARY KEY, oscal_path TEXT, digest TEXT, '
+                'payload BLOB, status TEXT, uuid TEXT, error TEXT, created REAL, updated REAL, owner TEXT, lease REAL);'
+            )
+            con.execute(query)
+            # tables created before leases get owner and lease columns, their jobs have expired leases
+            names = [row[1] for row in con.execute('PRAGMA table_info(JOBS);')]
+            for cname, ctype in [('owner', 'TEXT'), ('lease', 'REAL')]:
+                if cname not in names:
+                    con.execute(f'ALTER TABLE JOBS ADD COLUMN {cname} {ctype};')
+            con.execute('CREATE INDEX IF NOT EXISTS JOBS_STATUS ON JOBS (status, created);')
+
+    def add_job(self, job_id, oscal_path, digest, payload):
+        """Add queued job."""
+        con = self.con
+        try:
+            now = time.time()
+            query = (
+                'INSERT INTO JOBS (id, oscal_path, digest, payload, status, created, updated) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?);'
+            )
+            con.execute(query, [job_id, oscal_path, digest, payload, 'queued', now, now])
+            con.commit()
+        except Exception:
+            con.rollback()
+            raise HTTPException(status_code=400, detail=f'{job_id} unable to queue')
+        return job_id
 
-    # SYSTEM SECURITY PLANS
+    def claim_job(self, owner, lease):
+        """Claim oldest queued job for owner, leased for lease seconds, returning (id, oscal_path, digest, payload) or None."""
+        con = self.con
+        while True:
+            query = 'SELECT id, oscal_path, digest, payload FROM JOBS WHERE status=? ORDER BY created LIMIT 1;'
+            row = con.execute(query, ['queued']).fetchone()
+            if row is None:
+                return None
+            # claimed unless another job worker claimed it first
+            with con:
+                now = time.time()
+                query = 'UPDATE JOBS SET status=?, owner=?, lease=?, updated=? WHERE id=? AND status=?;'
+                claimed = con.execute(query, ['validating', owner, now + lease, now, row[0], 'queued']).rowcount
+            if claimed:
+                return row
+
+    def update_job(self, job_id, status, uuid=None, error=None, owner=None):
+        """Update job status, of owner if given, dropping the upload once the job is finished or its lease once queued.
+
+        Returns whether the job was updated, which it is not once the lease of owner expired.
+        """
+        con = self.con
+        with con:
+            if status in ['done', 'failed']:
+                query = 'UPDATE JOBS SET status=?, uuid=?, error=?, updated=?, payload=NULL'
+            elif status == 'queued':
+                query = 'UPDATE JOBS SET status=?, uuid=?, error=?, updated=?, owner=NULL, lease=NULL'
+            else:
+                query = 'UPDATE JOBS SET status=?, uuid=?, error=?, updated=?'
+            query += ' WHERE id=? AND (? IS NULL OR owner=?);'
+            return con.execute(query, [status, uuid, error, time.time(), job_id, owner, owner]).rowcount == 1
 
-    def _init_system_security_plan(self):
-        """Init system_security_plan."""
-        self._init_table('SYSTEM_SECURITY_PLANS')
+    def renew_jobs(self, owner, lease):
+        """Renew for lease seconds the leases of the jobs owner runs, returning their number."""
+        con = self.con
+        with con:
+            query = 'UPDATE JOBS SET lease=? WHERE owner=? AND status IN (?, ?);'
+            return con.execute(query, [time.time() + lease, owner, 'validating', 'storing']).rowcount
 
-    def add_system_security_plan(self, oid, payload):
-        """Add system_security_plan."""
-        return self._add_table('SYSTEM_SECURITY_PLANS', oid, payload)
+    def requeue_jobs(self):
+        """Requeue jobs whose lease expired, as the process running them stopped."""
+        con = self.con
+        with con:
+            query = (
+                'UPDATE JOBS SET status=?, owner=NULL, lease=NULL WHERE status IN (?, ?) '
+                'AND (lease IS NULL OR lease<?);'
+            )
+            count = con.execute(query, ['queued', 'validating', 'storing', time.time()]).rowcount
+        return count
+
+    def get_job(self, job_id):
+        """Get job status."""
+        con = self.con
+        query = 'SELECT id, oscal_path, status, uuid, error, created, updated FROM JOBS WHERE id=?;'
+        row = con.execute(query, [job_id]).fetchone()
+        if row is None:
+            return None
+        keys = ['id', 'type', 'status', 'uuid', 'error', 'created', 'updated']
+        return dict(zip(keys, row))
+
+    # REVISIONS
+
+    def _init_revisions(self):
+        """Init revisions.
+
+        Revision n of a document is the version it had before its nth replace, the current version is the one after
+        the latest. Each is stored as a reverse delta, the json patch from the next version back to it, except
+        every revision-snapshot-interval-th which is stored whole. So a version is rebuilt from the nearest later
+        snapshot, or the current version, applying at most interval - 1 deltas.
+        """
+        query = (
+            'CREATE TABLE IF NOT EXISTS REVISIONS (table_name TEXT NOT NULL, doc_id TEXT NOT NULL, '
+            'revision INTEGER NOT NULL, kind TEXT, codec TEXT, payload BLOB, replaced REAL, '
+            'PRIMARY KEY (table_name, doc_id, revision));'
+        )
+        # with the sharded engine revisions are kept in the file of their document
+        files = self.engine.file_engines() if isinstance(self.engine, ShardedEngine) else [self]
+        for file in files:
+            with file.con as con:
+                con.execute(query)
+        if isinstance(self.engine, ShardedEngine):
+            self._move_revisions()
+        compression = helper.get_db_compression()
+        self.revision_codec = codec.identity if compression == 'none' else compression
+        codec.check(self.revision_codec)
+        self.revision_level = helper.get_db_compression_level()
+        self.revision_interval = max(1, helper.get_revision_snapshot_interval())
+        # with the sqlite engines a document and its revision are written in one transaction, which orders replaces
+        # across processes too, other engines write documents apart so their replaces are ordered in process
+        self.revision_locks = None
+        if not isinstance(self.engine, (SqliteEngine, ShardedEngine)):
+            self.revision_locks = [threading.Lock() for _ in range(64)]
+
+    def _revision_con(self, table, oid):
+        """Get connection of the file revisions of document are kept in, that of the document with sqlite engines."""
+        if isinstance(self.engine, ShardedEngine):
+            return self.engine.document_engine(table, oid).con
+        return self.con
+
+    def _move_revisions(self):
+        """Move revisions of tables split into files kept in db-path, by a previous version, to their documents."""
+        con = self.con
+        query = 'SELECT doc_id, revision, kind, codec, payload, replaced FROM REVISIONS WHERE table_name=?;'
+        insert = (
+            'INSERT OR IGNORE INTO REVISIONS (table_name, doc_id, revision, kind, codec, payload, replaced) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?);'
+        )
+        for table in self.engine.shards:
+            written = set()
+            for oid, *row in con.execute(query, [table]):
+                target = self._revision_con(table, oid)
+                target.execute(insert, [table, oid, *row])
+                written.add(target)
+            for target in written:
+                target.commit()
+            if written:
+                with con:
+                    con.execute('DELETE FROM REVISIONS WHERE table_name=?;', [table])
+                self.logger.info(f'db: revisions of {table} moved to the files of its documents')
+
+    def _revision_guard(self, table, oid):
+        """Get context ordering the revisions of document, a lock unless the engine writes them with the document."""
+        if self.revision_locks is None:
+            return contextlib.nullcontext()
+        return self.revision_locks[hash((table, oid)) % len(self.revision_locks)]
+
+    def _latest_revision(self, con, table, oid):
+        """Get latest revision number of document, 0 if none."""
+        query = 'SELECT MAX(revision) FROM REVISIONS WHERE table_name=? AND doc_id=?;'
+        return con.execute(query, [table, oid]).fetchone()[0] or 0
+
+    def _write_revision(self, write, table, oid, payload, columns, props, summary, expected=None):
+        """Write document by engine replace or upsert, adding the version it replaces as its next revision.
+
+        The engine hands over the replaced version within its write, on the connection revisions are written by if
+        it is a sqlite engine, so the document and its revision are committed together.
+        """
+
+        def keep(old):
+            if expected is not None and old != expected:
+                raise HTTPException(status_code=409, detail=f'{oid} changed while being patched, retry')
+            self._add_revision(con, table, oid, old, payload)
+
+        con = self._revision_con(table, oid)
+        with self._revision_guard(table, oid):
+            try:
+                result = write(table, oid, payload, columns, props, summary, keep)
+                # the revision of engines writing apart from sqlite, committed by the engine otherwise
+                con.commit()
+            except Exception:
+                con.rollback()
+                raise
+        return result
 
-    def replace_system_security_plan(self, oid, payload):
-        """Replace system_security_plan."""
-        return self._replace_table('SYSTEM_SECURITY_PLANS', oid, payload)
+    def _add_revision(self, con, table, oid, old, new):
+        """Add old version of document, replaced by new, as its next revision, leaving the transaction open."""
+        revision = self._latest_revision(con, table, oid) + 1
+        if revision % self.revision_interval == 0:
+            kind, data = 'snapshot', old
+        else:
+            kind, data = 'delta', json.dumps(patch.diff(json.loads(new), json.loads(old)))
+        data = codec.compress(data, self.revision_codec, self.revision_level)
+        query = (
+            'INSERT INTO REVISIONS (table_name, doc_id, revision, kind, codec, payload, replaced) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?);'
+        )
+        con.execute(query, [table, oid, revision, kind, self.revision_codec, data, time.time()])
+
+    def get_revision_list(self, oscal_path, oid):
+        """Get revisions of document, oldest first and ending with the current version, or None if not found."""
+        table = models[oscal_path].table
+        query = 'SELECT revision, replaced FROM REVISIONS WHERE table_name=? AND doc_id=? ORDER BY revision;'
+        rows = self._revision_con(table, oid).execute(query, [table, oid]).fetchall()
+        result = [{'revision': revision, 'replaced': replaced} for revision, replaced in rows]
+        if not result and self.engine.get(table, oid) is None:
+            return None
+        result.append({'revision': len(result) + 1, 'replaced': None})
+        return result
 
-    def get_system_security_plan(self, oid):
-        """Get system_security_plan."""
-        return self._get_table('SYSTEM_SECURITY_PLANS', oid)
+    def _read_deltas(self, con, table, oid, revision):
+        """Get (deltas from revision up to the nearest snapshot, the snapshot or None if there is none)."""
+        query = (
+            'SELECT kind, codec, payload FROM REVISIONS WHERE table_name=? AND doc_id=? AND revision>=? '
+            'ORDER BY revision;'
+        )
+        deltas = []
+        for kind, codec_tag, data in con.execute(query, [table, oid, revision]):
+            data = codec.decompress(data, codec_tag)
+            if kind == 'snapshot':
+                return deltas, data
+            deltas.append(json.loads(data))
+        return deltas, None
+
+    def get_revision(self, oscal_path, oid, revision):
+        """Get version of document at revision, or None if not found."""
+        table = models[oscal_path].table
+        con = self._revision_con(table, oid)
+        # read in one read transaction, so a replace cannot add a revision between the deltas and the current version
+        with self._revision_guard(table, oid):
+            con.execute('BEGIN;')
+            try:
+                latest = self._latest_revision(con, table, oid)
+                if revision == latest + 1:
+                    return self.engine.get(table, oid)
+                if revision < 1 or revision > latest:
+                    return None
+                deltas, base = self._read_deltas(con, table, oid, revision)
+                if base is None:
+                    base = self.engine.get(table, oid)
+            finally:
+                con.rollback()
+        if not deltas:
+            return base
+        doc = json.loads(base)
+        for ops in reversed(deltas):
+            doc = patch.apply(doc, ops, in_place=True)
+        return dumps(doc)
+
+    # SEARCH
+
+    def _init_search(self):
+        """Init full text search index of the ids, titles and text of documents, filling it in bulk if new.
+
+        Documents of the memory engine do not outlive the process, so with it the index is emptied on each start. With
+        search-index off the index is dropped, so it is filled anew from the documents once turned back on.
+        """
+        con = self.con
+        if not self.search_index:
+            with con:
+                con.execute('DROP TABLE IF EXISTS SEARCH;')
+                con.execute('DROP TABLE IF EXISTS SEARCH_DOCUMENTS;')
+            self.logger.info('db: search index off')
+            return
+        with con:
+            query = 'SELECT name FROM sqlite_master WHERE type=? AND name=?;'
+            exists = con.execute(query, ['table', 'SEARCH']).fetchone() is not None
+            # maps the rowids of the index to documents
+            query = (
+                'CREATE TABLE IF NOT EXISTS SEARCH_DOCUMENTS (id INTEGER PRIMARY KEY, table_name TEXT NOT NULL, '
+                'doc_id TEXT NOT NULL, UNIQUE (table_name, doc_id));'
+            )
+            con.execute(query)
+            fields = ', '.join(search_weights)
+            query = (
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS SEARCH USING fts5({fields}, '
+                "tokenize='unicode61 remove_diacritics 2');"
+            )
+            con.execute(query)
+            if not exists:
+                weights = ', '.join(str(weight) for weight in search_weights.values())
+                con.execute('INSERT INTO SEARCH (SEARCH, rank) VALUES (?, ?);', ['rank', f'bm25({weights})'])
+            elif isinstance(self.engine, MemoryEngine):
+                con.execute('DELETE FROM SEARCH;')
+                con.execute('DELETE FROM SEARCH_DOCUMENTS;')
+        if not exists and not isinstance(self.engine, MemoryEngine):
+            self._backfill_search()
+
+    def _backfill_search(self):
+        """Fill new search index from the stored documents, in one transaction."""
+        con = self.con
+        count = 0
+        try:
+            for model in models.values():
+                cursor = None
+                while True:
+                    oids, cursor = self.engine.get_id_list(model.table, helper.get_id_list_max_limit(), cursor)
+                    for oid in oids:
+                        payload = self.engine.get(model.table, oid)
+                        if payload is not None:
+                            self._index_document(con, model.table, oid, payload)
+                            count += 1
+                    if cursor is None:
+                        break
+            con.commit()
+        except Exception:
+            con.rollback()
+            raise
+        self.logger.info(f'db: {count} documents indexed for search')
+
+    def _unindex(self, con, table, oid):
+        """Remove document from search index, if on."""
+        if not self.search_index:
+            return
+        query = 'SELECT id FROM SEARCH_DOCUMENTS WHERE table_name=? AND doc_id=?;'
+        row = con.execute(query, [table, oid]).fetchone()
+        if row is not None:
+            con.execute('DELETE FROM SEARCH WHERE rowid=?;', row)
+            con.execute('DELETE FROM SEARCH_DOCUMENTS WHERE id=?;', row)
+
+    def _index_document(self, con, table, oid, payload):
+        """Add document to search index, within the transaction of the caller."""
+        fields = search_fields(json.loads(payload))
+        query = 'INSERT INTO SEARCH_DOCUMENTS (table_name, doc_id) VALUES (?, ?);'
+        rowid = con.execute(query, [table, oid]).lastrowid
+        query = f'INSERT INTO SEARCH (rowid, {", ".join(fields)}) VALUES (?, ?, ?, ?);'  # noqa: S608
+        con.execute(query, [rowid] + ['\n'.join(values) for values in fields.values()])
+
+    def _index(self, documents):
+        """Index (table, oid, payload) documents for search, if on, in one transaction, replacing previous entries."""
+        if not documents or not self.search_index:
+            return
+        con = self.con
+        try:
+            for table, oid, payload in documents:
+                self._unindex(con, table, oid)
+                self._index_document(con, table, oid, payload)
+            con.commit()
+        except Exception:
+            con.rollback()
+            # the documents themselves are stored, only their search entries are missing
+            self.logger.exception(f'{len(documents)} documents unable to index for search')
+
+    def search(self, query, oscal_path=None, limit=None):
+        """Get documents matching all terms of query, of model type if given, best first, with a snippet of a match."""
+        if not self.search_index:
+            raise HTTPException(status_code=501, detail='search index is off')
+        expression = search_expression(query)
+        if not expression:
+            return []
+        sql = (
+            "SELECT d.table_name, d.doc_id, rank, snippet(SEARCH, -1, '<mark>', '</mark>', '...', 16) "
+            'FROM SEARCH JOIN SEARCH_DOCUMENTS d ON d.id = SEARCH.rowid WHERE SEARCH MATCH ?'
+        )
+        parameters = [expression]
+        if oscal_path is not None:
+            sql += ' AND d.table_name=?'
+            parameters.append(models[oscal_path].table)
+        sql += ' ORDER BY rank LIMIT ?;'
+        parameters.append(-1 if limit is None else limit)
+        try:
+            rows = self.con.execute(sql, parameters).fetchall()
+        except Exception:
+            raise HTTPException(status_code=400, detail=f'unable to search {query}')
+        oscal_paths = {model.table: model.oscal_path for model in models.values()}
+        return [
+            {'type': oscal_paths[table], 'uuid': oid, 'rank': rank, 'snippet': snippet}
+            for table, oid, rank, snippet in rows
+        ]
 
-    def delete_system_security_plan(self, oid):
-        """Delete system_security_plan."""
-        return self._delete_table('SYSTEM_SECURITY_PLANS', oid)
+    # SEARCH PROFILES
 
-    def get_system_security_plan_id_list(self):
-        """Get system_security_plan ids."""
-        return self._get_table_id_list_str('SYSTEM_SECURITY_PLANS')
+    def search_profiles(self, profile_mnemonic):
+        """Search profiles."""
+        # the mnemonic column holds the value of the mnemonic prop, so the indexed props are searched instead
+        table = models['profile'].table
+        name = helper.get_profile_mnemonic()
+        oids = self.engine.find_by_prop(table, name, profile_mnemonic)
+        result = [payload for payload in (self.engine.get(table, oid) for oid in oids) if payload is not None]
+        return result
 
-    # ASSESSMENT PLAN
 
-    def _init_assessment_plan(self):
-        """Init assessment_plan."""
-        self._init_table('ASSESSMENT_PLANS')
+class AsyncDb():
+    """Awaitable Db, running each call on a dedicated thread pool.
 
-    def add_assessment_plan(self, oid, payload):
-        """Add assessment_plan."""
-        return self._add_table('ASSESSMENT_PLANS', oid, payload)
+    Storage I/O then neither blocks the event loop nor queues behind other I/O. Each pool thread keeps its own sqlite
+    connection, and with it its cache of prepared statements.
+    """
 
-    def replace_assessment_plan(self, oid, payload):
-        """Replace assessment_plan."""
-        return self._replace_table('ASSESSMENT_PLANS', oid, payload)
+    def __init__(self, logger, threads, queue_depth):
+        """Init."""
+        self.logger = logger
+        self.queue_depth = queue_depth
+        self.pending = 0
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='oxp-db')
+        self.db = None
+        self.replicator = None
+        self.replica_due = None
+        self.logger.info(f'db: threads={threads} queue-depth={queue_depth}')
+
+    async def _run(self, func, *args, **kwargs):
+        """Run function on the pool, bounded by queue depth."""
+        if self.pending >= self.queue_depth:
+            raise HTTPException(status_code=503, detail='db queue full, retry later')
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+        finally:
+            self.pending -= 1
+
+    async def _write(self, func, *args):
+        """Run write on the pool, waking the replicator once writes make a refresh of the replica due."""
+        result = await self._run(func, *args)
+        if self.db.replica is not None and self.db.replica.due():
+            self.replica_due.set()
+        return result
 
-    def get_assessment_plan(self, oid):
-        """Get assessment_plan."""
-        return self._get_table('ASSESSMENT_PLANS', oid)
+    async def connect(self):
+        """Open db, creating its tables, and start refreshing the replica if configured."""
+        self.db = await self._run(Db, self.logger)
+        if self.db.replica is not None:
+            self.replica_due = asyncio.Event()
+            self.replicator = asyncio.create_task(self._replicate())
+
+    async def close(self):
+        """Stop refreshing the replica, close db and shutdown the pool."""
+        if self.replicator is not None:
+            self.replicator.cancel()
+            await asyncio.gather(self.replicator, return_exceptions=True)
+        if self.db is not None:
+            await self._run(self.db.close)
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    async def _replicate(self):
+        """Refresh the replica every interval, or sooner once writes make it due, until cancelled."""
+        interval = self.db.replica.interval or None
+        while True:
+            try:
+                await asyncio.wait_for(self.replica_due.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            self.replica_due.clear()
+            try:
+                await self._run(self.db.refresh_replica)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.logger.exception('db: replica refresh failed')
+
+    def replica_age(self, replica=True):
+        """Get seconds since the snapshot of the replica, if asked for and configured, else None."""
+        return self.db.replica_age(replica)
+
+    def document_cache_stats(self):
+        """Get document cache statistics."""
+        return self.db.documents.stats()
+
+    # DOCUMENTS
+
+    async def add(self, oscal_path, oid, payload, columns=None, props=None, summary=None):
+        """Add document."""
+        return await self._write(self.db.add, oscal_path, oid, payload, columns, props, summary)
+
+    async def replace(self, oscal_path, oid, payload, columns=None, props=None, summary=None, expected=None):
+        """Replace document, keeping the replaced version as a revision."""
+        return await self._write(self.db.replace, oscal_path, oid, payload, columns, props, summary, expected)
+
+    async def upsert(self, oscal_path, oid, payload, columns=None, props=None, summary=None):
+        """Add document, or replace it if it exists."""
+        return await self._write(self.db.upsert, oscal_path, oid, payload, columns, props, summary)
+
+    async def get(self, oscal_path, oid):
+        """Get document."""
+        return await self._run(self.db.get, oscal_path, oid)
+
+    async def delete(self, oscal_path, oid):
+        """Delete document and its revisions."""
+        return await self._write(self.db.delete, oscal_path, oid)
+
+    async def get_stream(self, oscal_path, oid, chunk_size, replica=False):
+        """Get (size, async iterator of chunks) of document, or None if not found, each chunk read on the pool."""
+        opened = await self._run(self.db.get_stream, oscal_path, oid, chunk_size, replica)
+        if opened is None:
+            return None
+        size, stream = opened
+        return size, self._iterate(stream)
+
+    async def _iterate(self, stream):
+        """Iterate stream on the pool, closing it once done or abandoned by the client."""
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                chunk = await loop.run_in_executor(self.executor, next, stream, None)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            # closing is quick, and awaiting in a cancelled stream would not run
+            stream.close()
+
+    async def get_projection(self, oscal_path, oid, steps, replica=False):
+        """Get json array of the values at projection steps of document."""
+        return await self._run(self.db.get_projection, oscal_path, oid, steps, replica)
+
+    async def get_id_list(self, oscal_path, limit=None, cursor=None, order='id', replica=False):
+        """Get page of document ids and the cursor of the next page, if any."""
+        return await self._run(self.db.get_id_list, oscal_path, limit, cursor, order, replica)
+
+    async def list_summaries(
+        self, oscal_path, filters=None, sort='id', descending=False, limit=None, cursor=None, replica=False
+    ):
+        """Get page of document summaries and the cursor of the next page, if any."""
+        return await self._run(self.db.list_summaries, oscal_path, filters, sort, descending, limit, cursor, replica)
 
-    def delete_assessment_plan(self, oid):
-        """Delete assessment_plan."""
-        return self._delete_table('ASSESSMENT_PLANS', oid)
+    async def add_documents(self, documents):
+        """Add (oscal_path, oid, payload, columns, props, summary) documents in one transaction."""
+        return await self._write(self.db.add_documents, documents)
 
-    def get_assessment_plan_id_list(self):
-        """Get assessment_plan ids."""
-        return self._get_table_id_list_str('ASSESSMENT_PLANS')
+    async def find_by_prop(self, oscal_path, name, value, ns=None):
+        """Get ids of documents by metadata prop."""
+        return await self._run(self.db.find_by_prop, oscal_path, name, value, ns)
 
-    # ASSESSMENT RESULTS
+    async def train_dictionary(self):
+        """Train compression dictionary."""
+        return await self._run(self.db.train_dictionary)
 
-    def _init_assessment_results(self):
-        """Init assessment_results."""
-        self._init_table('ASSESSMENT_RESULTS')
+    async def fragment_stats(self):
+        """Get fragment statistics."""
+        return await self._run(self.db.fragment_stats)
 
-    def add_assessment_results(self, oid, payload):
-        """Add assessment_results."""
-        return self._add_table('ASSESSMENT_RESULTS', oid, payload)
+    # JOBS
 
-    def replace_assessment_results(self, oid, payload):
-        """Replace assessment_results."""
-        return self._replace_table('ASSESSMENT_RESULTS', oid, payload)
+    async def add_job(self, job_id, oscal_path, digest, payload):
+        """Add queued job."""
+        return await self._run(self.db.add_job, job_id, oscal_path, digest, payload)
 
-    def get_assessment_results(self, oid):
-        """Get assessment_results."""
-        return self._get_table('ASSESSMENT_RESULTS', oid)
+    async def claim_job(self, owner, lease):
+        """Claim oldest queued job for owner."""
+        return await self._run(self.db.claim_job, owner, lease)
 
-    def delete_assessment_results(self, oid):
-        """Delete assessment_results."""
-        return self._delete_table('ASSESSMENT_RESULTS', oid)
+    async def update_job(self, job_id, status, uuid=None, error=None, owner=None):
+        """Update job status."""
+        return await self._run(self.db.update_job, job_id, status, uuid=uuid, error=error, owner=owner)
 
-    def get_assessment_results_id_list(self):
-        """Get assessment_results ids."""
-        return self._get_table_id_list_str('ASSESSMENT_RESULTS')
+    async def renew_jobs(self, owner, lease):
+        """Renew the leases of the jobs of owner."""
+        return await self._run(self.db.renew_jobs, owner, lease)
 
-    # PLAN OF ACTION AND MILESTONES
+    async def requeue_jobs(self):
+        """Requeue jobs whose lease expired."""
+        return await self._run(self.db.requeue_jobs)
 
-    def _init_plan_of_action_and_milestones(self):
-        """Init plan_of_action_and_milestones."""
-        self._init_table('PLAN_OF_ACTION_AND_MILESTONES')
+    async def get_job(self, job_id):
+        """Get job status."""
+        return await self._run(self.db.get_job, job_id)
 
-    def add_plan_of_action_and_milestones(self, oid, payload):
-        """Add plan_of_action_and_milestones."""
-        return self._add_table('PLAN_OF_ACTION_AND_MILESTONES', oid, payload)
+    # REVISIONS
 
-    def replace_plan_of_action_and_milestones(self, oid, payload):
-        """Replace plan_of_action_and_milestones."""
-        return self._replace_table('PLAN_OF_ACTION_AND_MILESTONES', oid, payload)
+    async def get_revision_list(self, oscal_path, oid):
+        """Get revisions of document."""
+        return await self._run(self.db.get_revision_list, oscal_path, oid)
 
-    def get_plan_of_action_and_milestones(self, oid):
-        """Get plan_of_action_and_milestones."""
-        return self._get_table('PLAN_OF_ACTION_AND_MILESTONES', oid)
+    async def get_revision(self, oscal_path, oid, revision):
+        """Get version of document at revision."""
+        return await self._run(self.db.get_revision, oscal_path, oid, revision)
 
-    def delete_plan_of_action_and_milestones(self, oid):
-        """Delete plan_of_action_and_milestones."""
-        return self._delete_table('PLAN_OF_ACTION_AND_MILESTONES', oid)
+    # SEARCH
 
-    def get_plan_of_action_and_milestones_id_list(self):
-        """Get plan_of_action_and_milestones ids."""
-        return self._get_table_id_list_str('PLAN_OF_ACTION_AND_MILESTONES')
+    async def search(self, query, oscal_path=None, limit=None):
+        """Search documents."""
+        return await self._run(self.db.search, query, oscal_path, limit)
 
     # SEARCH PROFILES
 
-    def search_profiles(self, profile_mnemonic):
+    async def search_profiles(self, profile_mnemonic):
         """Search profiles."""
-        table = 'PROFILES'
-        cname = helper.get_profile_mnemonic()
-        cvalue = profile_mnemonic
-        result = self._get_table_by_column(table, cname, cvalue)
-        return result
+        return await self._run(self.db.search_profiles, profile_mnemonic)
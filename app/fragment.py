@@ -0,0 +1,93 @@
+# -*- mode:python; coding:utf-8 -*-
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""OSCAL Exchange Protocol."""
+import hashlib
+import json
+import logging
+import re
+
+from registry import dumps
+
+logger = logging.getLogger(__name__)
+
+# reference to a fragment in the text of a split document, OSCAL objects have no $fragment key
+_reference = re.compile(r'\{"\$fragment":"([0-9a-f]{64})"\}')
+
+
+class FragmentError(Exception):
+    """Fragment error."""
+
+
+def parse_paths(paths):
+    """Parse element paths, like profile.imports or *.back-matter.resources for all models, to (model, keys)."""
+    parsed = []
+    for path in paths or []:
+        model, *keys = path.split('.')
+        if not keys or not all(keys):
+            raise FragmentError(f'invalid fragment path {path}, expected model.element[.element...]')
+        parsed.append((model, keys))
+    return parsed
+
+
+def split(oscal_path, payload, paths, min_size):
+    """Split the values at paths of document out as fragments, each item of an array its own fragment.
+
+    Returns (text with references, size of the whole text, fragment digest -> text), or None if nothing was split.
+    Values serializing to less than min size are left in place, as not worth a reference.
+    """
+    if isinstance(payload, bytes):
+        payload = payload.decode('utf-8')
+    obj = json.loads(payload)
+    fragments = {}
+    # bytes the references save, per occurrence, so repeats within the document count each time
+    saved = [0]
+    for model, keys in paths:
+        if model not in ('*', oscal_path):
+            continue
+        parent = obj[oscal_path]
+        for key in keys[:-1]:
+            parent = parent.get(key) if isinstance(parent, dict) else None
+        if not isinstance(parent, dict) or keys[-1] not in parent:
+            continue
+        value = parent[keys[-1]]
+        if isinstance(value, list):
+            parent[keys[-1]] = [_extract(item, min_size, fragments, saved) for item in value]
+        else:
+            parent[keys[-1]] = _extract(value, min_size, fragments, saved)
+    if not fragments:
+        return None
+    text = dumps(obj)
+    return text, len(text.encode('utf-8')) + saved[0], fragments
+
+
+def _extract(value, min_size, fragments, saved):
+    """Get reference to value as a fragment, or value if too small."""
+    text = dumps(value)
+    size = len(text.encode('utf-8'))
+    if size < min_size:
+        return value
+    digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    fragments[digest] = text
+    reference = {'$fragment': digest}
+    saved[0] += size - len(dumps(reference))
+    return reference
+
+
+def assemble(text, fragments):
+    """Splice fragments, digest -> text, into the references of the text of a split document."""
+    try:
+        return _reference.sub(lambda match: fragments[match.group(1)], text)
+    except KeyError as e:
+        raise FragmentError(f'fragment {e} not found')
@@ -44,6 +44,197 @@ class Helper():
         """Get profile mnemonic."""
         return self.config['profile-mnemonic']
 
+    def get_worker_processes(self):
+        """Get number of validation worker processes."""
+        return self.config['worker-processes']
+
+    def get_worker_threads(self):
+        """Get number of i/o worker threads."""
+        return self.config['worker-threads']
+
+    def get_worker_queue_depth(self):
+        """Get maximum pending tasks per worker pool."""
+        return self.config['worker-queue-depth']
+
+    def get_upload_max_size(self):
+        """Get maximum upload size in bytes."""
+        return self.config['upload-max-size']
+
+    def get_upload_chunk_size(self):
+        """Get upload read chunk size in bytes."""
+        return self.config['upload-chunk-size']
+
+    def get_download_chunk_size(self):
+        """Get document download chunk size in bytes."""
+        return self.config['download-chunk-size']
+
+    def get_validation_cache_entries(self):
+        """Get maximum validation cache entries."""
+        return self.config['validation-cache-entries']
+
+    def get_validation_cache_bytes(self):
+        """Get maximum validation cache payload bytes."""
+        return self.config['validation-cache-bytes']
+
+    def get_document_cache_entries(self):
+        """Get maximum parsed document cache entries."""
+        return self.config['document-cache-entries']
+
+    def get_document_cache_bytes(self):
+        """Get maximum parsed document cache payload bytes."""
+        return self.config['document-cache-bytes']
+
+    def get_bulk_batch_size(self):
+        """Get number of documents validated per bulk worker task."""
+        return self.config['bulk-batch-size']
+
+    def get_job_workers(self):
+        """Get number of background job workers."""
+        return self.config['job-workers']
+
+    def get_job_poll_interval(self):
+        """Get seconds between polls of the job queue when idle."""
+        return self.config['job-poll-interval']
+
+    def get_job_lease(self):
+        """Get seconds a claimed job is leased for, renewed while it runs."""
+        return self.config['job-lease']
+
+    def get_schema_validation(self):
+        """Get whether uploads are checked against the OSCAL json schema before model construction."""
+        return self.config['schema-validation']
+
+    def get_oscal_schema_dir(self):
+        """Get directory of official OSCAL json schemas, or None to use those of the trestle models."""
+        schema_dir = self.config['oscal-schema-dir']
+        if not schema_dir:
+            return None
+        return os.path.join(dirbase, schema_dir)
+
+    def get_warm_up(self):
+        """Get whether OSCAL models are loaded in the workers at startup rather than on first use."""
+        return self.config['warm-up']
+
+    def get_db_engine(self):
+        """Get storage engine of documents: sqlite, sharded, memory or filesystem."""
+        return self.config['db-engine']
+
+    def get_db_workspace(self):
+        """Get trestle workspace directory of the filesystem storage engine."""
+        return self.config['db-workspace']
+
+    def get_db_compression(self):
+        """Get codec of stored documents: none, zlib or zstd."""
+        return self.config['db-compression']
+
+    def get_db_compression_level(self):
+        """Get compression level of the codec."""
+        return self.config['db-compression-level']
+
+    def get_db_dictionary_size(self):
+        """Get maximum size in bytes of trained compression dictionaries."""
+        return self.config['db-dictionary-size']
+
+    def get_db_dictionary_samples(self):
+        """Get maximum documents per model type sampled to train a compression dictionary."""
+        return self.config['db-dictionary-samples']
+
+    def get_db_path(self):
+        """Get sqlite database path."""
+        return self.config['db-path']
+
+    def get_db_journal_mode(self):
+        """Get sqlite journal mode."""
+        return self.config['db-journal-mode']
+
+    def get_db_busy_timeout(self):
+        """Get seconds a connection waits for a lock held by another."""
+        return self.config['db-busy-timeout']
+
+    def get_db_synchronous(self):
+        """Get sqlite synchronous mode."""
+        return self.config['db-synchronous']
+
+    def get_db_cache_size(self):
+        """Get sqlite page cache size per connection, in pages or if negative KiB."""
+        return self.config['db-cache-size']
+
+    def get_db_mmap_size(self):
+        """Get sqlite memory mapped i/o size in bytes."""
+        return self.config['db-mmap-size']
+
+    def get_db_shards(self):
+        """Get table name -> number of sqlite files the table is split into by the sharded engine, beside db-path."""
+        return self.config['db-shards'] or {}
+
+    def get_db_replica_path(self):
+        """Get path of the read only sqlite replica, none for no replica."""
+        return self.config['db-replica-path']
+
+    def get_db_replica_interval(self):
+        """Get seconds between refreshes of the replica, 0 for none."""
+        return self.config['db-replica-interval']
+
+    def get_db_replica_writes(self):
+        """Get number of writes after which the replica is refreshed, 0 for none."""
+        return self.config['db-replica-writes']
+
+    def get_db_fragment_paths(self):
+        """Get element paths, like *.back-matter.resources, at which the sqlite engine splits documents."""
+        return self.config['db-fragment-paths'] or []
+
+    def get_db_fragment_min_size(self):
+        """Get minimum size in bytes of a value split out as a fragment."""
+        return self.config['db-fragment-min-size']
+
+    def get_db_fragment_cache_bytes(self):
+        """Get maximum bytes of the fragment cache of each sqlite file."""
+        return self.config['db-fragment-cache-bytes']
+
+    def get_db_cached_statements(self):
+        """Get number of prepared statements cached per sqlite connection."""
+        return self.config['db-cached-statements']
+
+    def get_db_pooled_connections(self):
+        """Get number of idle sqlite connections pooled for streams and backups."""
+        return self.config['db-pooled-connections']
+
+    def get_db_threads(self):
+        """Get db thread pool size."""
+        return self.config['db-threads']
+
+    def get_revision_snapshot_interval(self):
+        """Get number of revisions per revision stored whole rather than as a delta."""
+        return self.config['revision-snapshot-interval']
+
+    def get_id_list_limit(self):
+        """Get default number of ids per id-list page."""
+        return self.config['id-list-limit']
+
+    def get_id_list_max_limit(self):
+        """Get maximum number of ids per id-list page."""
+        return self.config['id-list-max-limit']
+
+    def get_summary_list_limit(self):
+        """Get default number of summaries per summary-list page."""
+        return self.config['summary-list-limit']
+
+    def get_summary_list_max_limit(self):
+        """Get maximum number of summaries per summary-list page."""
+        return self.config['summary-list-max-limit']
+
+    def get_search_index(self):
+        """Get whether documents are indexed for full text search."""
+        return self.config['search-index']
+
+    def get_search_limit(self):
+        """Get default number of documents found by search."""
+        return self.config['search-limit']
+
+    def get_search_max_limit(self):
+        """Get maximum number of documents found by search."""
+        return self.config['search-max-limit']
+
     def get_profile_phase_i(self):
         """Get profile phase i."""
         fp = os.path.join(dirbase, self.config['profile-phase-i'])
@@ -0,0 +1,322 @@
+# -*- mode:python; coding:utf-8 -*-
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""OSCAL Exchange Protocol."""
+import collections
+import functools
+import json
+import logging
+import os
+import types
+import typing
+from typing import NamedTuple
+
+from helper import helper
+
+import patch
+from patch import PatchError
+
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+from registry import dumps, models
+
+from schema import SchemaError, check, get_validator, json_pointer
+
+logger = logging.getLogger(__name__)
+
+schema_validation = helper.get_schema_validation()
+
+
+class IngestError(Exception):
+    """Ingest error."""
+
+
+class Validated(NamedTuple):
+    """Validated OSCAL document, picklable so it can cross process boundaries."""
+
+    uuid: str
+    payload: str
+    props: list
+    columns: dict
+    summary: dict
+
+
+def oscal_read_bytes(oscal_path, contents):
+    """Parse and validate wrapped OSCAL json contents in memory."""
+    # parse, json accepts bytes directly so no decoded copy is kept
+    try:
+        obj = json.loads(contents)
+    except ValueError as e:
+        raise IngestError(f'{oscal_path} is not valid json: {e}')
+    return oscal_read_obj(oscal_path, obj)
+
+
+def oscal_read_obj(oscal_path, obj):
+    """Validate wrapped OSCAL object."""
+    obm_type = models[oscal_path].obm_type
+    if not isinstance(obj, dict) or len(obj) != 1 or oscal_path not in obj:
+        raise IngestError(f'{oscal_path} is not the single top level key.')
+    # check structure against the compiled json schema first, when enabled
+    if schema_validation:
+        check_schema(oscal_path, obj)
+    # validate
+    return validate_element(oscal_path, [], obm_type, obj[oscal_path])
+
+
+def check_schema(oscal_path, obj):
+    """Check wrapped OSCAL object against the compiled json schema of its model type."""
+    try:
+        check(oscal_path, obj)
+    except SchemaError as e:
+        raise IngestError(f'{oscal_path} failed validation at {e.pointer}: {e.message}')
+
+
+@functools.lru_cache(maxsize=None)
+def type_adapter(annotation):
+    """Get validator of values as annotation, a union of OSCAL model types."""
+    return TypeAdapter(annotation)
+
+
+def validate_element(oscal_path, tokens, obm_type, value):
+    """Validate value of the element at tokens below the root element as OSCAL model type, or union of them."""
+    try:
+        if isinstance(obm_type, type) and issubclass(obm_type, BaseModel):
+            return obm_type.model_validate(value)
+        return type_adapter(obm_type).validate_python(value)
+    except ValidationError as e:
+        path, error = intended_error(value, e.errors())
+        pointer = json_pointer([oscal_path, *tokens, *path])
+        raise IngestError(f'{oscal_path} failed validation at {pointer}: {error["msg"]}')
+    except Exception as e:
+        raise IngestError(f'{oscal_path} failed validation: {e}')
+
+
+def intended_error(value, errors):
+    """Get (path, error) of the pydantic validation error of value most likely of the intended members of unions.
+
+    Those are the members with the fewest errors, of whose errors the one deepest in the document is taken.
+    """
+    located = [(*error_path(value, error), error) for error in errors]
+    counts = collections.Counter(members for _, members, _ in located)
+    path, _, error = min(located, key=lambda item: (counts[item[1]], -len(item[0])))
+    return path, error
+
+
+def error_path(value, error):
+    """Get (path of keys and indexes of value to the value of pydantic validation error, union members of the path).
+
+    Entries of the error location that are not in the document, the names of the members of unions, are dropped from
+    the path, except the last of an error of a missing field.
+    """
+    path = []
+    members = []
+    loc = error['loc']
+    for depth, key in enumerate(loc):
+        in_list = isinstance(value, list) and isinstance(key, int) and key < len(value)
+        if in_list or isinstance(value, dict) and key in value:
+            path.append(key)
+            value = value[key]
+        elif depth == len(loc) - 1 and error['type'] == 'missing':
+            path.append(key)
+        else:
+            members.append((len(path), key))
+    return path, tuple(members)
+
+
+def get_props(oscal):
+    """Get metadata props as (name, value, ns) tuples."""
+    props = []
+    if oscal.metadata.props is not None:
+        for prop in oscal.metadata.props:
+            ns = None if prop.ns is None else str(prop.ns)
+            props.append((prop.name, prop.value, ns))
+    return props
+
+
+def get_validated(oscal_path, oscal):
+    """Get picklable result of validated OSCAL object."""
+    model = models[oscal_path]
+    payload = model.serialize(oscal)
+    return Validated(oscal.uuid, payload, get_props(oscal), model.extract(oscal), model.summarize(payload))
+
+
+def validate(oscal_path, contents):
+    """Validate contents, returning uuid, serialized json, props, index columns and summary."""
+    return get_validated(oscal_path, oscal_read_bytes(oscal_path, contents))
+
+
+def validate_batch(documents):
+    """Validate (name, contents) documents of any model type.
+
+    Returns (name, oscal_path, validated, error) per document.
+    """
+    results = []
+    for name, contents in documents:
+        oscal_path = None
+        try:
+            try:
+                obj = json.loads(contents)
+            except ValueError as e:
+                raise IngestError(f'not valid json: {e}')
+            if isinstance(obj, dict) and len(obj) == 1:
+                oscal_path = next(iter(obj))
+            if oscal_path not in models:
+                raise IngestError('not a known OSCAL model')
+            results.append((name, oscal_path, get_validated(oscal_path, oscal_read_obj(oscal_path, obj)), None))
+        except IngestError as e:
+            results.append((name, oscal_path, None, str(e)))
+    return results
+
+
+def element_type(annotation):
+    """Get type of optional annotation."""
+    args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+    if typing.get_origin(annotation) in (typing.Union, types.UnionType) and len(args) == 1:
+        return args[0]
+    return annotation
+
+
+def model_types(annotation):
+    """Get the OSCAL model types of annotation, a model type or a union of them, else none."""
+    if typing.get_origin(annotation) in (typing.Union, types.UnionType):
+        members = typing.get_args(annotation)
+    else:
+        members = (annotation, )
+    if all(isinstance(member, type) and issubclass(member, BaseModel) for member in members):
+        return members
+    return ()
+
+
+def field_type(members, name):
+    """Get type of the named field of model types, or None if any has validators of its own or the types differ.
+
+    Only the members declaring the field count, as the models forbid other fields so only those can hold it.
+    """
+    for member in members:
+        decorators = member.__pydantic_decorators__
+        if decorators.model_validators or decorators.field_validators:
+            return None
+    fields = [member.alias_to_field_map().get(name) for member in members]
+    annotations = [field.annotation for field in fields if field is not None]
+    if not annotations or any(annotation != annotations[0] for annotation in annotations):
+        return None
+    return annotations[0]
+
+
+def validation_root(obm_type, tokens):
+    """Get (tokens, type) of the element validated for a change of the value at tokens below the root element.
+
+    That is the deepest OSCAL model element containing the value, or the shallowest one containing it with validators
+    of its own, as those may depend on the value. Elements of a union of model types, like the groups of a catalog,
+    are validated as the union, and are passed through to a field of theirs if the members declaring it agree on its
+    type, see field_type.
+    """
+    found = ([], obm_type)
+    annotation = obm_type
+    for depth, token in enumerate(tokens):
+        annotation = element_type(annotation)
+        members = model_types(annotation)
+        if members:
+            found = (tokens[:depth], annotation)
+            annotation = field_type(members, token)
+            if annotation is None:
+                break
+        elif typing.get_origin(annotation) is list and token.isdigit():
+            annotation = typing.get_args(annotation)[0]
+        else:
+            break
+    return found
+
+
+def validation_roots(obm_type, changed):
+    """Get (tokens, type) of the elements validated for changes at paths, outermost first and none inside another."""
+    roots = []
+    candidates = [validation_root(obm_type, tokens[1:]) for tokens in changed]
+    for tokens, root_type in sorted(candidates, key=lambda root: len(root[0])):
+        if not any(tokens[:len(other)] == other for other, _ in roots):
+            roots.append((tokens, root_type))
+    return roots
+
+
+def locate(obj, tokens):
+    """Get (container, key or index) of the value at tokens of json object, or None if not found."""
+    for depth, token in enumerate(tokens):
+        if isinstance(obj, list) and token.isdigit() and int(token) < len(obj):
+            token = int(token)
+        elif not isinstance(obj, dict) or token not in obj:
+            return None
+        if depth == len(tokens) - 1:
+            return obj, token
+        obj = obj[token]
+    return None
+
+
+def apply_patch(oscal_path, oid, payload, kind, body):
+    """Get (object, changed paths) of stored document payload patched by json-patch or merge-patch body."""
+    obj = json.loads(payload)
+    try:
+        if kind == 'json-patch':
+            obj = patch.apply(obj, body, in_place=True)
+            changed = patch.changed_paths(body)
+        else:
+            obj = patch.merge(obj, body)
+            changed = patch.merge_changed_paths(body)
+    except PatchError as e:
+        raise IngestError(f'{oscal_path} patch failed: {e}')
+    if not isinstance(obj, dict) or len(obj) != 1 or not isinstance(obj.get(oscal_path), dict):
+        raise IngestError(f'{oscal_path} is not the single top level key.')
+    if obj[oscal_path].get('uuid') != oid:
+        raise IngestError(f'{oscal_path} patch changes uuid {oid}')
+    return obj, changed
+
+
+def validate_patch(oscal_path, oid, payload, kind, body):
+    """Apply json-patch or merge-patch body to stored document, returning it validated as by validate.
+
+    Only the elements containing the changed values are validated and serialized again, see validation_root, so a
+    small change to a large document costs about its parse. Changes of the root element validate the whole document.
+
+    The stored document and the elements serialized again are both serialized as by the serializer of the OSCAL
+    models, so a patch stores the bytes a replace by the patched document would.
+    """
+    model = models[oscal_path]
+    obj, changed = apply_patch(oscal_path, oid, payload, kind, body)
+    roots = validation_roots(model.obm_type, changed)
+    located = [locate(obj[oscal_path], tokens) for tokens, _ in roots]
+    if any(not tokens for tokens, _ in roots) or None in located:
+        return get_validated(oscal_path, oscal_read_obj(oscal_path, obj))
+    if schema_validation:
+        check_schema(oscal_path, obj)
+    elements = {}
+    for (tokens, obm_type), (container, key) in zip(roots, located):
+        element = validate_element(oscal_path, tokens, obm_type, container[key])
+        container[key] = json.loads(element.oscal_serialize_json(wrapped=False))
+        elements[tuple(tokens)] = element
+    # props and index columns are of the metadata, extracted from a root element holding only it
+    metadata = elements.get(('metadata', ))
+    if metadata is None:
+        metadata_type = element_type(model.obm_type.alias_to_field_map()['metadata'].annotation)
+        metadata = validate_element(oscal_path, ['metadata'], metadata_type, obj[oscal_path].get('metadata'))
+    oscal = model.obm_type.model_construct(metadata=metadata)
+    payload = dumps(obj)
+    return Validated(oid, payload, get_props(oscal), model.extract(oscal), model.summarize(payload))
+
+
+def warm_up():
+    """Load the trestle models, and compile their schemas when enabled, ahead of first use."""
+    for oscal_path, model in models.items():
+        logger.debug(f'warm-up: {oscal_path} {model.obm_type.__name__}')
+        if schema_validation:
+            get_validator(oscal_path)
+    return os.getpid()
@@ -0,0 +1,124 @@
+# -*- mode:python; coding:utf-8 -*-
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""OSCAL Exchange Protocol."""
+import asyncio
+import logging
+import os
+import uuid
+
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+
+class Jobs():
+    """Background ingest jobs, queued durably in the JOBS table of the db.
+
+    The process coroutine is called with (job_id, owner, oscal_path, contents, digest)
+    and returns the uuid of the stored document, raising HTTPException on failure.
+    A 503, raised while workers or the db are busy, queues the job again rather than failing it.
+    Claimed jobs are leased to owner, this process, and the leases renewed while it runs,
+    so jobs of other live processes sharing the db are not taken over, only those whose lease expired.
+    """
+
+    def __init__(self, logger, db, process, count, poll_interval, lease):
+        """Init."""
+        self.logger = logger
+        self.db = db
+        self.process = process
+        self.count = count
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.owner = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self.tasks = []
+        self.wakeup = None
+
+    async def start(self):
+        """Start background workers, resuming jobs whose process stopped."""
+        self.wakeup = asyncio.Event()
+        await self._requeue()
+        self.tasks = [asyncio.create_task(self._run()) for _ in range(self.count)]
+        self.tasks.append(asyncio.create_task(self._heartbeat()))
+
+    async def stop(self):
+        """Stop background workers, jobs in progress are resumed once their lease expires."""
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    async def submit(self, oscal_path, contents, digest):
+        """Queue job, returning its id."""
+        job_id = str(uuid.uuid4())
+        await self.db.add_job(job_id, oscal_path, digest, bytes(contents))
+        self.wakeup.set()
+        return job_id
+
+    async def _requeue(self):
+        """Requeue jobs whose lease expired."""
+        requeued = await self.db.requeue_jobs()
+        if requeued:
+            self.logger.info(f'jobs: requeued {requeued}')
+            self.wakeup.set()
+
+    async def _heartbeat(self):
+        """Renew the leases of the jobs of this process and requeue expired ones, until cancelled."""
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                await self.db.renew_jobs(self.owner, self.lease)
+                await self._requeue()
+            except HTTPException as e:
+                self.logger.warning(f'jobs: leases not renewed, {e.detail}')
+
+    async def _wait(self):
+        """Wait for a submit, at most a poll interval."""
+        self.wakeup.clear()
+        try:
+            await asyncio.wait_for(self.wakeup.wait(), self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self):
+        """Process queued jobs until cancelled."""
+        while True:
+            try:
+                job = await self.db.claim_job(self.owner, self.lease)
+            except HTTPException:
+                # db busy, claim at next poll
+                job = None
+            if job is None:
+                await self._wait()
+                continue
+            try:
+                await self._process(*job)
+            except HTTPException as e:
+                # db busy, the lease expires and the job is queued again
+                self.logger.warning(f'jobs: job {job[0]} not updated, {e.detail}')
+
+    async def _process(self, job_id, oscal_path, digest, contents):
+        """Process claimed job, queueing it again while workers or the db are busy."""
+        try:
+            oid = await self.process(job_id, self.owner, oscal_path, contents, digest)
+            await self.db.update_job(job_id, 'done', uuid=oid, owner=self.owner)
+        except HTTPException as e:
+            if e.status_code == 503:
+                await self.db.update_job(job_id, 'queued', owner=self.owner)
+                await asyncio.sleep(self.poll_interval)
+                return
+            await self.db.update_job(job_id, 'failed', error=e.detail, owner=self.owner)
+        except Exception as e:
+            self.logger.exception(f'job {job_id} failed')
+            await self.db.update_job(job_id, 'failed', error=str(e), owner=self.owner)
@@ -13,32 +13,128 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 """OSCAL Exchange Protocol."""
+import asyncio
+import contextlib
+import json
 import logging
 import logging.config
-import pathlib
 import sys
-import tempfile
 import uuid
-from typing import List, Union
+from typing import List, Literal, Union
 
-from db import Db
+import bulk
 
-from fastapi import Depends, FastAPI, HTTPException, UploadFile
+from cache import ValidationCache
+
+from db import AsyncDb
+
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, UploadFile
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 
 from helper import helper
 
-import trestle.core.models.elements as elements
+from ingest import IngestError, validate, validate_batch, validate_patch, warm_up
+
+from jobs import Jobs
+
+from projection import ProjectionError, parse_path
+
+from registry import models, utc_timestamp
+
+from upload import UploadLimit, read_upload
+
+from workers import Workers
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='token')
 depends = Depends()
 depends_scheme = Depends(oauth2_scheme)
+replica_query = Query(
+    default=False, description='Read from the read only replica, which may be stale by the seconds of OXP-Replica-Age.'
+)
+
+path_query = Query(
+    default=None,
+    description='Element path, like catalog.groups.*.controls.*.id, or JSONPath, like $.catalog.metadata, '
+    'of the values to get instead of the whole document.'
+)
+
+cursor_query = Query(default=None, description='Next-cursor of the previous page.')
+
+id_list_limit_query = Query(default=None, ge=1, description='Maximum number of ids in the page.')
+id_list_order_query = Query(default='id', description='Order ids by id or by insertion.')
+
+summary_list_limit_query = Query(default=None, ge=1, description='Maximum number of summaries in the page.')
+summary_sort_query = Query(default='id', description='Sort summaries by field.')
+summary_descending_query = Query(default=False, description='Sort summaries in descending order.')
+summary_title_query = Query(default=None, description='Only titles containing text, ignoring case.')
+summary_version_query = Query(default=None, description='Only documents of version.')
+summary_oscal_version_query = Query(default=None, alias='oscal-version', description='Only documents of OSCAL version.')
+summary_modified_after_query = Query(
+    default=None, alias='modified-after', description='Only documents last modified after timestamp.'
+)
+summary_modified_before_query = Query(
+    default=None, alias='modified-before', description='Only documents last modified before timestamp.'
+)
+
+search_query = Query(min_length=1, description='Words to find.')
+search_limit_query = Query(default=None, ge=1, description='Maximum number of documents found.')
+
+# media type of patch request body -> kind of patch
+patch_media_types = {'application/json-patch+json': 'json-patch', 'application/merge-patch+json': 'merge-patch'}
+
+patch_openapi = {
+    'requestBody': {
+        'required': True,
+        'content': {
+            'application/json-patch+json': {
+                'schema': {
+                    'type': 'array', 'items': {'type': 'object'}
+                }
+            },
+            'application/merge-patch+json': {
+                'schema': {
+                    'type': 'object'
+                }
+            },
+        },
+    }
+}
 
 logging.getLogger('uvicorn.error').propagate = False
 logging.basicConfig(stream=sys.stdout, level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    """Open the db and start background jobs, then on shutdown stop jobs, workers and the db.
+
+    When configured, workers are warmed up without delaying startup.
+    """
+    global db, jobs
+    warm_up_task = None
+    db = AsyncDb(logger, helper.get_db_threads(), helper.get_worker_queue_depth())
+    try:
+        await db.connect()
+        jobs = Jobs(
+            logger, db, process_job, helper.get_job_workers(), helper.get_job_poll_interval(), helper.get_job_lease()
+        )
+        await jobs.start()
+        if helper.get_warm_up():
+            warm_up_task = asyncio.create_task(warm_up_workers())
+        yield
+    finally:
+        if warm_up_task is not None:
+            warm_up_task.cancel()
+        if jobs is not None:
+            await jobs.stop()
+        workers.shutdown()
+        await db.close()
+
+
 app = FastAPI(
+    lifespan=lifespan,
     title='OSCAL Exchange Protocol (OXP)',
     description='The OSCAL Exchange Protocol API',
     version=helper.get_version(),
@@ -48,7 +144,268 @@ app = FastAPI(
     },
 )
 
-db = Db(logger)
+# oversized uploads are refused before the multipart form is spooled and parsed
+app.add_middleware(UploadLimit, max_size=helper.get_upload_max_size())
+
+# opened in the lifespan of the app
+db = None
+
+jobs = None
+
+workers = Workers(logger, helper.get_worker_processes(), helper.get_worker_threads(), helper.get_worker_queue_depth())
+
+validation_cache = ValidationCache(logger, helper.get_validation_cache_entries(), helper.get_validation_cache_bytes())
+
+
+class IdListQuery():
+    """Id-list page query parameters."""
+
+    def __init__(
+        self,
+        limit: Union[int, None] = id_list_limit_query,
+        cursor: Union[str, None] = cursor_query,
+        order: Literal['id', 'inserted'] = id_list_order_query,
+        replica: bool = replica_query,
+        response: Response = None,
+    ):
+        """Init."""
+        self.limit = min(limit or helper.get_id_list_limit(), helper.get_id_list_max_limit())
+        self.cursor = cursor
+        self.order = order
+        self.replica = replica
+        self.response = response
+
+
+SummarySort = Literal['id', 'title', 'version', 'oscal-version', 'last-modified', 'size']
+
+
+class SummaryListQuery():
+    """Summary-list page query parameters."""
+
+    def __init__(
+        self,
+        limit: Union[int, None] = summary_list_limit_query,
+        cursor: Union[str, None] = cursor_query,
+        sort: SummarySort = summary_sort_query,
+        descending: bool = summary_descending_query,
+        title: Union[str, None] = summary_title_query,
+        version: Union[str, None] = summary_version_query,
+        oscal_version: Union[str, None] = summary_oscal_version_query,
+        modified_after: Union[str, None] = summary_modified_after_query,
+        modified_before: Union[str, None] = summary_modified_before_query,
+        replica: bool = replica_query,
+        response: Response = None,
+    ):
+        """Init."""
+        self.limit = min(limit or helper.get_summary_list_limit(), helper.get_summary_list_max_limit())
+        self.cursor = cursor
+        self.sort = sort
+        self.descending = descending
+        self.replica = replica
+        self.response = response
+        self.filters = {'title': title, 'version': version, 'oscal-version': oscal_version}
+        # timestamps compare as stored, normalized to utc
+        for name, value in [('modified-after', modified_after), ('modified-before', modified_before)]:
+            self.filters[name] = None if value is None else utc_timestamp(value)
+            if value is not None and self.filters[name] is None:
+                raise HTTPException(status_code=400, detail=f'{name} {value} is not an iso 8601 timestamp')
+
+
+async def read_oscal(oscal_path, oscal_file):
+    """Read uploaded OSCAL file and validate in a worker process."""
+    contents, digest = await read_oscal_upload(oscal_path, oscal_file)
+    return await validate_oscal(oscal_path, contents, digest)
+
+
+async def read_oscal_upload(oscal_path, oscal_file):
+    """Read uploaded OSCAL file, returning contents and sha256 digest."""
+    max_size = helper.get_upload_max_size()
+    chunk_size = helper.get_upload_chunk_size()
+    return await read_upload(oscal_path, oscal_file, max_size, chunk_size)
+
+
+async def validate_oscal(oscal_path, contents, digest):
+    """Validate OSCAL contents in a worker process."""
+    # identical uploads skip validation
+    key = validation_cache.key(oscal_path, digest)
+    validated = validation_cache.get(key)
+    if validated is not None:
+        return validated
+    try:
+        validated = await workers.cpu(validate, oscal_path, contents)
+    except IngestError as e:
+        logger.error(f'read {oscal_path}: {e}')
+        raise HTTPException(status_code=400, detail=f'Invalid {oscal_path} in file: {e}')
+    validation_cache.put(key, validated)
+    return validated
+
+
+async def submit_job(oscal_path, oscal_file):
+    """Queue uploaded OSCAL file for background validation and storage."""
+    contents, digest = await read_oscal_upload(oscal_path, oscal_file)
+    job_id = await jobs.submit(oscal_path, contents, digest)
+    logger.info(f'add {oscal_path}: job {job_id}')
+    return JSONResponse(status_code=202, content=job_id, headers={'Location': f'/jobs/job-id?job_id={job_id}'})
+
+
+async def process_job(job_id, owner, oscal_path, contents, digest):
+    """Validate and store queued OSCAL contents of job leased to owner."""
+    validated = await validate_oscal(oscal_path, contents, digest)
+    if not await db.update_job(job_id, 'storing', uuid=validated.uuid, owner=owner):
+        raise HTTPException(status_code=409, detail=f'job {job_id} lease expired')
+    document = (oscal_path, validated.uuid, validated.payload, validated.columns, validated.props, validated.summary)
+    errors = await db.add_documents([document])
+    if errors[0] is not None:
+        raise HTTPException(status_code=400, detail=errors[0])
+    return validated.uuid
+
+
+async def add_oscal(oscal_path, oscal_file, background):
+    """Add uploaded OSCAL document."""
+    logger.info(f'add {oscal_path}')
+    if background:
+        return await submit_job(oscal_path, oscal_file)
+    validated = await read_oscal(oscal_path, oscal_file)
+    # add into db
+    result = await db.add(
+        oscal_path, validated.uuid, validated.payload, validated.columns, validated.props, validated.summary
+    )
+    # success!
+    return result
+
+
+async def replace_oscal(oscal_path, oid, oscal_file, create=False):
+    """Replace OSCAL document with uploaded one, or add it if absent and create."""
+    validated = await read_oscal(oscal_path, oscal_file)
+    if create and validated.uuid != oid:
+        raise HTTPException(status_code=400, detail=f'{oscal_path} uuid {validated.uuid} does not match {oid}')
+    # replace into db
+    replace = db.upsert if create else db.replace
+    result = await replace(oscal_path, oid, validated.payload, validated.columns, validated.props, validated.summary)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f'Not found {oid}')
+    # success!
+    return result
+
+
+async def read_patch(oscal_path, request):
+    """Read json-patch or merge-patch request body, returning (kind, patch)."""
+    media_type = request.headers.get('content-type', '').split(';')[0].strip().lower()
+    kind = patch_media_types.get(media_type)
+    if kind is None:
+        raise HTTPException(status_code=415, detail=f'{oscal_path} patch is not {" or ".join(patch_media_types)}.')
+    max_size = helper.get_upload_max_size()
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > max_size:
+            raise HTTPException(status_code=413, detail=f'{oscal_path} patch exceeds {max_size} bytes.')
+    try:
+        return kind, json.loads(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f'{oscal_path} patch is not valid json: {e}')
+
+
+async def patch_oscal(oscal_path, oid, request):
+    """Patch OSCAL document with json-patch or merge-patch request body, validated in a worker process."""
+    kind, body = await read_patch(oscal_path, request)
+    payload = await db.get(oscal_path, oid)
+    if payload is None:
+        raise HTTPException(status_code=404, detail=f'Not found {oid}')
+    try:
+        validated = await workers.cpu(validate_patch, oscal_path, oid, payload, kind, body)
+    except IngestError as e:
+        logger.error(f'patch {oscal_path}: {e}')
+        raise HTTPException(status_code=400, detail=f'Invalid {oscal_path} patch: {e}')
+    # replace into db, unless replaced since read
+    result = await db.replace(
+        oscal_path, oid, validated.payload, validated.columns, validated.props, validated.summary, expected=payload
+    )
+    if result is None:
+        raise HTTPException(status_code=404, detail=f'Not found {oid}')
+    # success!
+    return result
+
+
+async def delete_oscal(oscal_path, oid):
+    """Delete OSCAL document."""
+    # delete from db
+    result = await db.delete(oscal_path, oid)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f'Not found {oid}')
+    # success!
+    return result
+
+
+def replica_headers(replica):
+    """Get staleness header of a read from the replica, taken before the read so the read is at most that stale."""
+    age = db.replica_age(replica)
+    return {} if age is None else {'OXP-Replica-Age': f'{age:.3f}'}
+
+
+async def get_oscal_id_list(oscal_path, query):
+    """Retrieve page of OSCAL document ids."""
+    headers = replica_headers(query.replica)
+    # get from db
+    try:
+        result = await db.get_id_list(oscal_path, query.limit, query.cursor, query.order, query.replica)
+    except NotImplementedError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    query.response.headers.update(headers)
+    # success!
+    return result
+
+
+async def get_oscal_summary_list(oscal_path, query):
+    """Retrieve page of OSCAL document summaries."""
+    headers = replica_headers(query.replica)
+    # get from db
+    result = await db.list_summaries(
+        oscal_path, query.filters, query.sort, query.descending, query.limit, query.cursor, query.replica
+    )
+    query.response.headers.update(headers)
+    # success!
+    return result
+
+
+async def get_oscal(oscal_path, oid, replica=False, path=None):
+    """Retrieve OSCAL document, or the values at path of it, from the replica if asked for."""
+    headers = replica_headers(replica)
+    if path is not None:
+        try:
+            steps = parse_path(path, oscal_path)
+        except ProjectionError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        # project from db
+        result = await db.get_projection(oscal_path, oid, steps, replica)
+        if result is None:
+            raise HTTPException(status_code=404, detail=f'Not found {oid}', headers=headers)
+        # success!
+        return Response(result, media_type='application/json', headers=headers)
+    # stream from db
+    result = await db.get_stream(oscal_path, oid, helper.get_download_chunk_size(), replica)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f'Not found {oid}', headers=headers)
+    size, chunks = result
+    if size is not None:
+        headers['Content-Length'] = str(size)
+    # success!
+    return StreamingResponse(chunks, media_type='application/json', headers=headers)
+
+
+def check_model_type(model_type):
+    """Check model type is known."""
+    if model_type not in models:
+        raise HTTPException(status_code=400, detail=f'Unknown model type {model_type}')
+
+
+async def warm_up_workers():
+    """Load OSCAL models in the validation workers, so the first upload does not pay for it."""
+    try:
+        pids = await workers.warm_up(warm_up)
+        logger.info(f'warm-up: {len(set(pids))} workers ready')
+    except Exception:
+        logger.exception('warm-up failed')
 
 
 # ------------------------------
@@ -69,67 +426,33 @@ async def login(form_data: OAuth2PasswordRequestForm = depends):
 @app.post(
     '/catalogs', tags=['Lifecycle: Catalogs'], response_model=str, description='Add an OSCAL catalog in datastore.'
 )
-async def add_catalog(catalog: UploadFile, token: str = depends_scheme):
+async def add_catalog(catalog: UploadFile, background: bool = False, token: str = depends_scheme):
     """Add OSCAL catalog."""
-    oscal_path = 'catalog'
-    oscal_file = catalog
-    logger.info('add catalog')
-    try:
-        # get a wrapped object
-        element_path = elements.ElementPath(oscal_path)
-        logger.info('element_path: {element_path}')
-        obm_type = element_path.get_obm_wrapped_type()
-        # get contents as string
-        contents = str(await oscal_file.read(), 'utf-8')
-        # save in temp file
-        temp_path = pathlib.Path(tempfile.gettempdir()) / 'upload.json'
-        
-        logger.info('temp_path: {temp_path}')
-        
-        with open(temp_path, 'w') as f:
-            f.write(contents)
-        # validate
-        oscal = obm_type.oscal_read(temp_path)
-    except Exception:
-        text = f'Invalid {oscal_path} in file.'
-        logger.error(f'add catalog: {text}')
-        raise HTTPException(status_code=400, detail=text)
-    # add into db
-    result = db.add_catalog(oscal.uuid, oscal.oscal_serialize_json())
-    # success!
-    return result
+    return await add_oscal('catalog', catalog, background)
 
 
 @app.put(
     '/catalogs/catalog-id',
     tags=['Lifecycle: Catalogs'],
     response_model=str,
-    description='Replace an OSCAL catalog in datastore.'
+    description='Replace an OSCAL catalog in datastore, or add it if absent and create.'
 )
-async def replace_catalog(catalog_id: str, catalog: UploadFile, token: str = depends_scheme):
+async def replace_catalog(catalog_id: str, catalog: UploadFile, create: bool = False, token: str = depends_scheme):
     """Replace OSCAL catalog."""
-    oscal_path = 'catalog'
-    oscal_file = catalog
-    try:
-        # get a wrapped object
-        element_path = elements.ElementPath(oscal_path)
-        obm_type = element_path.get_obm_wrapped_type()
-        # get contents as string
-        contents = str(await oscal_file.read(), 'utf-8')
-        # save in temp file
-        temp_path = pathlib.Path(tempfile.gettempdir()) / 'upload.json'
-        with open(temp_path, 'w') as f:
-            f.write(contents)
-        # validate
-        oscal = obm_type.oscal_read(temp_path)
-    except Exception:
-        raise HTTPException(status_code=400, detail=f'Invalid {oscal_path} in file.')
-    # replace into db
-    result = db.replace_catalog(catalog_id, oscal.oscal_serialize_json())
-    if result is None:
-        raise HTTPException(status_code=404, detail=f'Not found {catalog_id}')
-    # success!
-    return result
+    return await replace_oscal('catalog', catalog_id, catalog, create)
+
+
+@app.patch(
+    '/catalogs/catalog-id',
+    tags=['Lifecycle: Catalogs'],
+    response_model=str,
+    description='Patch an OSCAL catalog in datastore with an RFC 6902 json patch or an RFC 7396 merge patch, '
+    'validating only the elements containing the changes.',
+    openapi_extra=patch_openapi
+)
+async def patch_catalog(catalog_id: str, request: Request, token: str = depends_scheme):
+    """Patch OSCAL catalog."""
+    return await patch_oscal('catalog', catalog_id, request)
 
 
 @app.delete(
@@ -140,42 +463,42 @@ async def replace_catalog(catalog_id: str, catalog: UploadFile, token: str = dep
 )
 async def delete_catalog(catalog_id: str, token: str = depends_scheme):
     """Delete OSCAL catalog."""
-    # get from db
-    result = db.delete_catalog(catalog_id)
-    if result is None:
-        raise HTTPException(status_code=404, detail=f'Not found {catalog_id}')
-    # success!
-    return result
+    return await delete_oscal('catalog', catalog_id)
 
 
 @app.get(
     '/catalogs/id-list',
     tags=['Lifecycle: Catalogs'],
-    response_model=str,
-    description='Get list OSCAL catalog ids from datastore.'
+    response_model=dict,
+    description='Get page of OSCAL catalog ids from datastore, '
+    'with the next-cursor of the following page, null on the last page.'
 )
-async def get_catalog_id_list():
+async def get_catalog_id_list(query: IdListQuery = depends):
     """Retrieve OSCAL catalog ids."""
-    # get from db
-    result = db.get_catalog_id_list()
-    # success!
-    return result
+    return await get_oscal_id_list('catalog', query)
+
+
+@app.get(
+    '/catalogs/summary-list',
+    tags=['Lifecycle: Catalogs'],
+    response_model=dict,
+    description='Get page of OSCAL catalog summaries from datastore, '
+    'filtered and sorted by summary fields, with the next-cursor of the following page, null on the last page.'
+)
+async def get_catalog_summary_list(query: SummaryListQuery = depends):
+    """Retrieve OSCAL catalog summaries."""
+    return await get_oscal_summary_list('catalog', query)
 
 
 @app.get(
     '/catalogs/catalog-id',
     tags=['Lifecycle: Catalogs'],
-    response_model=str,
-    description='Get an OSCAL catalog from datastore.'
+    response_class=StreamingResponse,
+    description='Get an OSCAL catalog from datastore, or the json array of the values at path of it.'
 )
-async def get_catalog(catalog_id: str):
+async def get_catalog(catalog_id: str, replica: bool = replica_query, path: Union[str, None] = path_query):
     """Retrieve OSCAL catalog."""
-    # get from db
-    result = db.get_catalog(catalog_id)
-    if result is None:
-        raise HTTPException(status_code=404, detail=f'Not found {catalog_id}')
-    # success!
-    return result
+    return await get_oscal('catalog', catalog_id, replica, path)
 
 
 # ------------------------------
@@ -185,70 +508,33 @@ async def get_catalog(catalog_id: str):
 @app.post(
     '/profiles', tags=['Lifecycle: Profiles'], response_model=str, description='Add an OSCAL profile in datastore.'
 )
-async def add_profile(profile: UploadFile, token: str = depends_scheme):
+async def add_profile(profile: UploadFile, background: bool = False, token: str = depends_scheme):
     """Add OSCAL profile."""
-    oscal_path = 'profile'
-    oscal_file = profile
-    try:
-        # get a wrapped object
-        element_path = elements.ElementPath(oscal_path)
-        obm_type = element_path.get_obm_wrapped_type()
-        # get contents as string
-        contents = str(await oscal_file.read(), 'utf-8')
-        # save in temp file
-        temp_path = pathlib.Path(tempfile.gettempdir()) / 'upload.json'
-        with open(temp_path, 'w') as f:
-            f.write(contents)
-        # validate
-        oscal = obm_type.oscal_read(temp_path)
-    except Exception:
-        raise HTTPException(status_code=400, detail=f'Invalid {oscal_path} in file.')
-    # extract profile_mnemonic
-    key = helper.get_profile_mnemonic()
-    profile_mnemonic = None
-    try:
-        for prop in oscal.metadata.props:
-            if prop.name == key:
-                profile_mnemonic = prop.value
-                break
-    except Exception:
-        profile_mnemonic = None
-    # add into db
-    result = db.add_profile(oscal.uuid, oscal.oscal_serialize_json(), profile_mnemonic)
-    # success!
-    return result
+    return await add_oscal('profile', profile, background)
 
 
 @app.put(
     '/profiles/profile-id',
     tags=['Lifecycle: Profiles'],
     response_model=str,
-    description='Replace an OSCAL profile in datastore.'
+    description='Replace an OSCAL profile in datastore, or add it if absent and create.'
 )
-async def replace_profile(profile_id: str, profile: UploadFile, token: str = depends_scheme):
+async def replace_profile(profile_id: str, profile: UploadFile, create: bool = False, token: str = depends_scheme):
     """Replace OSCAL profile."""
-    oscal_path = 'profile'
-    oscal_file = profile
-    try:
-        # get a wrapped object
-        element_path = elements.ElementPath(oscal_path)
-        obm_type = element_path.get_obm_wrapped_type()
-        # get contents as string
-        contents = str(await oscal_file.read(), 'utf-8')
-        # save in temp file
-        temp_path = pathlib.Path(tempfile.gettempdir()) / 'upload.json'
-        with open(temp_path, 'w') as f:
-            f.write(contents)
-        # validate
-        oscal = obm_type.oscal_read(temp_path)
-    except Exception:
-        raise HTTPException(status_code=400, detail=f'Invalid {oscal_path} in file.')
-    # replace into db
-    result = db.replace_profile(profile_id, oscal.oscal_serialize_json())
-    if result is None:
-        raise HTTPException(status_code=404, detail=f'Not found {profile_id}')
-    # success!
-    return result
+    return await replace_oscal('profile', profile_id, profile, create)
+
+
+@app.patch(
+    '/profiles/profile-id',
+    tags=['Lifecycle: Profiles'],
+    response_model=str,
+    description='Patch an OSCAL profile in datastore with an RFC 6902 json patch or an RFC 7396 merge patch, '
+    'validating only the elements containing the changes.',
+    openapi_extra=patch_openapi
+)
+async def patch_profile(profile_id: str, request: Request, token: str = depends_scheme):
+    """Patch OSCAL profile."""
+    return await patch_oscal('profile', profile_id, request)
 
 
 @app.delete(
@@ -259,42 +545,42 @@ async def replace_profile(profile_id: str, profile: UploadFile, token: str = dep
 )
 async def delete_profile(profile_id: str, token: str = depends_scheme):
     """Delete OSCAL profile."""
-    # get from db
-    result = db.delete_profile(profile_id)
-    if result is None:
-        raise HTTPException(status_code=404, detail=f'Not found {profile_id}')
-    # success!
-    return result
+    return await delete_oscal('profile', profile_id)
 
 
 @app.get(
     '/profiles/id-list',
     tags=['Lifecycle: Profiles'],
-    response_model=str,
-    description='Get list OSCAL profile ids from datastore.'
+    response_model=dict,
+    description='Get page of OSCAL profile ids from datastore, '
+    'with the next-cursor of the following page, null on the last page.'
 )
-async def get_profile_id_list():
+async def get_profile_id_list(query: IdListQuery = depends):
     """Retrieve OSCAL profile ids."""
-    # get from db
-    result = db.get_profile_id_list()
-    # success!
-    return result
+    return await get_oscal_id_list('profile', query)
+
+
+@app.get(
+    '/profiles/summary-list',
+    tags=['Lifecycle: Profiles'],
+    response_model=dict,
+    description='Get page of OSCAL profile summaries from datastore, '
+    'filtered and sorted by summary fields, with the next-cursor of the following page, null on the last page.'
+)
+async def get_profile_summary_list(query: SummaryListQuery = depends):
+    """Retrieve OSCAL profile summaries."""
+    return await get_oscal_summary_list('profile', query)
 
 
 @app.get(
     '/profiles/profile-id',
     tags=['Lifecycle: Profiles'],
-    response_model=str,
-    description='Get an OSCAL profile from datastore.'
+    response_class=StreamingResponse,
+    description='Get an OSCAL profile from datastore, or the json array of the values at path of it.'
 )
-async def get_profile(profile_id: str):
+async def get_profile(profile_id: str, replica: bool = replica_query, path: Union[str, None] = path_query):
     """Retrieve OSCAL profile."""
-    # get from db
-    result = db.get_profile(profile_id)
-    if result is None:
-        raise HTTPException(status_code=404, detail=f'Not found {profile_id}')
-    # success!
-    return result
+    return await get_oscal('profile', profile_id, replica, path)
 
 
 # ------------------------------
@@ -307,62 +593,37 @@ async def get_profile(profile_id: str):
     response_model=str,
     description='Add an OSCAL component-definition in datastore.'
 )
-async def add_component_definition(component_definition: UploadFile, token: str = depends_scheme):
+async def add_component_definition(
+    component_definition: UploadFile, background: bool = False, token: str = depends_scheme
+):
     """Add OSCAL component_definition."""
-    oscal_path = 'component-definition'
-    oscal_file = component_definition
-    try:
-        # get a wrapped object
-        element_path = elements.ElementPath(oscal_path)
-        obm_type = element_path.get_obm_wrapped_type()
-        # get contents as string
-        contents = str(await oscal_file.read(), 'utf-8')
-        # save in temp file
-        temp_path = pathlib.Path(tempfile.gettempdir()) / 'upload.json'
-        with open(temp_path, 'w') as f:
-            f.write(contents)
-        # validate
-        oscal = obm_type.oscal_read(temp_path)
-    except Exception:
-        raise HTTPException(status_code=400, detail=f'Invalid {oscal_path} in file.')
-    # put into db
-    result = db.add_component_definition(oscal.uuid, oscal.oscal_serialize_json())
-    # success!
-    return result
+    return await add_oscal('component-definition', component_definition, background)
 
 
 @app.put(
     '/component-definitions/component-definition-id',
     tags=['Lifecycle: Component Definitions'],
     response_model=str,
-    description='Replace an OSCAL component-definition in datastore.'
+    description='Replace an OSCAL component-definition in datastore, or add it if absent and create.'
 )
 async def replace_component_definition(
-    component_definition_id: str, component_definition: UploadFile, token: str = depends_scheme
+    component_definition_id: str, component_definition: UploadFile, create: bool = False, token: str = depends_scheme
 ):
     """Replace OSCAL component-definition."""
-    oscal_path = 'component-definition'
-    oscal_file = component_definition
-    try:
-        # get a wrapped object
-        element_path = elements.ElementPath(oscal_path)
-        obm_type = element_path.get_obm_wrapped_type()
-        # get contents as string
-        contents = str(await oscal_file.read(), 'utf-8')
-        # save in temp file
-        temp_path = pathlib.Path(tempfile.gettempdir()) / 'upload.json'
-        with open(temp_path, 'w') as f:
-            f.write(contents)
-        # validate
-        oscal = obm_type.oscal_read(temp_path)
-    except Exception:
-        raise HTTPException(status_code=400, detail=f'Invalid {oscal_path} in file.')
-    # replace into db
-    result = db.replace_component_definition(component_definition_id, oscal.oscal_serialize_json())
-    if result is None:
-        raise HTTPException(status_code=404, detail=f'Not found {component_definition_id}')
-    # success!
-    return result
+    return await replace_oscal('component-definition', component_definition_id, component_definition, create)
+
+
+@app.patch(
+    '/component-definitions/component-definition-id',
+    tags=['Lifecycle: Component Definitions'],
+    response_model=str,
+    description='Patch an OSCAL component-definition in datastore with an RFC 6902 json patch or an RFC 7396 '
+    'merge patch, validating only the elements containing the changes.',
+    openapi_extra=patch_openapi
+)
+async def patch_component_definition(component_definition_id: str, request: Request, token: str = depends_scheme):
+    """Patch OSCAL component-definition."""
+    return await patch_oscal('component-definition', component_definition_id, request)
 
 
 @app.delete(
@@ -373,42 +634,44 @@ async def replace_component_definition(
 )
 async def delete_component_definition(component_definition_id: str, token: str = depends_scheme):
     """Delete OSCAL component-definition."""
-    # get from db
-    result = db.delete_component_definition(component_definition_id)
-    if result is None:
-        raise HTTPException(status_code=404, detail=f'Not found {component_definition_id}')
-    # success!
-    return result
+    return await delete_oscal('component-definition', component_definition_id)
 
 
 @app.get(
     '/component-definitions/id-list',
     tags=['Lifecycle: Component Definitions'],
-    response_model=str,
-    description='Get list OSCAL component-definition ids from datastore.'
+    response_model=dict,
+    description='Get page of OSCAL component-definition ids from datastore, '
+    'with the next-cursor of the following page, null on the last page.'
 )
-async def get_component_definition_id_list():
+async def get_component_definition_id_list(query: IdListQuery = depends):
     """Retrieve OSCAL component-definition ids."""
-    # get from db
-    result = db.get_component_definition_id_list()
-    # success!
-    return result
+    return await get_oscal_id_list('component-definition', query)
+
+
+@app.get(
+    '/component-definitions/summary-list',
+    tags=['Lifecycle: Component Definitions'],
+    response_model=dict,
+    description='Get page of OSCAL component-definition summaries from datastore, '
+    'filtered and sorted by summary fields, with the next-cursor of the following page, null on the last page.'
+)
+async def get_component_definition_summary_list(query: SummaryListQuery = depends):
+    """Retrieve OSCAL component-definition summaries."""
+    return await get_oscal_summary_list('component-definition', query)
 
 
 @app.get(
     '/component-definitions/component-definition-id',
     tags=['Lifecycle: Component Definitions'],
-    response_model=str,
-    description='Get an OSCAL component-definition from datastore.'
+    response_class=StreamingResponse,
+    description='Get an OSCAL component-definition from datastore, or the json array of the values at path of it.'
 )
-async def get_component_definition(component_definition_id: str):
+async def get_component_definition(
+    component_definition_id: str, replica: bool = replica_query, path: Union[str, None] = path_query
+):
     """Retrieve OSCAL component-definition."""
-    # get from db
-    result = db.get_component_definition(component_definition_id)
-    if result is None:
-        raise HTTPException(status_code=404, detail=f'Not found {component_definition_id}')
-    # success!
-    return result
+    return await get_oscal('component-definition', component_definition_id, replica, path)
     
     
 # ------------------------------
@@ -421,62 +684,37 @@ async def get_component_definition(component_definition_id: str):
     response_model=str,
     description='Add an OSCAL system-security-plan in datastore.'
 )
-async def add_system_security_plan(system_security_plan: UploadFile, token: str = depends_scheme):
+async def add_system_security_plan(
+    system_security_plan: UploadFile, background: bool = False, token: str = depends_scheme
+):
     """Add OSCAL system_security_plan."""
-    oscal_path = 'system-security-plan'
-    oscal_file = system_security_plan
-    try:
-        # get a wrapped object
-        element_path = elements.ElementPath(oscal_path)
-        obm_type = element_path.get_obm_wrapped_type()
-        # get contents as string
-        contents = str(await oscal_file.read(), 'utf-8')
-        # save in temp file
-        temp_path = pathlib.Path(tempfile.gettempdir()) / 'upload.json'
-        with open(temp_path, 'w') as f:
-            f.write(contents)
-        # validate
-        oscal = obm_type.oscal_read(temp_path)
-    except Exception:
-        raise HTTPException(status_code=400, detail=f'Invalid {oscal_path} in file.')
-    # add into db
-    result = db.add_system_security_plan(oscal.uuid, oscal.oscal_serialize_json())
-    # success!
-    return result
+    return await add_oscal('system-security-plan', system_security_plan, background)
 
 
 @app.put(
     '/system-security-plans/system-security-plan-id',
     tags=['Lifecycle: System Security Plans'],
     response_model=str,
-    description='Replace an OSCAL system-security-plan in datastore.'
+    description='Replace an OSCAL system-security-plan in datastore, or add it if absent and create.'
 )
 async def replace_system_security_plan(
-    system_security_plan_id: str, system_security_plan: UploadFile, token: str = depends_scheme
+    system_security_plan_id: str, system_security_plan: UploadFile, create: bool = False, token: str = depends_scheme
 ):
     """Replace OSCAL system-security-plan."""
-    oscal_path = 'system-security-plan'
-    oscal_file = system_security_plan
-    try:
-        # get a wrapped object
-        element_path = elements.ElementPath(oscal_path)
-        obm_type = element_path.get_obm_wrapped_type()
-        # get contents as string
-        contents = str(await oscal_file.read(), 'utf-8')
-        # save in temp file
-        temp_path = pathlib.Path(tempfile.gettempdir()) / 'upload.json'
-        with open(temp_path, 'w') as f:
-            f.write(contents)
-        # validate
-        oscal = obm_type.oscal_read(temp_path)
-    except Exception:
-        raise HTTPException(status_code=400, detail=f'Invalid {oscal_path} in file.')
-    # replace into db
-    result = db.replace_system_security_plan(system_security_plan_id, oscal.oscal_serialize_json())
-    if result is None:
-        raise HTTPException(status_code=404, detail=f'Not found {system_security_plan_id}')
-    # success!
-    return result
+    return await replace_oscal('system-security-plan', system_security_plan_id, system_security_plan, create)
+
+
+@app.patch(
+    '/system-security-plans/system-security-plan-id',
+    tags=['Lifecycle: System Security Plans'],
+    response_model=str,
+    description='Patch an OSCAL system-security-plan in datastore with an RFC 6902 json patch or an RFC 7396 '
+    'merge patch, validating only the elements containing the changes.',
+    openapi_extra=patch_openapi
+)
+async def patch_system_security_plan(system_security_plan_id: str, request: Request, token: str = depends_scheme):
+    """Patch OSCAL system-security-plan."""
+    return await patch_oscal('system-security-plan', system_security_plan_id, request)
 
 
 @app.delete(
@@ -487,42 +725,44 @@ async def replace_system_security_plan(
 )
 async def delete_system_security_plan(system_security_plan_id: str, token: str = depends_scheme):
     """Delete OSCAL system-security-plan."""
-    # get from db
-    result = db.delete_system_security_plan(system_security_plan_id)
-    if result is None:
-        raise HTTPException(status_code=404, detail=f'Not found {system_security_plan_id}')
-    # success!
-    return result
+    return await delete_oscal('system-security-plan', system_security_plan_id)
 
 
 @app.get(
     '/system-security-plans/id-list',
     tags=['Lifecycle: System Security Plans'],
-    response_model=str,
-    description='Get list OSCAL system-security-plans ids from datastore.'
+    response_model=dict,
+    description='Get page of OSCAL system-security-plans ids from datastore, '
+    'with the next-cursor of the following page, null on the last page.'
 )
-async def get_system_security_plan_id_list():
+async def get_system_security_plan_id_list(query: IdListQuery = depends):
     """Retrieve OSCAL system-security-plans ids."""
-    # get from db
-    result = db.get_system_security_plan_id_list()
-    # success!
-    return result
+    return await get_oscal_id_list('system-security-plan', query)
+
+
+@app.get(
+    '/system-security-plans/summary-list',
+    tags=['Lifecycle: System Security Plans'],
+    response_model=dict,
+    description='Get page of OSCAL system-security-plans summaries from datastore, '
+    'filtered and sorted by summary fields, with the next-cursor of the following page, null on the last page.'
+)
+async def get_system_security_plan_summary_list(query: SummaryListQuery = depends):
+    """Retrieve OSCAL system-security-plans summaries."""
+    return await get_oscal_summary_list('system-security-plan', query)
 
 
 @app.get(
     '/system-security-plans/system-security-plan-id',
     tags=['Lifecycle: System Security Plans'],
-    response_model=str,
-    description='Get an OSCAL system-security-plan from datastore.'
+    response_class=StreamingResponse,
+    description='Get an OSCAL system-security-plan from datastore, or the json array of the values at path of it.'
 )
-async def get_system_security_plan(system_security_plan_id: str):
+async def get_system_security_plan(
+    system_security_plan_id: str, replica: bool = replica_query, path: Union[str, None] = path_query
+):
     """Retrieve OSCAL system-security-plan."""
-    # get from db
-    result = db.get_system_security_plan(system_security_plan_id)
-    if result is None:
-        raise HTTPException(status_code=404, detail=f'Not found {system_security_plan_id}')
-    # success!
-    return result
+    return await get_oscal('system-security-plan', system_security_plan_id, replica, path)
     
     
 # ------------------------------
@@ -535,60 +775,35 @@ async def get_system_security_plan(system_security_plan_id: str):
     response_model=str,
     description='Add an OSCAL assessment-plan in datastore.'
 )
-async def add_assessment_plans(assessment_plan: UploadFile, token: str = depends_scheme):
+async def add_assessment_plans(assessment_plan: UploadFile, background: bool = False, token: str = depends_scheme):
     """Add OSCAL assessment_plan."""
-    oscal_path = 'assessment-plan'
-    oscal_file = assessment_plan
-    try:
-        # get a wrapped object
-        element_path = elements.ElementPath(oscal_path)
-        obm_type = element_path.get_obm_wrapped_type()
-        # get contents as string
-        contents = str(await oscal_file.read(), 'utf-8')
-        # save in temp file
-        temp_path = pathlib.Path(tempfile.gettempdir()) / 'upload.json'
-        with open(temp_path, 'w') as f:
-            f.write(contents)
-        # validate
-        oscal = obm_type.oscal_read(temp_path)
-    except Exception:
-        raise HTTPException(status_code=400, detail=f'Invalid {oscal_path} in file.')
-    # put into db
-    result = db.add_assessment_plan(oscal.uuid, oscal.oscal_serialize_json())
-    # success!
-    return result
+    return await add_oscal('assessment-plan', assessment_plan, background)
 
 
 @app.put(
     '/assessment-plans/assessment-plan-id',
     tags=['Lifecycle: Assessment Plans'],
     response_model=str,
-    description='Replace an OSCAL assessment-plan in datastore.'
+    description='Replace an OSCAL assessment-plan in datastore, or add it if absent and create.'
 )
-async def replace_assessment_plan(assessment_plan_id: str, assessment_plan: UploadFile, token: str = depends_scheme):
+async def replace_assessment_plan(
+    assessment_plan_id: str, assessment_plan: UploadFile, create: bool = False, token: str = depends_scheme
+):
     """Replace OSCAL assessment-plan."""
-    oscal_path = 'assessment-plan'
-    oscal_file = assessment_plan
-    try:
-        # get a wrapped object
-        element_path = elements.ElementPath(oscal_path)
-        obm_type = element_path.get_obm_wrapped_type()
-        # get contents as string
-        contents = str(await oscal_file.read(), 'utf-8')
-        # save in temp file
-        temp_path = pathlib.Path(tempfile.gettempdir()) / 'upload.json'
-        with open(temp_path, 'w') as f:
-            f.write(contents)
-        # validate
-        oscal = obm_type.oscal_read(temp_path)
-    except Exception:
-        raise HTTPException(status_code=400, detail=f'Invalid {oscal_path} in file.')
-    # replace into db
-    result = db.replace_assessment_plan(assessment_plan_id, oscal.oscal_serialize_json())
-    if result is None:
-        raise HTTPException(status_code=404, detail=f'Not found {assessment_plan_id}')
-    # success!
-    return result
+    return await replace_oscal('assessment-plan', assessment_plan_id, assessment_plan, create)
+
+
+@app.patch(
+    '/assessment-plans/assessment-plan-id',
+    tags=['Lifecycle: Assessment Plans'],
+    response_model=str,
+    description='Patch an OSCAL assessment-plan in datastore with an RFC 6902 json patch or an RFC 7396 merge patch, '
+    'validating only the elements containing the changes.',
+    openapi_extra=patch_openapi
+)
+async def patch_assessment_plan(assessment_plan_id: str, request: Request, token: str = depends_scheme):
+    """Patch OSCAL assessment-plan."""
+    return await patch_oscal('assessment-plan', assessment_plan_id, request)
 
 
 @app.delete(
@@ -599,42 +814,44 @@ async def replace_assessment_plan(assessment_plan_id: str, assessment_plan: Uplo
 )
 async def delete_assessment_plan(assessment_plan_id: str, token: str = depends_scheme):
     """Delete OSCAL assessment-plan."""
-    # get from db
-    result = db.delete_assessment_plan(assessment_plan_id)
-    if result is None:
-        raise HTTPException(status_code=404, detail=f'Not found {assessment_plan_id}')
-    # success!
-    return result
+    return await delete_oscal('assessment-plan', assessment_plan_id)
 
 
 @app.get(
     '/assessment-plans/id-list',
     tags=['Lifecycle: Assessment Plans'],
-    response_model=str,
-    description='Get list OSCAL assessment-plan ids from datastore.'
+    response_model=dict,
+    description='Get page of OSCAL assessment-plan ids from datastore, '
+    'with the next-cursor of the following page, null on the last page.'
 )
-async def get_assessment_plan_id_list():
+async def get_assessment_plan_id_list(query: IdListQuery = depends):
     """Retrieve OSCAL assessment-plan ids."""
-    # get from db
-    result = db.get_assessment_plan_id_list()
-    # success!
-    return result
+    return await get_oscal_id_list('assessment-plan', query)
+
+
+@app.get(
+    '/assessment-plans/summary-list',
+    tags=['Lifecycle: Assessment Plans'],
+    response_model=dict,
+    description='Get page of OSCAL assessment-plan summaries from datastore, '
+    'filtered and sorted by summary fields, with the next-cursor of the following page, null on the last page.'
+)
+async def get_assessment_plan_summary_list(query: SummaryListQuery = depends):
+    """Retrieve OSCAL assessment-plan summaries."""
+    return await get_oscal_summary_list('assessment-plan', query)
 
 
 @app.get(
     '/assessment-plans/assessment-plan-id',
     tags=['Lifecycle: Assessment Plans'],
-    response_model=str,
-    description='Get an OSCAL assessment-plan from datastore.'
+    response_class=StreamingResponse,
+    description='Get an OSCAL assessment-plan from datastore, or the json array of the values at path of it.'
 )
-async def get_assessment_plan(assessment_plan_id: str):
+async def get_assessment_plan(
+    assessment_plan_id: str, replica: bool = replica_query, path: Union[str, None] = path_query
+):
     """Retrieve OSCAL assessment-plan."""
-    # get from db
-    result = db.get_assessment_plan(assessment_plan_id)
-    if result is None:
-        raise HTTPException(status_code=404, detail=f'Not found {assessment_plan_id}')
-    # success!
-    return result
+    return await get_oscal('assessment-plan', assessment_plan_id, replica, path)
 
         
 # ------------------------------
@@ -647,62 +864,35 @@ async def get_assessment_plan(assessment_plan_id: str):
     response_model=str,
     description='Add an OSCAL assessment-results in datastore.'
 )
-async def add_assessment_results(assessment_results: UploadFile, token: str = depends_scheme):
+async def add_assessment_results(assessment_results: UploadFile, background: bool = False, token: str = depends_scheme):
     """Add OSCAL assessment_results."""
-    oscal_path = 'assessment-results'
-    oscal_file = assessment_results
-    try:
-        # get a wrapped object
-        element_path = elements.ElementPath(oscal_path)
-        obm_type = element_path.get_obm_wrapped_type()
-        # get contents as string
-        contents = str(await oscal_file.read(), 'utf-8')
-        # save in temp file
-        temp_path = pathlib.Path(tempfile.gettempdir()) / 'upload.json'
-        with open(temp_path, 'w') as f:
-            f.write(contents)
-        # validate
-        oscal = obm_type.oscal_read(temp_path)
-    except Exception:
-        raise HTTPException(status_code=400, detail=f'Invalid {oscal_path} in file.')
-    # put into db
-    result = db.add_assessment_results(oscal.uuid, oscal.oscal_serialize_json())
-    # success!
-    return result
+    return await add_oscal('assessment-results', assessment_results, background)
 
 
 @app.put(
     '/assessment-results/assessment-results-id',
     tags=['Lifecycle: Assessment Results'],
     response_model=str,
-    description='Replace an OSCAL assessment-results in datastore.'
+    description='Replace an OSCAL assessment-results in datastore, or add it if absent and create.'
 )
 async def replace_assessment_results(
-    assessment_results_id: str, assessment_results: UploadFile, token: str = depends_scheme
+    assessment_results_id: str, assessment_results: UploadFile, create: bool = False, token: str = depends_scheme
 ):
     """Replace OSCAL assessment-results."""
-    oscal_path = 'assessment-results'
-    oscal_file = assessment_results
-    try:
-        # get a wrapped object
-        element_path = elements.ElementPath(oscal_path)
-        obm_type = element_path.get_obm_wrapped_type()
-        # get contents as string
-        contents = str(await oscal_file.read(), 'utf-8')
-        # save in temp file
-        temp_path = pathlib.Path(tempfile.gettempdir()) / 'upload.json'
-        with open(temp_path, 'w') as f:
-            f.write(contents)
-        # validate
-        oscal = obm_type.oscal_read(temp_path)
-    except Exception:
-        raise HTTPException(status_code=400, detail=f'Invalid {oscal_path} in file.')
-    # replace into db
-    result = db.replace_assessment_results(assessment_results_id, oscal.oscal_serialize_json())
-    if result is None:
-        raise HTTPException(status_code=404, detail=f'Not found {assessment_results_id}')
-    # success!
-    return result
+    return await replace_oscal('assessment-results', assessment_results_id, assessment_results, create)
+
+
+@app.patch(
+    '/assessment-results/assessment-results-id',
+    tags=['Lifecycle: Assessment Results'],
+    response_model=str,
+    description='Patch an OSCAL assessment-results in datastore with an RFC 6902 json patch or an RFC 7396 '
+    'merge patch, validating only the elements containing the changes.',
+    openapi_extra=patch_openapi
+)
+async def patch_assessment_results(assessment_results_id: str, request: Request, token: str = depends_scheme):
+    """Patch OSCAL assessment-results."""
+    return await patch_oscal('assessment-results', assessment_results_id, request)
 
 
 @app.delete(
@@ -713,42 +903,44 @@ async def replace_assessment_results(
 )
 async def delete_assessment_results(assessment_results_id: str, token: str = depends_scheme):
     """Delete OSCAL assessment-results."""
-    # get from db
-    result = db.delete_assessment_results(assessment_results_id)
-    if result is None:
-        raise HTTPException(status_code=404, detail=f'Not found {assessment_results_id}')
-    # success!
-    return result
+    return await delete_oscal('assessment-results', assessment_results_id)
 
 
 @app.get(
     '/assessment-results/id-list',
     tags=['Lifecycle: Assessment Results'],
-    response_model=str,
-    description='Get list OSCAL assessment-results ids from datastore.'
+    response_model=dict,
+    description='Get page of OSCAL assessment-results ids from datastore, '
+    'with the next-cursor of the following page, null on the last page.'
 )
-async def get_assessment_results_id_list():
+async def get_assessment_results_id_list(query: IdListQuery = depends):
     """Retrieve OSCAL assessment-results ids."""
-    # get from db
-    result = db.get_assessment_results_id_list()
-    # success!
-    return result
+    return await get_oscal_id_list('assessment-results', query)
+
+
+@app.get(
+    '/assessment-results/summary-list',
+    tags=['Lifecycle: Assessment Results'],
+    response_model=dict,
+    description='Get page of OSCAL assessment-results summaries from datastore, '
+    'filtered and sorted by summary fields, with the next-cursor of the following page, null on the last page.'
+)
+async def get_assessment_results_summary_list(query: SummaryListQuery = depends):
+    """Retrieve OSCAL assessment-results summaries."""
+    return await get_oscal_summary_list('assessment-results', query)
 
 
 @app.get(
     '/assessment-results/assessment-results-id',
     tags=['Lifecycle: Assessment Results'],
-    response_model=str,
-    description='Get an OSCAL assessment-results from datastore.'
+    response_class=StreamingResponse,
+    description='Get an OSCAL assessment-results from datastore, or the json array of the values at path of it.'
 )
-async def get_assessment_results(assessment_results_id: str):
+async def get_assessment_results(
+    assessment_results_id: str, replica: bool = replica_query, path: Union[str, None] = path_query
+):
     """Retrieve OSCAL assessment-results."""
-    # get from db
-    result = db.get_assessment_results(assessment_results_id)
-    if result is None:
-        raise HTTPException(status_code=404, detail=f'Not found {assessment_results_id}')
-    # success!
-    return result
+    return await get_oscal('assessment-results', assessment_results_id, replica, path)
 
         
 # ------------------------------
@@ -761,62 +953,44 @@ async def get_assessment_results(assessment_results_id: str):
     response_model=str,
     description='Add an OSCAL plan-of-action-and-milestones in datastore.'
 )
-async def add_plan_of_action_and_milestones(plan_of_action_and_milestones: UploadFile, token: str = depends_scheme):
+async def add_plan_of_action_and_milestones(
+    plan_of_action_and_milestones: UploadFile, background: bool = False, token: str = depends_scheme
+):
     """Add OSCAL plan_of_action_and_milestones."""
-    oscal_path = 'plan-of-action-and-milestones'
-    oscal_file = plan_of_action_and_milestones
-    try:
-        # get a wrapped object
-        element_path = elements.ElementPath(oscal_path)
-        obm_type = element_path.get_obm_wrapped_type()
-        # get contents as string
-        contents = str(await oscal_file.read(), 'utf-8')
-        # save in temp file
-        temp_path = pathlib.Path(tempfile.gettempdir()) / 'upload.json'
-        with open(temp_path, 'w') as f:
-            f.write(contents)
-        # validate
-        oscal = obm_type.oscal_read(temp_path)
-    except Exception:
-        raise HTTPException(status_code=400, detail=f'Invalid {oscal_path} in file.')
-    # add into db
-    result = db.add_plan_of_action_and_milestones(oscal.uuid, oscal.oscal_serialize_json())
-    # success!
-    return result
+    return await add_oscal('plan-of-action-and-milestones', plan_of_action_and_milestones, background)
 
 
 @app.put(
     '/plan-of-action-and-milestones/plan-of-action-and-milestones-id',
     tags=['Lifecycle: Plan of Action and Milestones'],
     response_model=str,
-    description='Replace an OSCAL plan-of-action-and-milestones in datastore.'
+    description='Replace an OSCAL plan-of-action-and-milestones in datastore, or add it if absent and create.'
 )
 async def replace_plan_of_action_and_milestones(
-    plan_of_action_and_milestones_id: str, plan_of_action_and_milestones: UploadFile, token: str = depends_scheme
+    plan_of_action_and_milestones_id: str,
+    plan_of_action_and_milestones: UploadFile,
+    create: bool = False,
+    token: str = depends_scheme,
 ):
     """Replace OSCAL plan-of-action-and-milestones."""
-    oscal_path = 'plan-of-action-and-milestones'
-    oscal_file = plan_of_action_and_milestones
-    try:
-        # get a wrapped object
-        element_path = elements.ElementPath(oscal_path)
-        obm_type = element_path.get_obm_wrapped_type()
-        # get contents as string
-        contents = str(await oscal_file.read(), 'utf-8')
-        # save in temp file
-        temp_path = pathlib.Path(tempfile.gettempdir()) / 'upload.json'
-        with open(temp_path, 'w') as f:
-            f.write(contents)
-        # validate
-        oscal = obm_type.oscal_read(temp_path)
-    except Exception:
-        raise HTTPException(status_code=400, detail=f'Invalid {oscal_path} in file.')
-    # replace into db
-    result = db.replace_plan_of_action_and_milestones(plan_of_action_and_milestones_id, oscal.oscal_serialize_json())
-    if result is None:
-        raise HTTPException(status_code=404, detail=f'Not found {plan_of_action_and_milestones_id}')
-    # success!
-    return result
+    return await replace_oscal(
+        'plan-of-action-and-milestones', plan_of_action_and_milestones_id, plan_of_action_and_milestones, create
+    )
+
+
+@app.patch(
+    '/plan-of-action-and-milestones/plan-of-action-and-milestones-id',
+    tags=['Lifecycle: Plan of Action and Milestones'],
+    response_model=str,
+    description='Patch an OSCAL plan-of-action-and-milestones in datastore with an RFC 6902 json patch or an RFC 7396 '
+    'merge patch, validating only the elements containing the changes.',
+    openapi_extra=patch_openapi
+)
+async def patch_plan_of_action_and_milestones(
+    plan_of_action_and_milestones_id: str, request: Request, token: str = depends_scheme
+):
+    """Patch OSCAL plan-of-action-and-milestones."""
+    return await patch_oscal('plan-of-action-and-milestones', plan_of_action_and_milestones_id, request)
 
 
 @app.delete(
@@ -827,42 +1001,245 @@ async def replace_plan_of_action_and_milestones(
 )
 async def delete_plan_of_action_and_milestones(plan_of_action_and_milestones_id: str, token: str = depends_scheme):
     """Delete OSCAL plan-of-action-and-milestones."""
-    # get from db
-    result = db.delete_plan_of_action_and_milestones(plan_of_action_and_milestones_id)
-    if result is None:
-        raise HTTPException(status_code=404, detail=f'Not found {plan_of_action_and_milestones_id}')
-    # success!
-    return result
+    return await delete_oscal('plan-of-action-and-milestones', plan_of_action_and_milestones_id)
 
 
 @app.get(
     '/plan-of-action-and-milestones/id-list',
     tags=['Lifecycle: Plan of Action and Milestones'],
-    response_model=str,
-    description='Get list OSCAL plan-of-action-and-milestones ids from datastore.'
+    response_model=dict,
+    description='Get page of OSCAL plan-of-action-and-milestones ids from datastore, '
+    'with the next-cursor of the following page, null on the last page.'
 )
-async def get_plan_of_action_and_milestones_id_list():
+async def get_plan_of_action_and_milestones_id_list(query: IdListQuery = depends):
     """Retrieve OSCAL plan-of-action-and-milestones ids."""
-    # get from db
-    result = db.get_plan_of_action_and_milestones_id_list()
-    # success!
-    return result
+    return await get_oscal_id_list('plan-of-action-and-milestones', query)
+
+
+@app.get(
+    '/plan-of-action-and-milestones/summary-list',
+    tags=['Lifecycle: Plan of Action and Milestones'],
+    response_model=dict,
+    description='Get page of OSCAL plan-of-action-and-milestones summaries from datastore, '
+    'filtered and sorted by summary fields, with the next-cursor of the following page, null on the last page.'
+)
+async def get_plan_of_action_and_milestones_summary_list(query: SummaryListQuery = depends):
+    """Retrieve OSCAL plan-of-action-and-milestones summaries."""
+    return await get_oscal_summary_list('plan-of-action-and-milestones', query)
 
 
 @app.get(
     '/plan-of-action-and-milestones/plan-of-action-and-milestones-id',
     tags=['Lifecycle: Plan of Action and Milestones'],
-    response_model=str,
-    description='Get an OSCAL plan-of-action-and-milestones from datastore.'
+    response_class=StreamingResponse,
+    description='Get an OSCAL plan-of-action-and-milestones from datastore, '
+    'or the json array of the values at path of it.'
 )
-async def get_plan_of_action_and_milestones(plan_of_action_and_milestones_id: str):
+async def get_plan_of_action_and_milestones(
+    plan_of_action_and_milestones_id: str, replica: bool = replica_query, path: Union[str, None] = path_query
+):
     """Retrieve OSCAL plan-of-action-and-milestones."""
+    return await get_oscal('plan-of-action-and-milestones', plan_of_action_and_milestones_id, replica, path)
+
+
+# ------------------------------
+# Bulk
+
+
+@app.post(
+    '/bulk',
+    tags=['Lifecycle: Bulk'],
+    response_model=List[dict],
+    description='Add many OSCAL documents of any type in datastore, '
+    'from a zip or tar archive of json files or from ndjson with one document per line.'
+)
+async def add_bulk(documents: UploadFile, token: str = depends_scheme):
+    """Add OSCAL documents in bulk."""
+    max_size = helper.get_upload_max_size()
+    try:
+        items = await workers.io(bulk.read_documents, documents.file, max_size)
+    except bulk.BulkError as e:
+        raise HTTPException(status_code=400, detail=f'Invalid documents in file: {e}')
+    logger.info(f'add bulk: {len(items)} documents')
+    # validate in parallel
+    batch_size = helper.get_bulk_batch_size()
+    batches = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+    validated_batches = await workers.cpu_map(validate_batch, batches)
+    result = []
+    rows = []
+    for validated_batch in validated_batches:
+        for name, oscal_path, validated, error in validated_batch:
+            status = {'name': name, 'type': oscal_path}
+            if error is None:
+                status['uuid'] = validated.uuid
+                document = (validated.uuid, validated.payload, validated.columns, validated.props, validated.summary)
+                rows.append((oscal_path, *document))
+            else:
+                status['status'] = 'invalid'
+                status['detail'] = error
+            result.append(status)
+    # add into db in a single transaction
+    errors = iter(await db.add_documents(rows))
+    for status in result:
+        if 'status' not in status:
+            error = next(errors)
+            status['status'] = 'added' if error is None else 'rejected'
+            if error is not None:
+                status['detail'] = error
+    # success!
+    return result
+
+
+# ------------------------------
+# Search
+
+
+@app.get(
+    '/props/search',
+    tags=['Search'],
+    response_model=List[dict],
+    description='Find OSCAL documents with a metadata prop of name and value, and of namespace ns if given, '
+    'of model type if given else of all model types.'
+)
+async def search_props(name: str, value: str, ns: Union[str, None] = None, model_type: Union[str, None] = None):
+    """Find OSCAL documents by metadata prop."""
+    if model_type is not None:
+        check_model_type(model_type)
+    result = []
+    for oscal_path in [model_type] if model_type else models:
+        oids = await db.find_by_prop(oscal_path, name, value, ns)
+        result.extend({'type': oscal_path, 'uuid': oid} for oid in oids)
+    # success!
+    return result
+
+
+@app.get(
+    '/search',
+    tags=['Search'],
+    response_model=List[dict],
+    description='Find OSCAL documents whose control and part ids, titles, prose or prop values contain all words of '
+    'query, a word ending in * as a prefix, of model type if given else of all model types. Best matches first, '
+    'each with a snippet of a match.'
+)
+async def search_documents(
+    query: str = search_query,
+    model_type: Union[str, None] = None,
+    limit: Union[int, None] = search_limit_query,
+):
+    """Find OSCAL documents by full text search."""
+    if model_type is not None:
+        check_model_type(model_type)
+    limit = min(limit or helper.get_search_limit(), helper.get_search_max_limit())
+    return await db.search(query, model_type, limit)
+
+
+# ------------------------------
+# Revisions
+
+
+@app.get(
+    '/revisions/revision-list',
+    tags=['Revisions'],
+    response_model=List[dict],
+    description='Get revisions of an OSCAL document of model type, oldest first, each with the time it was replaced, '
+    'ending with the current version.'
+)
+async def get_revision_list(model_type: str, document_id: str):
+    """Retrieve OSCAL document revisions."""
+    check_model_type(model_type)
+    result = await db.get_revision_list(model_type, document_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f'Not found {document_id}')
+    # success!
+    return result
+
+
+@app.get(
+    '/revisions/revision-id',
+    tags=['Revisions'],
+    response_class=Response,
+    description='Get an OSCAL document of model type as it was at revision.'
+)
+async def get_revision(model_type: str, document_id: str, revision: int):
+    """Retrieve OSCAL document revision."""
+    check_model_type(model_type)
+    result = await db.get_revision(model_type, document_id, revision)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f'Not found {document_id} revision {revision}')
+    # success!
+    return Response(content=result, media_type='application/json')
+
+
+# ------------------------------
+# Jobs
+
+
+@app.get(
+    '/jobs/job-id',
+    tags=['Jobs'],
+    response_model=dict,
+    description='Get status of a background add job: queued, validating, storing, done or failed.'
+)
+async def get_job(job_id: str):
+    """Retrieve job status."""
     # get from db
-    result = db.get_plan_of_action_and_milestones(plan_of_action_and_milestones_id)
+    result = await db.get_job(job_id)
     if result is None:
-        raise HTTPException(status_code=404, detail=f'Not found {plan_of_action_and_milestones_id}')
+        raise HTTPException(status_code=404, detail=f'Not found {job_id}')
     # success!
     return result
 
 
-    
\ No newline at end of file
+# ------------------------------
+# Statistics
+
+
+@app.post(
+    '/storage/dictionary',
+    tags=['Storage'],
+    response_model=dict,
+    description='Train a compression dictionary on a sample of the stored documents, '
+    'used to compress documents stored from then on.'
+)
+async def train_dictionary(token: str = depends_scheme):
+    """Train compression dictionary."""
+    try:
+        return await db.train_dictionary()
+    except NotImplementedError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
+
+@app.get(
+    '/statistics/validation-cache',
+    tags=['Statistics'],
+    response_model=dict,
+    description='Get validation cache hit and miss counters.'
+)
+async def get_validation_cache_statistics():
+    """Retrieve validation cache statistics."""
+    return validation_cache.stats()
+
+
+@app.get(
+    '/statistics/document-cache',
+    tags=['Statistics'],
+    response_model=dict,
+    description='Get parsed document cache hit and miss counters, of the documents projections are read from.'
+)
+async def get_document_cache_statistics():
+    """Retrieve document cache statistics."""
+    return db.document_cache_stats()
+
+
+@app.get(
+    '/statistics/fragments',
+    tags=['Statistics'],
+    response_model=dict,
+    description='Get counts and bytes of the stored document fragments, and fragment cache hit and miss counters.'
+)
+async def get_fragment_statistics():
+    """Retrieve fragment statistics."""
+    try:
+        return await db.fragment_stats()
+    except NotImplementedError as e:
+        raise HTTPException(status_code=501, detail=str(e))
@@ -0,0 +1,290 @@
+# -*- mode:python; coding:utf-8 -*-
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""OSCAL Exchange Protocol."""
+import copy
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PatchError(Exception):
+    """Patch error."""
+
+
+def escape(key):
+    """Escape key as RFC 6901 json pointer token."""
+    return str(key).replace('~', '~0').replace('/', '~1')
+
+
+def unescape(token):
+    """Unescape RFC 6901 json pointer token."""
+    return token.replace('~1', '/').replace('~0', '~')
+
+
+def parse_pointer(pointer):
+    """Parse RFC 6901 json pointer into tokens."""
+    if pointer == '':
+        return []
+    if not pointer.startswith('/'):
+        raise PatchError(f'invalid pointer {pointer}')
+    return [unescape(token) for token in pointer[1:].split('/')]
+
+
+def equal(a, b):
+    """Compare json values, unlike == telling true from 1 and 1.0 from 1."""
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(equal(value, b[key]) for key, value in a.items())
+    if isinstance(a, list):
+        return len(a) == len(b) and all(equal(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+def diff(old, new):
+    """Get RFC 6902 json patch turning old into new.
+
+    Objects are compared by key and arrays by position, after trimming their common head and tail, so the patch of
+    an edit to a large document is about the size of the edit.
+    """
+    ops = []
+    _diff(old, new, '', ops)
+    return ops
+
+
+def _diff(old, new, pointer, ops):
+    """Append ops turning old into new at pointer."""
+    if type(old) is not type(new):
+        ops.append({'op': 'replace', 'path': pointer, 'value': new})
+    elif isinstance(old, dict):
+        _diff_object(old, new, pointer, ops)
+    elif isinstance(old, list):
+        _diff_array(old, new, pointer, ops)
+    elif not equal(old, new):
+        ops.append({'op': 'replace', 'path': pointer, 'value': new})
+
+
+def _diff_object(old, new, pointer, ops):
+    """Append ops turning object old into object new at pointer, by key."""
+    for key in old:
+        if key not in new:
+            ops.append({'op': 'remove', 'path': f'{pointer}/{escape(key)}'})
+    for key, value in new.items():
+        if key in old:
+            _diff(old[key], value, f'{pointer}/{escape(key)}', ops)
+        else:
+            ops.append({'op': 'add', 'path': f'{pointer}/{escape(key)}', 'value': value})
+
+
+def _diff_array(old, new, pointer, ops):
+    """Append ops turning array old into array new at pointer, by position after their common head and tail."""
+    head = 0
+    while head < min(len(old), len(new)) and equal(old[head], new[head]):
+        head += 1
+    tail = 0
+    while tail < min(len(old), len(new)) - head and equal(old[-1 - tail], new[-1 - tail]):
+        tail += 1
+    old_middle = old[head:len(old) - tail]
+    new_middle = new[head:len(new) - tail]
+    common = min(len(old_middle), len(new_middle))
+    for i in range(common):
+        _diff(old_middle[i], new_middle[i], f'{pointer}/{head + i}', ops)
+    # removed from the end backwards, so earlier indexes hold
+    for i in reversed(range(common, len(old_middle))):
+        ops.append({'op': 'remove', 'path': f'{pointer}/{head + i}'})
+    for i in range(common, len(new_middle)):
+        ops.append({'op': 'add', 'path': f'{pointer}/{head + i}', 'value': new_middle[i]})
+
+
+def apply(doc, ops, in_place=False):
+    """Apply RFC 6902 json patch to doc, returning the patched doc and leaving doc unchanged unless in place."""
+    if not isinstance(ops, list):
+        raise PatchError('patch is not an array of operations')
+    if not in_place:
+        doc = copy.deepcopy(doc)
+    for op in ops:
+        doc = _apply(doc, op)
+    return doc
+
+
+def _resolve(doc, tokens, pointer):
+    """Get container of the last token of pointer."""
+    for token in tokens[:-1]:
+        doc = _child(doc, token, pointer)
+    return doc
+
+
+def _index(container, part, pointer, append=False):
+    """Get array index of pointer part."""
+    if append and part == '-':
+        return len(container)
+    if not part.isdigit() or (part.startswith('0') and part != '0'):
+        raise PatchError(f'invalid array index {part} in {pointer}')
+    index = int(part)
+    if index > len(container) or (index == len(container) and not append):
+        raise PatchError(f'array index {part} out of range in {pointer}')
+    return index
+
+
+def _child(doc, token, pointer):
+    """Get child of doc at token."""
+    if isinstance(doc, dict):
+        if token not in doc:
+            raise PatchError(f'{pointer} not found')
+        return doc[token]
+    if isinstance(doc, list):
+        return doc[_index(doc, token, pointer)]
+    raise PatchError(f'{pointer} not found')
+
+
+def _get(doc, pointer):
+    """Get value at pointer."""
+    for token in parse_pointer(pointer):
+        doc = _child(doc, token, pointer)
+    return doc
+
+
+def _add(doc, pointer, value):
+    """Add value at pointer, returning doc."""
+    tokens = parse_pointer(pointer)
+    if not tokens:
+        return value
+    container = _resolve(doc, tokens, pointer)
+    if isinstance(container, dict):
+        container[tokens[-1]] = value
+    elif isinstance(container, list):
+        container.insert(_index(container, tokens[-1], pointer, append=True), value)
+    else:
+        raise PatchError(f'{pointer} not found')
+    return doc
+
+
+def _remove(doc, pointer):
+    """Remove value at pointer, returning (doc, removed value)."""
+    tokens = parse_pointer(pointer)
+    if not tokens:
+        raise PatchError('cannot remove the whole document')
+    container = _resolve(doc, tokens, pointer)
+    if isinstance(container, dict):
+        if tokens[-1] not in container:
+            raise PatchError(f'{pointer} not found')
+        return doc, container.pop(tokens[-1])
+    if isinstance(container, list):
+        return doc, container.pop(_index(container, tokens[-1], pointer))
+    raise PatchError(f'{pointer} not found')
+
+
+def _apply(doc, op):
+    """Apply operation to doc, returning doc."""
+    if not isinstance(op, dict) or 'path' not in op:
+        raise PatchError(f'invalid operation {op}')
+    name = op.get('op')
+    path = op['path']
+    if name not in _operations:
+        raise PatchError(f'unknown operation {name}')
+    if name in ('add', 'replace', 'test') and 'value' not in op:
+        raise PatchError(f'{name} {path} has no value')
+    if name in ('move', 'copy') and 'from' not in op:
+        raise PatchError(f'{name} {path} has no from')
+    return _operations[name](doc, op)
+
+
+def _apply_add(doc, op):
+    """Apply add operation."""
+    return _add(doc, op['path'], copy.deepcopy(op['value']))
+
+
+def _apply_remove(doc, op):
+    """Apply remove operation."""
+    return _remove(doc, op['path'])[0]
+
+
+def _apply_replace(doc, op):
+    """Apply replace operation."""
+    if not parse_pointer(op['path']):
+        return copy.deepcopy(op['value'])
+    doc, _ = _remove(doc, op['path'])
+    return _add(doc, op['path'], copy.deepcopy(op['value']))
+
+
+def _apply_move(doc, op):
+    """Apply move operation."""
+    if op['path'].startswith(op['from'] + '/'):
+        raise PatchError(f'cannot move {op["from"]} into itself')
+    doc, value = _remove(doc, op['from'])
+    return _add(doc, op['path'], value)
+
+
+def _apply_copy(doc, op):
+    """Apply copy operation."""
+    return _add(doc, op['path'], copy.deepcopy(_get(doc, op['from'])))
+
+
+def _apply_test(doc, op):
+    """Apply test operation."""
+    if not equal(_get(doc, op['path']), op['value']):
+        raise PatchError(f'test {op["path"]} failed')
+    return doc
+
+
+# operation name -> function applying it to doc
+_operations = {
+    'add': _apply_add,
+    'remove': _apply_remove,
+    'replace': _apply_replace,
+    'move': _apply_move,
+    'copy': _apply_copy,
+    'test': _apply_test,
+}
+
+
+def changed_paths(ops):
+    """Get token paths of the values json patch operations change, test operations changing none."""
+    paths = []
+    for op in ops:
+        if op.get('op') == 'test':
+            continue
+        paths.append(parse_pointer(op['path']))
+        if op.get('op') == 'move':
+            paths.append(parse_pointer(op['from']))
+    return paths
+
+
+def merge(doc, patch):
+    """Apply RFC 7396 json merge patch to doc, returning the patched doc and changing doc in place if an object."""
+    if not isinstance(patch, dict):
+        return copy.deepcopy(patch)
+    if not isinstance(doc, dict):
+        doc = {}
+    for key, value in patch.items():
+        if value is None:
+            doc.pop(key, None)
+        else:
+            doc[key] = merge(doc.get(key), value)
+    return doc
+
+
+def merge_changed_paths(patch, tokens=None):
+    """Get token paths of the values json merge patch sets or removes."""
+    tokens = tokens or []
+    if not isinstance(patch, dict):
+        return [tokens]
+    paths = []
+    for key, value in patch.items():
+        if isinstance(value, dict) and value:
+            paths.extend(merge_changed_paths(value, tokens + [key]))
+        else:
+            paths.append(tokens + [key])
+    return paths
@@ -0,0 +1,90 @@
+# -*- mode:python; coding:utf-8 -*-
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""OSCAL Exchange Protocol."""
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# step selecting every item of an array or value of an object
+WILDCARD = '*'
+
+# steps of the JSONPath subset: .name, .*, [n], [*], ['name'] and ["name"]
+_jsonpath_step = re.compile(r'\.([A-Za-z_][\w-]*|\*)|\[(\d+|\*)\]|\[\'([^\']*)\'\]|\["([^"]*)"\]')
+
+
+class ProjectionError(Exception):
+    """Projection error."""
+
+
+def parse_path(path, oscal_path):
+    """Parse projection path of document of model type to steps, names, array indexes or WILDCARD.
+
+    Paths are trestle element paths, like catalog.groups.*.controls.*.id or catalog.groups.0, or JSONPath, like
+    $.catalog.groups[*].controls[*].id, without filters or recursive descent.
+    """
+    steps = _parse_jsonpath(path) if path.startswith('$') else _parse_element_path(path)
+    if steps and steps[0] != oscal_path:
+        raise ProjectionError(f'path {path} does not start at {oscal_path}')
+    return steps
+
+
+def _parse_element_path(path):
+    """Parse element path, parts of aliases, numbers and wildcards separated by dots."""
+    parts = path.split('.')
+    if not all(parts):
+        raise ProjectionError(f'invalid element path {path}, empty part')
+    if parts[0] == WILDCARD:
+        raise ProjectionError(f'invalid element path {path}, starts with wildcard')
+    return [int(part) if part.isdigit() else part for part in parts]
+
+
+def _parse_jsonpath(path):
+    """Parse JSONPath of the supported subset."""
+    steps = []
+    position = 1
+    while position < len(path):
+        match = _jsonpath_step.match(path, position)
+        if match is None:
+            raise ProjectionError(f'unsupported JSONPath {path} at {path[position:]}')
+        name, index, *quoted = match.groups()
+        if name is not None:
+            steps.append(name)
+        elif index is not None:
+            steps.append(WILDCARD if index == WILDCARD else int(index))
+        else:
+            steps.append(next(value for value in quoted if value is not None))
+        position = match.end()
+    return steps
+
+
+def select(obj, steps):
+    """Get values of json object at steps, in document order, none if the path is not in the document."""
+    values = [obj]
+    for step in steps:
+        selected = []
+        for value in values:
+            if step == WILDCARD:
+                if isinstance(value, list):
+                    selected.extend(value)
+                elif isinstance(value, dict):
+                    selected.extend(value.values())
+            elif isinstance(value, list):
+                if isinstance(step, int) and step < len(value):
+                    selected.append(value[step])
+            elif isinstance(value, dict) and str(step) in value:
+                selected.append(value[str(step)])
+        values = selected
+    return values
@@ -0,0 +1,217 @@
+# -*- mode:python; coding:utf-8 -*-
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""OSCAL Exchange Protocol."""
+import datetime
+import functools
+import hashlib
+import json
+import logging
+
+from helper import helper
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+
+def dumps(obj):
+    """Serialize json object compact and unescaped, as trestle serializes the OSCAL documents stored."""
+    return orjson.dumps(obj).decode('utf-8')
+
+
+def serialize_json(oscal):
+    """Serialize OSCAL object as wrapped json."""
+    return oscal.oscal_serialize_json()
+
+
+def prop_value(name):
+    """Get extractor of the value of the named metadata prop."""
+
+    def extract(oscal):
+        if oscal.metadata.props is not None:
+            for prop in oscal.metadata.props:
+                if prop.name == name:
+                    return prop.value
+        return None
+
+    return extract
+
+
+def count_elements(obj, names, counts=None):
+    """Count items of the arrays of the named elements, at any depth of json object."""
+    if counts is None:
+        counts = dict.fromkeys(names, 0)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            if key in counts and isinstance(value, list):
+                counts[key] += len(value)
+            count_elements(value, names, counts)
+    elif isinstance(obj, list):
+        for value in obj:
+            count_elements(value, names, counts)
+    return counts
+
+
+# element name -> field of the full text search index holding its string values
+search_keys = {
+    'id': 'ids',
+    'control-id': 'ids',
+    'param-id': 'ids',
+    'title': 'titles',
+    'prose': 'text',
+    'description': 'text',
+    'remarks': 'text',
+}
+
+
+def search_fields(obj, fields=None):
+    """Collect the ids, titles and text of the elements of json object, at any depth, as indexed for search.
+
+    Besides the elements of search_keys, ids include the with-ids of profile imports and text the values of props.
+    """
+    if fields is None:
+        fields = {'ids': [], 'titles': [], 'text': []}
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            if isinstance(value, str) and key in search_keys:
+                fields[search_keys[key]].append(value)
+            elif key == 'with-ids' and isinstance(value, list):
+                fields['ids'].extend(item for item in value if isinstance(item, str))
+            elif key == 'props' and isinstance(value, list):
+                fields['text'].extend(
+                    prop['value'] for prop in value if isinstance(prop, dict) and isinstance(prop.get('value'), str)
+                )
+            search_fields(value, fields)
+    elif isinstance(obj, list):
+        for value in obj:
+            search_fields(value, fields)
+    return fields
+
+
+def utc_timestamp(value):
+    """Normalize iso 8601 timestamp to utc with microseconds, so timestamps order as text; None if not one."""
+    try:
+        timestamp = datetime.datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=datetime.timezone.utc)
+    return timestamp.astimezone(datetime.timezone.utc).isoformat(timespec='microseconds')
+
+
+class Model():
+    """OSCAL model type served by OXP."""
+
+    def __init__(self, oscal_path, table, directory, schema, indexes=None, counted=None, serializer=serialize_json):
+        """Init."""
+        self.oscal_path = oscal_path
+        self.table = table
+        # directory of the model type in a trestle workspace
+        self.directory = directory
+        # file name of the official OSCAL json schema
+        self.schema = schema
+        # secondary index column name -> extractor of value from OSCAL object
+        self.indexes = indexes or {}
+        # names of the elements counted in document summaries
+        self.counted = counted or []
+        self.serializer = serializer
+
+    @functools.cached_property
+    def obm_type(self):
+        """Get trestle model type, importing the trestle models on first use."""
+        import trestle.core.models.elements as elements
+        element_path = elements.ElementPath(self.oscal_path)
+        return element_path.get_obm_wrapped_type()
+
+    def serialize(self, oscal):
+        """Serialize OSCAL object for storage."""
+        return self.serializer(oscal)
+
+    def extract(self, oscal):
+        """Extract secondary index column values from OSCAL object."""
+        return {column: extractor(oscal) for column, extractor in self.indexes.items()}
+
+    def summarize(self, payload):
+        """Summarize serialized OSCAL document, as listed without reading documents."""
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        obj = json.loads(payload)[self.oscal_path]
+        metadata = obj.get('metadata', {})
+        return {
+            'title': metadata.get('title'),
+            'version': metadata.get('version'),
+            'oscal-version': metadata.get('oscal-version'),
+            'last-modified': utc_timestamp(metadata.get('last-modified')),
+            'size': len(payload),
+            'digest': hashlib.sha256(payload).hexdigest(),
+            'counts': count_elements(obj, self.counted),
+        }
+
+
+models = {
+    model.oscal_path: model
+    for model in [
+        Model(
+            'catalog',
+            'CATALOGS',
+            'catalogs',
+            'oscal_catalog_schema.json',
+            counted=['groups', 'controls', 'params'],
+        ),
+        Model(
+            'profile',
+            'PROFILES',
+            'profiles',
+            'oscal_profile_schema.json',
+            indexes={helper.get_profile_mnemonic(): prop_value(helper.get_profile_mnemonic())},
+            counted=['imports', 'set-parameters', 'alters'],
+        ),
+        Model(
+            'component-definition',
+            'COMPONENT_DEFINITIONS',
+            'component-definitions',
+            'oscal_component_schema.json',
+            counted=['components', 'control-implementations', 'implemented-requirements'],
+        ),
+        Model(
+            'system-security-plan',
+            'SYSTEM_SECURITY_PLANS',
+            'system-security-plans',
+            'oscal_ssp_schema.json',
+            counted=['components', 'users', 'implemented-requirements'],
+        ),
+        Model(
+            'assessment-plan',
+            'ASSESSMENT_PLANS',
+            'assessment-plans',
+            'oscal_assessment-plan_schema.json',
+            counted=['tasks', 'include-controls'],
+        ),
+        Model(
+            'assessment-results',
+            'ASSESSMENT_RESULTS',
+            'assessment-results',
+            'oscal_assessment-results_schema.json',
+            counted=['results', 'findings', 'observations', 'risks'],
+        ),
+        Model(
+            'plan-of-action-and-milestones',
+            'PLAN_OF_ACTION_AND_MILESTONES',
+            'plan-of-action-and-milestones',
+            'oscal_poam_schema.json',
+            counted=['poam-items', 'findings', 'observations', 'risks'],
+        ),
+    ]
+}
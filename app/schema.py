@@ -0,0 +1,166 @@
+# -*- mode:python; coding:utf-8 -*-
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""OSCAL Exchange Protocol."""
+import functools
+import json
+import logging
+import os
+
+import fastjsonschema
+
+from helper import helper
+
+from registry import models
+
+logger = logging.getLogger(__name__)
+
+# unicode classes of the OSCAL schema patterns unknown to python re, as translated in the trestle models
+unicode_classes = {
+    'L': (
+        r'A-Za-z\u00C0-\u00D6\u00D8-\u00F6\u00F8-\u02FF\u0370-\u037D\u037F-\u1FFF\u200C-\u200D'
+        r'\u2070-\u218F\u2C00-\u2FEF\u3001-\uD7FF\uF900-\uFDCF\uFDF0-\uFFFD'
+    ),
+    'N': r'0-9',
+}
+
+
+class SchemaError(Exception):
+    """Schema error, locating the offending value by json pointer."""
+
+    def __init__(self, pointer, message):
+        """Init."""
+        super().__init__(pointer, message)
+        self.pointer = pointer
+        self.message = message
+
+    def __str__(self):
+        """Get pointer and message."""
+        return f'{self.pointer}: {self.message}'
+
+
+def json_pointer(path):
+    """Get RFC 6901 json pointer of path of keys and indexes."""
+    return ''.join('/' + str(part).replace('~', '~0').replace('/', '~1') for part in path)
+
+
+def translate_pattern(pattern):
+    r"""Translate \p{..} and \P{..} unicode classes of pattern to python re ranges."""
+    translated = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == '\\' and pattern[i + 1:i + 3] in ('p{', 'P{'):
+            end = pattern.index('}', i)
+            ranges = unicode_classes[pattern[i + 3:end]]
+            translated.append(f'[^{ranges}]' if pattern[i + 1] == 'P' else f'[{ranges}]')
+            i = end + 1
+            continue
+        if c == '\\':
+            translated.append(pattern[i:i + 2])
+            i += 2
+            continue
+        if c == '[':
+            text, i = translate_class(pattern, i)
+            translated.append(text)
+            continue
+        translated.append(c)
+        i += 1
+    return ''.join(translated)
+
+
+def translate_class(pattern, i):
+    r"""Translate character class of pattern starting at i, returning it and the index past its end.
+
+    Python re has no negated class inside a class, so a class holding \P{..} becomes an alternation of its members,
+    and a negated one a lookahead excluding its other members before a character of every \P{..} range.
+    """
+    negated = pattern.startswith('[^', i)
+    start = i + 2 if negated else i + 1
+    members = []
+    excluded = []
+    j = start
+    # a ] first in the class is a member
+    while j < len(pattern) and (pattern[j] != ']' or j == start):
+        if pattern[j] == '\\' and pattern[j + 1:j + 3] in ('p{', 'P{'):
+            end = pattern.index('}', j)
+            ranges = unicode_classes[pattern[j + 3:end]]
+            (excluded if pattern[j + 1] == 'P' else members).append(ranges)
+            j = end + 1
+        elif pattern[j] == '\\':
+            members.append(pattern[j:j + 2])
+            j += 2
+        else:
+            members.append(pattern[j])
+            j += 1
+    members = ''.join(members)
+    if not excluded:
+        return f'[{"^" if negated else ""}{members}]', j + 1
+    if negated:
+        lookaheads = ([f'(?![{members}])'] if members else []) + [f'(?=[{ranges}])' for ranges in excluded[1:]]
+        return f'(?:{"".join(lookaheads)}[{excluded[0]}])', j + 1
+    alternatives = ([f'[{members}]'] if members else []) + [f'[^{ranges}]' for ranges in excluded]
+    return f'(?:{"|".join(alternatives)})', j + 1
+
+
+def translate_patterns(schema):
+    """Translate patterns of schema in place."""
+    if isinstance(schema, dict):
+        for key, value in schema.items():
+            if key == 'pattern' and isinstance(value, str):
+                schema[key] = translate_pattern(value)
+            else:
+                translate_patterns(value)
+    elif isinstance(schema, list):
+        for value in schema:
+            translate_patterns(value)
+    return schema
+
+
+def get_schema(oscal_path):
+    """Get json schema of wrapped OSCAL model, official if configured else that of the trestle model."""
+    model = models[oscal_path]
+    schema_dir = helper.get_oscal_schema_dir()
+    if schema_dir:
+        with open(os.path.join(schema_dir, model.schema), 'r') as f:
+            return translate_patterns(json.load(f))
+    schema = model.obm_type.model_json_schema(by_alias=True)
+    defs = schema.pop('$defs', {})
+    return {
+        'type': 'object',
+        'properties': {
+            oscal_path: schema
+        },
+        'required': [oscal_path],
+        'additionalProperties': False,
+        '$defs': defs,
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def get_validator(oscal_path):
+    """Get compiled validator of wrapped OSCAL model, compiled once per process on first use."""
+    # defaults are not filled in: a member of an anyOf failing after filling them would fail the next member
+    validator = fastjsonschema.compile(get_schema(oscal_path), use_default=False)
+    logger.info(f'schema: compiled {oscal_path}')
+    return validator
+
+
+def check(oscal_path, obj):
+    """Check wrapped OSCAL object against schema, raising SchemaError at the first offending value."""
+    try:
+        get_validator(oscal_path)(obj)
+    except fastjsonschema.JsonSchemaValueException as e:
+        message = e.message.removeprefix(e.name).strip()
+        raise SchemaError(json_pointer(e.path[1:]), message)
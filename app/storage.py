@@ -0,0 +1,1615 @@
+# -*- mode:python; coding:utf-8 -*-
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""OSCAL Exchange Protocol."""
+import abc
+import base64
+import functools
+import hashlib
+import heapq
+import json
+import logging
+import os
+import shutil
+import sqlite3 as db
+import tempfile
+import threading
+import time
+import urllib.parse
+
+from cache import FragmentCache
+
+import codec
+
+from fastapi import HTTPException
+
+import fragment
+
+from helper import helper
+
+from registry import models
+
+logger = logging.getLogger(__name__)
+
+
+class Connections():
+    """Per-thread sqlite connections, each opened on first use by its thread.
+
+    Read only connections open an immutable snapshot, which reset replaces: each thread reopens its connection on its
+    next use after a reset.
+
+    Streams and backups, which hold a read transaction of their own beyond the call that starts them, acquire a
+    connection from a pool of idle connections instead, and release it when done.
+    """
+
+    def __init__(self, path, read_only=False):
+        """Init."""
+        self.path = path
+        self.read_only = read_only
+        # one connection per thread, WAL lets readers proceed while a writer commits
+        self.local = threading.local()
+        self.connections = []
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.pool_size = helper.get_db_pooled_connections()
+        # (connection, generation) of idle pooled connections, and acquired connection -> generation
+        self.idle = []
+        self.acquired = {}
+
+    def get(self):
+        """Get connection of the calling thread."""
+        con = getattr(self.local, 'con', None)
+        if con is not None and self.local.generation != self.generation:
+            self._disconnect(con)
+            con = None
+        if con is None:
+            # read before connecting, so a reset while connecting is seen on next use
+            generation = self.generation
+            con = self._connect()
+            self.local.con = con
+            self.local.generation = generation
+        return con
+
+    def _connect(self):
+        """Connect, tracking the connection to close it at shutdown."""
+        con = self._open()
+        with self.lock:
+            self.connections.append(con)
+        return con
+
+    def _disconnect(self, con):
+        """Disconnect the calling thread."""
+        self._close(con)
+        self.local.con = None
+
+    def _close(self, con):
+        """Close tracked connection."""
+        with self.lock:
+            if con in self.connections:
+                self.connections.remove(con)
+        con.close()
+
+    def acquire(self):
+        """Acquire pooled connection, for a read transaction outlasting the call, to release when done."""
+        with self.lock:
+            while self.idle:
+                con, generation = self.idle.pop()
+                if generation == self.generation:
+                    self.acquired[con] = generation
+                    return con
+                self.connections.remove(con)
+                con.close()
+            generation = self.generation
+        con = self._connect()
+        with self.lock:
+            self.acquired[con] = generation
+        return con
+
+    def release(self, con):
+        """Release acquired connection, pooling it while the pool has room and no reset happened since."""
+        with self.lock:
+            generation = self.acquired.pop(con, None)
+            if con not in self.connections:
+                # closed at shutdown
+                return
+        if con.in_transaction:
+            con.rollback()
+        with self.lock:
+            if generation == self.generation and len(self.idle) < self.pool_size:
+                self.idle.append((con, generation))
+                return
+        self._close(con)
+
+    def _open(self):
+        """Open connection, applying the pragmas of app.yaml."""
+        # not same thread checked, so close can close the connections of all threads at shutdown
+        database = self.path
+        if self.read_only:
+            # a snapshot never changes once published, so is read without locking
+            database = f'file:{urllib.parse.quote(os.path.abspath(self.path))}?mode=ro&immutable=1'
+        con = db.connect(
+            database,
+            timeout=helper.get_db_busy_timeout(),
+            check_same_thread=False,
+            cached_statements=helper.get_db_cached_statements(),
+            uri=self.read_only,
+        )
+        if not self.read_only:
+            con.execute(f'PRAGMA journal_mode={helper.get_db_journal_mode()};')
+            con.execute(f'PRAGMA synchronous={helper.get_db_synchronous()};')
+        con.execute(f'PRAGMA cache_size={int(helper.get_db_cache_size())};')
+        con.execute(f'PRAGMA mmap_size={int(helper.get_db_mmap_size())};')
+        return con
+
+    def reset(self):
+        """Reopen the connection of each thread on its next use, as the file was replaced."""
+        with self.lock:
+            self.generation += 1
+
+    def close(self):
+        """Close all connections."""
+        with self.lock:
+            connections, self.connections = self.connections, []
+            self.idle = []
+            self.acquired = {}
+        for con in connections:
+            con.close()
+
+
+class Stream():
+    """Iterator of byte chunks of a stored document, holding the resources they are read from until closed."""
+
+    def __init__(self, chunks, *closers):
+        """Init with the functions releasing the resources, called in order on close."""
+        self.chunks = chunks
+        self.closers = closers
+
+    def __iter__(self):
+        """Iterate chunks."""
+        return self
+
+    def __next__(self):
+        """Get next chunk."""
+        return next(self.chunks)
+
+    def close(self):
+        """Close resources."""
+        for closer in self.closers:
+            closer()
+
+
+def encode_cursor(order, key):
+    """Encode keyset cursor, after key in order."""
+    return base64.urlsafe_b64encode(json.dumps([order, key]).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor, order):
+    """Decode keyset cursor to the key it is after, checking it was made for order."""
+    try:
+        cursor_order, key = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail=f'invalid cursor {cursor}')
+    if cursor_order != order:
+        raise HTTPException(status_code=400, detail=f'cursor is for order {cursor_order} not {order}')
+    return key
+
+
+# documents read at a time when filling side tables from stored documents
+backfill_batch_size = 256
+
+# summary sort -> column of the summaries side table
+summary_columns = {
+    'id': 'doc_id',
+    'title': 'title',
+    'version': 'version',
+    'oscal-version': 'oscal_version',
+    'last-modified': 'last_modified',
+    'size': 'size',
+}
+
+
+def summary_order(sort, descending):
+    """Get cursor order of summary listing by sort."""
+    return f'summary {sort} {"descending" if descending else "ascending"}'
+
+
+def summary_item(oid, summary):
+    """Get summary listing item of document."""
+    return {'id': oid, **summary}
+
+
+def summary_key(oid, summary, sort):
+    """Get keyset key of summary by sort, missing text sorting as empty as in the summaries side table."""
+    if sort == 'id':
+        return [oid, oid]
+    value = summary.get(sort)
+    return [value if value is not None or sort == 'size' else '', oid]
+
+
+def match_summary(summary, filters):
+    """Check summary matches filters of title substring, version, oscal-version and last-modified range."""
+    title = filters.get('title')
+    if title is not None and title.lower() not in (summary.get('title') or '').lower():
+        return False
+    for name in ['version', 'oscal-version']:
+        if filters.get(name) is not None and summary.get(name) != filters[name]:
+            return False
+    modified = summary.get('last-modified') or ''
+    if filters.get('modified-after') is not None and not modified > filters['modified-after']:
+        return False
+    if filters.get('modified-before') is not None and not modified < filters['modified-before']:
+        return False
+    return True
+
+
+def train_codec_dictionary(codec_tag, samples):
+    """Train dictionary for codec on samples of payload bytes."""
+    try:
+        dictionary = codec.train(codec_tag, samples, helper.get_db_dictionary_size())
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f'unable to train dictionary: {e}')
+    if not dictionary:
+        raise HTTPException(status_code=400, detail='unable to train dictionary: too few similar documents')
+    return dictionary
+
+
+class Engine(abc.ABC):
+    """Storage engine of OSCAL documents, one table per model type.
+
+    Engines raise HTTPException for failed operations, and NotImplementedError for features they do not support.
+    """
+
+    def __init__(self, logger):
+        """Init."""
+        self.logger = logger
+
+    @abc.abstractmethod
+    def init_table(self, tname, qcols=None):
+        """Init table with optional secondary index columns."""
+
+    @abc.abstractmethod
+    def add(self, tname, oid, payload, columns=None, props=None, summary=None):
+        """Add document with its metadata (name, value, ns) props and registry summary, returning its id.
+
+        Documents stored without a summary are not listed by list_summaries.
+        """
+
+    @abc.abstractmethod
+    def add_many(self, rows):
+        """Add (tname, oid, payload, columns, props, summary) rows.
+
+        Returns None per row added, else the reason it was not.
+        """
+
+    @abc.abstractmethod
+    def replace(self, tname, oid, payload, columns=None, props=None, summary=None, keep=None):
+        """Replace document, returning its id, or None if not found.
+
+        Keep, if given, is called with the payload being replaced within the write, before it, so that nothing is
+        written between the two. An exception keep raises aborts the write.
+        """
+
+    @abc.abstractmethod
+    def upsert(self, tname, oid, payload, columns=None, props=None, summary=None, keep=None):
+        """Add document, or replace it if it exists, calling keep with the payload being replaced as replace does."""
+
+    @abc.abstractmethod
+    def delete(self, tname, oid):
+        """Delete document, returning its id, or None if not found."""
+
+    @abc.abstractmethod
+    def get(self, tname, oid):
+        """Get document, or None if not found."""
+
+    def get_stream(self, tname, oid, chunk_size):
+        """Get (size, Stream) of document bytes in chunks of at most chunk size, or None if not found.
+
+        Size is None if unknown. The default reads the whole document, engines override it to read incrementally.
+        """
+        payload = self.get(tname, oid)
+        if payload is None:
+            return None
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        chunks = (payload[offset:offset + chunk_size] for offset in range(0, len(payload), chunk_size))
+        return len(payload), Stream(chunks)
+
+    @abc.abstractmethod
+    def get_id_list(self, tname, limit=None, cursor=None, order='id'):
+        """Get page of at most limit document ids after cursor, ordered by id or inserted, and the next cursor or None.
+
+        Cursors are opaque, made by encode_cursor from the key of the last id of the page.
+        """
+
+    @abc.abstractmethod
+    def get_by_column(self, tname, cname, cvalue):
+        """Get documents whose secondary index column has value."""
+
+    @abc.abstractmethod
+    def find_by_prop(self, tname, name, value, ns=None):
+        """Get ids of documents with a metadata prop of name and value, and of namespace ns if given."""
+
+    @abc.abstractmethod
+    def list_summaries(self, tname, filters=None, sort='id', descending=False, limit=None, cursor=None):
+        """Get page of at most limit document summaries matching filters, ordered by sort, and the next cursor or None.
+
+        Summaries are read from where they were stored at ingest, never from the documents.
+        """
+
+    def _list_summaries(self, summaries, filters, sort, descending, limit, cursor):
+        """Get page of summaries from (id, summary) pairs, for engines that list in python."""
+        keyed_items = sorted(
+            ((summary_key(oid, summary, sort), summary_item(oid, summary))
+             for oid, summary in summaries
+             if match_summary(summary, filters or {})),
+            key=lambda pair: pair[0],
+            reverse=descending,
+        )
+        return self._page(keyed_items, limit, cursor, summary_order(sort, descending), descending)
+
+    def _page(self, keyed_ids, limit, cursor, order, descending=False):
+        """Get page of ids from (key, id) pairs sorted by key, for engines that list in python."""
+        after = None if cursor is None else decode_cursor(cursor, order)
+        ids = []
+        last = None
+        for key, oid in keyed_ids:
+            if after is not None and (key >= after if descending else key <= after):
+                continue
+            if limit is not None and len(ids) == limit:
+                return ids, encode_cursor(order, last)
+            ids.append(oid)
+            last = key
+        return ids, None
+
+    def train_dictionary(self):
+        """Train compression dictionary on stored documents, used for documents stored from then on."""
+        raise NotImplementedError(f'{type(self).__name__} does not compress documents')
+
+    def fragment_stats(self):
+        """Get statistics of the fragments documents are split into."""
+        raise NotImplementedError(f'{type(self).__name__} does not split documents into fragments')
+
+    def close(self):  # noqa: B027
+        """Close."""
+        # deliberately a no-op, for engines holding nothing to release
+        pass
+
+
+class SqliteEngine(Engine):
+    """Sqlite engine.
+
+    Payloads are compressed with the codec of app.yaml, optionally with a trained dictionary. Each row records its
+    codec and dictionary, so rows stored before a change of either remain readable.
+
+    A read only engine reads a snapshot of the database at path, see Replica.
+
+    Documents are optionally split at the element paths of db-fragment-paths, the values there stored once per
+    content in the FRAGMENTS table, reference counted by the documents referring to them, and spliced back on read.
+    Each row records the digests of its fragments, so rows stored before a change of the paths remain readable.
+    """
+
+    def __init__(self, logger, path=None, read_only=False):
+        """Init."""
+        super().__init__(logger)
+        self.connections = Connections(path or helper.get_db_path(), read_only)
+        compression = helper.get_db_compression()
+        self.codec = codec.identity if compression == 'none' else compression
+        codec.check(self.codec)
+        self.level = helper.get_db_compression_level()
+        # dictionary id -> dictionary
+        self.dictionaries = {}
+        self.dictionary_id = None
+        # names of the tables of the database
+        self.tables = set()
+        self.fragment_paths = fragment.parse_paths(helper.get_db_fragment_paths())
+        self.fragment_min_size = helper.get_db_fragment_min_size()
+        self.fragment_cache = FragmentCache(helper.get_db_fragment_cache_bytes())
+        if read_only:
+            # snapshots hold the tables of the primary, and rows are decoded by the dictionary they record
+            self.backfill_props = self.backfill_summaries = False
+            return
+        self._init_dictionaries()
+        self._init_fragments()
+        self.backfill_props = self._init_props()
+        self.backfill_summaries = self._init_summaries()
+
+    @property
+    def con(self):
+        """Get connection of the calling thread."""
+        return self.connections.get()
+
+    def init_table(self, tname, qcols=None):
+        """Init table."""
+        self.tables.add(tname)
+        con = self.con
+        with con:
+            cur = con.cursor()
+            query = f'SELECT name FROM sqlite_master WHERE type="table" AND name="{tname}";'  # noqa: S608
+            list_tables = cur.execute(query).fetchall()
+            if list_tables != []:
+                # tables created before compression get codec columns, their rows have the identity codec,
+                # a size column, their rows have unknown size, and a fragments column, their rows are whole
+                names = [row[1] for row in cur.execute(f'PRAGMA table_info({tname});')]
+                added = [('codec', 'TEXT'), ('dictionary', 'INTEGER'), ('size', 'INTEGER'), ('fragments', 'TEXT')]
+                for cname, ctype in added:
+                    if cname not in names:
+                        con.execute(f'ALTER TABLE {tname} ADD COLUMN {cname} {ctype};')
+                if self.backfill_props:
+                    self._backfill_props(cur, tname)
+                if self.backfill_summaries:
+                    self._backfill_summaries(cur, tname)
+                con.commit()
+                return
+            columns = ''.join(f', {qcol} TEXT' for qcol in qcols or [])
+            query = (
+                f'CREATE TABLE IF NOT EXISTS {tname} (id TEXT NOT NULL PRIMARY KEY, payload BLOB, '  # noqa: S608
+                f'codec TEXT, dictionary INTEGER, size INTEGER, fragments TEXT{columns});'
+            )
+            con.execute(query)
+
+    def _init_dictionaries(self):
+        """Init dictionaries table, and load the latest dictionary of the codec."""
+        con = self.con
+        with con:
+            query = (
+                'CREATE TABLE IF NOT EXISTS DICTIONARIES (id INTEGER PRIMARY KEY, codec TEXT, payload BLOB, '
+                'samples INTEGER, created REAL);'
+            )
+            con.execute(query)
+        query = 'SELECT id, payload FROM DICTIONARIES WHERE codec=? ORDER BY id DESC LIMIT 1;'
+        row = con.execute(query, [self.codec]).fetchone()
+        if row is not None:
+            self.dictionary_id = row[0]
+            self.dictionaries[row[0]] = row[1]
+
+    def _init_fragments(self):
+        """Init fragments table."""
+        con = self.con
+        with con:
+            query = (
+                'CREATE TABLE IF NOT EXISTS FRAGMENTS (digest TEXT NOT NULL PRIMARY KEY, payload BLOB, codec TEXT, '
+                'dictionary INTEGER, size INTEGER, refs INTEGER NOT NULL);'
+            )
+            con.execute(query)
+
+    def _init_props(self):
+        """Init props side table, returning whether it is new and so needs filling from stored documents."""
+        con = self.con
+        with con:
+            query = 'SELECT name FROM sqlite_master WHERE type=? AND name=?;'
+            exists = con.execute(query, ['table', 'PROPS']).fetchone() is not None
+            query = (
+                'CREATE TABLE IF NOT EXISTS PROPS (table_name TEXT NOT NULL, doc_id TEXT NOT NULL, '
+                'prop_name TEXT NOT NULL, prop_value TEXT NOT NULL, ns TEXT);'
+            )
+            con.execute(query)
+            # covering lookup by prop, and maintenance by document
+            query = 'CREATE INDEX IF NOT EXISTS PROPS_LOOKUP ON PROPS (table_name, prop_name, prop_value, ns, doc_id);'
+            con.execute(query)
+            query = 'CREATE INDEX IF NOT EXISTS PROPS_DOCUMENT ON PROPS (table_name, doc_id);'
+            con.execute(query)
+        return not exists
+
+    def _stored_rows(self, tname):
+        """Get (id, payload, codec, dictionary, fragments) rows of table, read in batches by id."""
+        query = (
+            f'SELECT id, payload, codec, dictionary, fragments FROM {tname} '  # noqa: S608
+            'WHERE id>? ORDER BY id LIMIT ?;'
+        )
+        last = ''
+        while True:
+            rows = self.con.execute(query, [last, backfill_batch_size]).fetchall()
+            yield from rows
+            if len(rows) < backfill_batch_size:
+                return
+            last = rows[-1][0]
+
+    def _backfill_props(self, cur, tname):
+        """Fill props side table from the documents of table stored before it existed."""
+        oscal_path = next(model.oscal_path for model in models.values() if model.table == tname)
+        count = 0
+        for oid, *row in self._stored_rows(tname):
+            try:
+                metadata = json.loads(self._read(*row))[oscal_path].get('metadata', {})
+                props = [(prop['name'], prop['value'], prop.get('ns')) for prop in metadata.get('props', [])]
+            except (ValueError, KeyError, TypeError, AttributeError):
+                self.logger.warning(f'db: props of {tname} {oid} not indexed, unreadable document')
+                continue
+            self._insert_props(cur, tname, oid, props)
+            count += 1
+        self.logger.info(f'db: props of {count} {tname} documents indexed')
+
+    def _insert_props(self, cur, tname, oid, props):
+        """Insert props of document."""
+        query = 'INSERT INTO PROPS (table_name, doc_id, prop_name, prop_value, ns) VALUES (?, ?, ?, ?, ?);'
+        cur.executemany(query, [(tname, oid, name, value, ns) for name, value, ns in props or []])
+
+    def _delete_props(self, cur, tname, oid):
+        """Delete props of document."""
+        cur.execute('DELETE FROM PROPS WHERE table_name=? AND doc_id=?;', [tname, oid])
+
+    def _init_summaries(self):
+        """Init summaries side table, returning whether it is new and so needs filling from stored documents."""
+        con = self.con
+        with con:
+            query = 'SELECT name FROM sqlite_master WHERE type=? AND name=?;'
+            exists = con.execute(query, ['table', 'SUMMARIES']).fetchone() is not None
+            # missing text is stored empty, so keysets over the sort columns need no null handling
+            query = (
+                'CREATE TABLE IF NOT EXISTS SUMMARIES (table_name TEXT NOT NULL, doc_id TEXT NOT NULL, '
+                "title TEXT NOT NULL DEFAULT '', version TEXT NOT NULL DEFAULT '', "
+                "oscal_version TEXT NOT NULL DEFAULT '', last_modified TEXT NOT NULL DEFAULT '', size INTEGER, "
+                'digest TEXT, counts TEXT, PRIMARY KEY (table_name, doc_id));'
+            )
+            con.execute(query)
+            # listing sorted by title, last modified and size
+            for name, column in [('TITLE', 'title'), ('MODIFIED', 'last_modified'), ('SIZE', 'size')]:
+                query = f'CREATE INDEX IF NOT EXISTS SUMMARIES_{name} ON SUMMARIES (table_name, {column}, doc_id);'
+                con.execute(query)
+        return not exists
+
+    def _backfill_summaries(self, cur, tname):
+        """Fill summaries side table from the documents of table stored before it existed."""
+        model = next(model for model in models.values() if model.table == tname)
+        count = 0
+        for oid, *row in self._stored_rows(tname):
+            try:
+                summary = model.summarize(self._read(*row))
+            except (ValueError, KeyError, TypeError, AttributeError):
+                self.logger.warning(f'db: summary of {tname} {oid} not stored, unreadable document')
+                continue
+            self._write_summary(cur, tname, oid, summary)
+            count += 1
+        self.logger.info(f'db: summaries of {count} {tname} documents stored')
+
+    def _write_summary(self, cur, tname, oid, summary):
+        """Write summary of document, or delete it if None."""
+        if summary is None:
+            cur.execute('DELETE FROM SUMMARIES WHERE table_name=? AND doc_id=?;', [tname, oid])
+            return
+        query = (
+            'INSERT OR REPLACE INTO SUMMARIES (table_name, doc_id, title, version, oscal_version, last_modified, '
+            'size, digest, counts) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);'
+        )
+        texts = [summary.get(name) or '' for name in ['title', 'version', 'oscal-version', 'last-modified']]
+        counts = json.dumps(summary.get('counts', {}))
+        cur.execute(query, [tname, oid, *texts, summary.get('size'), summary.get('digest'), counts])
+
+    def _get_dictionary(self, dictionary_id):
+        """Get dictionary by id, loading it on first use."""
+        if dictionary_id is None:
+            return None
+        dictionary = self.dictionaries.get(dictionary_id)
+        if dictionary is None:
+            query = 'SELECT payload FROM DICTIONARIES WHERE id=?;'
+            dictionary = self.con.execute(query, [dictionary_id]).fetchone()[0]
+            self.dictionaries[dictionary_id] = dictionary
+        return dictionary
+
+    def _encode(self, payload):
+        """Encode payload, returning (payload, codec, dictionary id, size) to store, size in bytes before encoding."""
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        dictionary_id = self.dictionary_id
+        data = codec.compress(payload, self.codec, self.level, self._get_dictionary(dictionary_id))
+        return data, self.codec, dictionary_id, len(payload)
+
+    def _decode(self, payload, codec_tag, dictionary_id):
+        """Decode stored payload."""
+        return codec.decompress(payload, codec_tag, self._get_dictionary(dictionary_id))
+
+    def _read(self, payload, codec_tag, dictionary_id, fragments):
+        """Decode stored payload, splicing in its fragments if it was split."""
+        text = self._decode(payload, codec_tag, dictionary_id)
+        if fragments is None:
+            return text
+        return fragment.assemble(text, self._get_fragments(json.loads(fragments)))
+
+    def _split(self, tname, payload):
+        """Split document at the fragment paths, returning (payload, size, fragment digest -> text).
+
+        Size and fragments are None if the document is stored whole.
+        """
+        if self.fragment_paths:
+            oscal_path = next(model.oscal_path for model in models.values() if model.table == tname)
+            result = fragment.split(oscal_path, payload, self.fragment_paths, self.fragment_min_size)
+            if result is not None:
+                return result
+        return payload, None, None
+
+    def _get_fragments(self, digests):
+        """Get digest -> text of fragments, from the fragment cache or else the fragments table."""
+        texts = {}
+        missing = []
+        for digest in digests:
+            text = self.fragment_cache.get(digest)
+            if text is None:
+                missing.append(digest)
+            else:
+                texts[digest] = text
+        if missing:
+            marks = ', '.join('?' * len(missing))
+            query = f'SELECT digest, payload, codec, dictionary FROM FRAGMENTS WHERE digest IN ({marks});'  # noqa: S608
+            for digest, *row in self.con.execute(query, missing).fetchall():
+                texts[digest] = self._decode(*row)
+                self.fragment_cache.put(digest, texts[digest])
+        return texts
+
+    def _get_fragment_digests(self, cur, tname, oid):
+        """Get stored digests of the fragments of document, None if it is whole or not found."""
+        row = cur.execute(f'SELECT fragments FROM {tname} WHERE id=?;', [oid]).fetchone()  # noqa: S608
+        return None if row is None else row[0]
+
+    def _add_fragments(self, cur, fragments):
+        """Add a reference to each fragment, storing those not stored yet."""
+        for digest, text in (fragments or {}).items():
+            cur.execute('UPDATE FRAGMENTS SET refs=refs+1 WHERE digest=?;', [digest])
+            if cur.rowcount == 0:
+                query = (
+                    'INSERT INTO FRAGMENTS (digest, payload, codec, dictionary, size, refs) VALUES (?, ?, ?, ?, ?, 1);'
+                )
+                cur.execute(query, [digest, *self._encode(text)])
+
+    def _release_fragments(self, cur, digests):
+        """Release a reference to each fragment of stored digests, deleting those no longer referred to."""
+        if digests is None:
+            return
+        digests = json.loads(digests)
+        cur.executemany('UPDATE FRAGMENTS SET refs=refs-1 WHERE digest=?;', [[digest] for digest in digests])
+        marks = ', '.join('?' * len(digests))
+        cur.execute(f'DELETE FROM FRAGMENTS WHERE refs<=0 AND digest IN ({marks});', digests)  # noqa: S608
+
+    def add(self, tname, oid, payload, columns=None, props=None, summary=None):
+        """Add table."""
+        con = self.con
+        try:
+            cur = con.cursor()
+            self._insert(cur, tname, oid, payload, columns, props, summary)
+            con.commit()
+            result = oid
+        except Exception:
+            con.rollback()
+            raise HTTPException(status_code=400, detail=f'{oid} already exists')
+        return result
+
+    def _insert(self, cur, tname, oid, payload, columns, props, summary, upsert=False):
+        """Insert row with optional secondary index columns, props and summary, updating the existing row if upsert."""
+        columns = columns or {}
+        names = ''.join(f', {cname}' for cname in columns)
+        marks = ', ?' * len(columns)
+        query = (
+            f'INSERT INTO {tname} (id, payload, codec, dictionary, size, fragments{names}) '  # noqa: S608
+            f'VALUES (?, ?, ?, ?, ?, ?{marks})'
+        )
+        old = None
+        if upsert:
+            updates = ''.join(f', {cname}=excluded.{cname}' for cname in columns)
+            query += (
+                ' ON CONFLICT(id) DO UPDATE SET payload=excluded.payload, codec=excluded.codec, '  # noqa: S608
+                f'dictionary=excluded.dictionary, size=excluded.size, fragments=excluded.fragments{updates}'
+            )
+            old = self._get_fragment_digests(cur, tname, oid)
+            self._delete_props(cur, tname, oid)
+        row, fragments = self._store(tname, payload)
+        cur.execute(query + ';', [oid, *row] + list(columns.values()))
+        # the fragments of the new document are referred to before those of the old one are released
+        self._add_fragments(cur, fragments)
+        self._release_fragments(cur, old)
+        self._insert_props(cur, tname, oid, props)
+        self._write_summary(cur, tname, oid, summary)
+
+    def _store(self, tname, payload):
+        """Split and encode payload, returning ((payload, codec, dictionary id, size, digests) to store, fragments)."""
+        text, size, fragments = self._split(tname, payload)
+        data, codec_tag, dictionary_id, text_size = self._encode(text)
+        if fragments is None:
+            return (data, codec_tag, dictionary_id, text_size, None), None
+        return (data, codec_tag, dictionary_id, size, json.dumps(sorted(fragments))), fragments
+
+    def add_many(self, rows):
+        """Add (tname, oid, payload, columns, props, summary) rows in a single transaction.
+
+        Returns None per row added, else the reason it was not.
+        """
+        result = []
+        con = self.con
+        try:
+            cur = con.cursor()
+            for tname, oid, payload, columns, props, summary in rows:
+                try:
+                    self._insert(cur, tname, oid, payload, columns, props, summary)
+                    result.append(None)
+                except db.IntegrityError:
+                    result.append(f'{oid} already exists')
+            con.commit()
+        except Exception:
+            con.rollback()
+            raise HTTPException(status_code=400, detail='unable to add documents')
+        return result
+
+    def _keep(self, cur, tname, oid, keep):
+        """Call keep with the stored payload of document, returning whether it was found."""
+        query = f'SELECT payload, codec, dictionary, fragments FROM {tname} WHERE id=?;'  # noqa: S608
+        row = cur.execute(query, [oid]).fetchone()
+        if row is None:
+            return False
+        keep(self._read(*row))
+        return True
+
+    def replace(self, tname, oid, payload, columns=None, props=None, summary=None, keep=None):
+        """Replace table, updating the row in place if it exists.
+
+        The write lock is taken before the row is read, for the fragments it refers to and for keep, so what is read
+        is what is replaced, across processes too. Only with keep is the payload read.
+        """
+        result = None
+        con = self.con
+        try:
+            cur = con.cursor()
+            cur.execute('BEGIN IMMEDIATE;')
+            if keep is not None and not self._keep(cur, tname, oid, keep):
+                con.rollback()
+                return None
+            columns = columns or {}
+            assignments = ''.join(f', {cname}=?' for cname in columns)
+            query = (
+                f'UPDATE {tname} SET payload=?, codec=?, dictionary=?, size=?, fragments=?{assignments} '  # noqa: S608
+                'WHERE id=?;'
+            )
+            old = self._get_fragment_digests(cur, tname, oid)
+            row, fragments = self._store(tname, payload)
+            cur.execute(query, [*row] + list(columns.values()) + [oid])
+            if cur.rowcount == 1:
+                self._add_fragments(cur, fragments)
+                self._release_fragments(cur, old)
+                self._delete_props(cur, tname, oid)
+                self._insert_props(cur, tname, oid, props)
+                self._write_summary(cur, tname, oid, summary)
+                result = oid
+            con.commit()
+        except HTTPException:
+            con.rollback()
+            raise
+        except Exception:
+            con.rollback()
+            raise HTTPException(status_code=400, detail=f'{oid} unable to replace')
+        return result
+
+    def upsert(self, tname, oid, payload, columns=None, props=None, summary=None, keep=None):
+        """Add table, or replace it if it exists, in a single statement, after keep in the same write if given."""
+        con = self.con
+        try:
+            cur = con.cursor()
+            cur.execute('BEGIN IMMEDIATE;')
+            if keep is not None:
+                self._keep(cur, tname, oid, keep)
+            self._insert(cur, tname, oid, payload, columns, props, summary, upsert=True)
+            con.commit()
+        except HTTPException:
+            con.rollback()
+            raise
+        except Exception:
+            con.rollback()
+            raise HTTPException(status_code=400, detail=f'{oid} unable to replace')
+        return oid
+
+    def delete(self, tname, oid):
+        """Delete table, if it exists."""
+        result = None
+        con = self.con
+        try:
+            cur = con.cursor()
+            old = self._get_fragment_digests(cur, tname, oid)
+            query = f'DELETE FROM {tname} WHERE id=?;'  # noqa: S608
+            cur.execute(query, [oid])
+            if cur.rowcount == 1:
+                self._release_fragments(cur, old)
+                self._delete_props(cur, tname, oid)
+                self._write_summary(cur, tname, oid, None)
+                result = oid
+            con.commit()
+        except Exception:
+            con.rollback()
+            raise HTTPException(status_code=400, detail=f'{oid} unable to delete')
+        return result
+
+    def get(self, tname, oid):
+        """Get table."""
+        result = None
+        try:
+            con = self.con
+            cur = con.cursor()
+            query = f'SELECT payload, codec, dictionary, fragments FROM {tname} WHERE id=?;'  # noqa: S608
+            cur.execute(query, [oid])
+            rows = cur.fetchall()
+            if len(rows) == 1:
+                result = self._read(*rows[0])
+        except Exception:
+            raise HTTPException(status_code=400, detail=f'{oid} unable to get')
+        return result
+
+    def get_stream(self, tname, oid, chunk_size):
+        """Get (size, Stream) of document.
+
+        Payloads stored in at most chunk size, and split documents, are read whole. Larger ones are read by
+        incremental blob I/O and decoded chunk by chunk, on a pooled connection whose read transaction keeps the row
+        consistent while the stream is open.
+        """
+        query = (
+            'SELECT codec, dictionary, fragments, '  # noqa: S608
+            'CASE WHEN length(payload) > ? AND fragments IS NULL THEN NULL ELSE payload END '
+            f'FROM {tname} WHERE id=?;'
+        )
+        row = self.con.execute(query, [chunk_size, oid]).fetchone()
+        if row is None:
+            return None
+        codec_tag, dictionary_id, fragments, payload = row
+        if payload is not None:
+            data = self._read(payload, codec_tag, dictionary_id, fragments).encode('utf-8')
+            return len(data), Stream(iter([data]))
+        con = self.connections.acquire()
+        try:
+            con.execute('BEGIN;')
+            query = f'SELECT rowid, codec, dictionary, size FROM {tname} WHERE id=?;'  # noqa: S608
+            row = con.execute(query, [oid]).fetchone()
+            if row is None:
+                self.connections.release(con)
+                return None
+            rowid, codec_tag, dictionary_id, size = row
+            blob = con.blobopen(tname, 'payload', rowid, readonly=True)
+        except Exception:
+            self.connections.release(con)
+            raise HTTPException(status_code=400, detail=f'{oid} unable to get')
+        chunks = codec.decompress_reader(blob, codec_tag, self._get_dictionary(dictionary_id), chunk_size)
+        return size, Stream(chunks, blob.close, functools.partial(self.connections.release, con))
+
+    def get_id_list(self, tname, limit=None, cursor=None, order='id'):
+        """Get page of table ids, by keyset on the primary key index or on rowid for insertion order."""
+        key = 'id' if order == 'id' else 'rowid'
+        after = None if cursor is None else decode_cursor(cursor, order)
+        query = f'SELECT {key}, id FROM {tname}'  # noqa: S608
+        parameters = []
+        if after is not None:
+            query += f' WHERE {key} > ?'
+            parameters.append(after)
+        query += f' ORDER BY {key}'
+        if limit is not None:
+            # one more than the page, to know whether there is a next page
+            query += ' LIMIT ?'
+            parameters.append(limit + 1)
+        try:
+            rows = self.con.execute(query + ';', parameters).fetchall()
+        except Exception:
+            raise HTTPException(status_code=400, detail='unable to produce list')
+        if limit is not None and len(rows) > limit:
+            return [row[1] for row in rows[:limit]], encode_cursor(order, rows[limit - 1][0])
+        return [row[1] for row in rows], None
+
+    def list_summaries(self, tname, filters=None, sort='id', descending=False, limit=None, cursor=None):
+        """Get page of summaries from the summaries side table, by keyset on the index of the sort column."""
+        column = summary_columns[sort]
+        order = summary_order(sort, descending)
+        after = None if cursor is None else decode_cursor(cursor, order)
+        filters = filters or {}
+        query = (
+            f'SELECT {column}, doc_id, title, version, oscal_version, last_modified, size, '  # noqa: S608
+            'digest, counts FROM SUMMARIES WHERE table_name=?'
+        )
+        parameters = [tname]
+        if filters.get('title') is not None:
+            query += " AND title LIKE ? ESCAPE '\\'"
+            escaped = filters['title'].replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            parameters.append(f'%{escaped}%')
+        conditions = [
+            ('version', 'version=?'),
+            ('oscal-version', 'oscal_version=?'),
+            ('modified-after', 'last_modified>?'),
+            ('modified-before', 'last_modified<?'),
+        ]
+        for name, condition in conditions:
+            if filters.get(name) is not None:
+                query += f' AND {condition}'
+                parameters.append(filters[name])
+        if after is not None:
+            query += f' AND ({column}, doc_id) {"<" if descending else ">"} (?, ?)'
+            parameters.extend(after)
+        direction = ' DESC' if descending else ''
+        query += f' ORDER BY {column}{direction}, doc_id{direction}'
+        if limit is not None:
+            # one more than the page, to know whether there is a next page
+            query += ' LIMIT ?'
+            parameters.append(limit + 1)
+        try:
+            rows = self.con.execute(query + ';', parameters).fetchall()
+        except Exception:
+            raise HTTPException(status_code=400, detail='unable to produce list')
+        items = [
+            {
+                'id': oid,
+                'title': title or None,
+                'version': version or None,
+                'oscal-version': oscal_version or None,
+                'last-modified': last_modified or None,
+                'size': size,
+                'digest': digest,
+                'counts': json.loads(counts) if counts else {},
+            } for _, oid, title, version, oscal_version, last_modified, size, digest, counts in rows
+        ]
+        if limit is not None and len(rows) > limit:
+            return items[:limit], encode_cursor(order, list(rows[limit - 1][:2]))
+        return items, None
+
+    def get_by_column(self, tname, cname, cvalue):
+        """Get table."""
+        result = []
+        try:
+            con = self.con
+            cur = con.cursor()
+            query = f'SELECT payload, codec, dictionary, fragments FROM {tname} WHERE {cname}=?;'  # noqa: S608
+            cur.execute(query, [cvalue])
+            rows = cur.fetchall()
+            for row in rows:
+                result.append(self._read(*row))
+        except Exception:
+            raise HTTPException(status_code=400, detail=f'{tname} unable to get {cname} == {cvalue}')
+        return result
+
+    def find_by_prop(self, tname, name, value, ns=None):
+        """Get ids of documents by prop, using the covering index of the props side table."""
+        query = 'SELECT doc_id FROM PROPS WHERE table_name=? AND prop_name=? AND prop_value=?'
+        parameters = [tname, name, value]
+        if ns is not None:
+            query += ' AND ns=?'
+            parameters.append(ns)
+        try:
+            rows = self.con.execute(query + ';', parameters).fetchall()
+        except Exception:
+            raise HTTPException(status_code=400, detail=f'{tname} unable to find prop {name} == {value}')
+        # a document with the same prop repeated is found once
+        return list(dict.fromkeys(row[0] for row in rows))
+
+    def train_dictionary(self):
+        """Train dictionary for the codec on a sample of the stored documents of all tables."""
+        if self.codec is codec.identity:
+            raise HTTPException(status_code=400, detail='compression is disabled')
+        samples = self.sample_documents(helper.get_db_dictionary_samples())
+        return self.add_dictionary(train_codec_dictionary(self.codec, samples), len(samples))
+
+    def sample_documents(self, count):
+        """Get payload bytes of a random sample of at most count documents per table."""
+        samples = []
+        for tname in sorted(self.tables):
+            query = f'SELECT payload, codec, dictionary FROM {tname} ORDER BY random() LIMIT ?;'  # noqa: S608
+            for row in self.con.execute(query, [count]).fetchall():
+                samples.append(self._decode(*row).encode('utf-8'))
+        return samples
+
+    def add_dictionary(self, dictionary, samples):
+        """Add dictionary trained on samples documents, used for documents stored from then on."""
+        con = self.con
+        with con:
+            query = 'INSERT INTO DICTIONARIES (codec, payload, samples, created) VALUES (?, ?, ?, ?);'
+            dictionary_id = con.execute(query, [self.codec, dictionary, samples, time.time()]).lastrowid
+        self.dictionaries[dictionary_id] = dictionary
+        self.dictionary_id = dictionary_id
+        self.logger.info(f'db: dictionary {dictionary_id} trained on {samples} documents')
+        return {'id': dictionary_id, 'codec': self.codec, 'size': len(dictionary), 'samples': samples}
+
+    def fragment_stats(self):
+        """Get statistics of the fragments table, and of the fragment cache."""
+        query = (
+            'SELECT count(*), total(size), total(length(payload)), total(refs), total(size * (refs - 1)) '
+            'FROM FRAGMENTS;'
+        )
+        count, size, stored, refs, deduplicated = self.con.execute(query).fetchone()
+        return {
+            'fragments': count,
+            'bytes': int(size),
+            'stored-bytes': int(stored),
+            'references': int(refs),
+            'deduplicated-bytes': int(deduplicated),
+            'cache': self.fragment_cache.stats(),
+        }
+
+    def close(self):
+        """Close all connections."""
+        self.connections.close()
+
+
+class Replica():
+    """Read only replica of the sqlite engine, a snapshot of its database refreshed by the sqlite online backup API.
+
+    Each refresh backs up into a new file which then replaces the replica file, so readers never see a partial
+    snapshot, and streams already open keep reading the snapshot they opened.
+    """
+
+    def __init__(self, logger, primary):
+        """Init."""
+        self.logger = logger
+        self.primary = primary
+        self.path = helper.get_db_replica_path()
+        # seconds between refreshes, and writes to the primary that make a refresh due sooner, 0 for never
+        self.interval = helper.get_db_replica_interval()
+        self.max_writes = helper.get_db_replica_writes()
+        self.writes = 0
+        self.refreshed = None
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+        self.engine = SqliteEngine(logger, self.path, read_only=True)
+        self.refresh()
+
+    def record(self, count=1):
+        """Record writes to the primary."""
+        with self.lock:
+            self.writes += count
+
+    def due(self):
+        """Check whether writes since the snapshot make a refresh due."""
+        return 0 < self.max_writes <= self.writes
+
+    def age(self):
+        """Get seconds since the snapshot was taken."""
+        return time.time() - self.refreshed
+
+    def refresh(self):
+        """Take a snapshot of the primary and publish it as the replica."""
+        with self.refresh_lock:
+            temp_path = f'{self.path}.tmp'
+            with self.lock:
+                writes = self.writes
+            started = time.time()
+            # a connection of its own, whose read transaction lets writes continue on the primary during the backup
+            source = self.primary.connections.acquire()
+            target = db.connect(temp_path)
+            try:
+                target.execute('PRAGMA journal_mode=DELETE;')
+                source.backup(target)
+                # the copied header is that of the WAL primary, and an immutable file has no WAL to read
+                target.execute('PRAGMA journal_mode=DELETE;')
+                target.close()
+                os.replace(temp_path, self.path)
+            except BaseException:
+                target.close()
+                if os.path.exists(temp_path):
+                    os.unlink(temp_path)
+                raise
+            finally:
+                self.primary.connections.release(source)
+            with self.lock:
+                self.writes -= writes
+                self.refreshed = started
+            self.engine.connections.reset()
+        self.logger.info(f'db: replica refreshed in {time.time() - started:.3f}s after {writes} writes')
+
+    def close(self):
+        """Close."""
+        self.engine.close()
+
+
+class ShardedEngine(Engine):
+    """Sqlite engine spread over several database files, so writes to documents in different files commit in parallel.
+
+    Each file has connections and so a write lock of its own. Tables of db-shards are in files of their own beside
+    db-path, each split into its configured number of files by hash of document id, the other tables are in db-path.
+    Lists fan out to the files of the table and merge their pages. Bulk adds are transactional per file.
+    The revisions of a document are kept in its file, written in the transaction of the document.
+    """
+
+    def __init__(self, logger):
+        """Init."""
+        super().__init__(logger)
+        self.default = SqliteEngine(logger)
+        # table name -> engines of its files, in bucket order
+        self.shards = {}
+        root, ext = os.path.splitext(helper.get_db_path())
+        tables = [model.table for model in models.values()]
+        for tname, count in helper.get_db_shards().items():
+            if tname not in tables:
+                raise ValueError(f'unknown table {tname} in db-shards, expected one of {", ".join(tables)}')
+            if not isinstance(count, int) or count < 1:
+                raise ValueError(f'db-shards of {tname} is {count}, expected a number of files')
+            if count == 1:
+                paths = [f'{root}-{tname.lower()}{ext}']
+            else:
+                paths = [f'{root}-{tname.lower()}-{bucket}{ext}' for bucket in range(count)]
+            self.shards[tname] = [SqliteEngine(logger, path) for path in paths]
+            self.logger.info(f'db: {tname} in {count} files')
+
+    def _engines(self, tname):
+        """Get engines of the files of table."""
+        return self.shards.get(tname, [self.default])
+
+    def _engine(self, tname, oid):
+        """Get engine of the file of document, by hash of its id."""
+        engines = self._engines(tname)
+        if len(engines) == 1:
+            return engines[0]
+        digest = hashlib.sha256(oid.encode('utf-8')).digest()
+        return engines[int.from_bytes(digest[:8], 'big') % len(engines)]
+
+    def _all(self):
+        """Get engines of all files."""
+        return [self.default] + [engine for engines in self.shards.values() for engine in engines]
+
+    def document_engine(self, tname, oid):
+        """Get engine of the file of document, that keeps what is written with it in the transaction of its writes."""
+        return self._engine(tname, oid)
+
+    def file_engines(self):
+        """Get engines of all files, the db-path one first."""
+        return self._all()
+
+    def _merge(self, pages, key, limit, order, descending=False):
+        """Merge (items, next cursor) pages of the files of a table, each sorted by key, into a page."""
+        items = list(heapq.merge(*(page[0] for page in pages), key=key, reverse=descending))
+        more = any(next_cursor is not None for _, next_cursor in pages)
+        if limit is not None and (len(items) > limit or (len(items) == limit and more)):
+            items = items[:limit]
+            return items, encode_cursor(order, key(items[-1]))
+        return items, None
+
+    def init_table(self, tname, qcols=None):
+        """Init table in each of its files."""
+        for engine in self._engines(tname):
+            engine.init_table(tname, qcols)
+
+    def add(self, tname, oid, payload, columns=None, props=None, summary=None):
+        """Add document."""
+        return self._engine(tname, oid).add(tname, oid, payload, columns, props, summary)
+
+    def add_many(self, rows):
+        """Add (tname, oid, payload, columns, props, summary) rows, in a single transaction per file."""
+        # engine -> (position, row) of its rows
+        groups = {}
+        for index, row in enumerate(rows):
+            groups.setdefault(self._engine(row[0], row[1]), []).append((index, row))
+        result = [None] * len(rows)
+        for engine, group in groups.items():
+            for (index, _), error in zip(group, engine.add_many([row for _, row in group])):
+                result[index] = error
+        return result
+
+    def replace(self, tname, oid, payload, columns=None, props=None, summary=None, keep=None):
+        """Replace document."""
+        return self._engine(tname, oid).replace(tname, oid, payload, columns, props, summary, keep)
+
+    def upsert(self, tname, oid, payload, columns=None, props=None, summary=None, keep=None):
+        """Add document, or replace it if it exists."""
+        return self._engine(tname, oid).upsert(tname, oid, payload, columns, props, summary, keep)
+
+    def delete(self, tname, oid):
+        """Delete document."""
+        return self._engine(tname, oid).delete(tname, oid)
+
+    def get(self, tname, oid):
+        """Get document."""
+        return self._engine(tname, oid).get(tname, oid)
+
+    def get_stream(self, tname, oid, chunk_size):
+        """Get (size, Stream) of document."""
+        return self._engine(tname, oid).get_stream(tname, oid, chunk_size)
+
+    def get_id_list(self, tname, limit=None, cursor=None, order='id'):
+        """Get page of document ids, merging the pages of the files of the table by id.
+
+        Insertion order is per file, so tables split into several files list by id only.
+        """
+        engines = self._engines(tname)
+        if len(engines) == 1:
+            return engines[0].get_id_list(tname, limit, cursor, order)
+        if order != 'id':
+            raise NotImplementedError(f'{type(self).__name__} lists ids of tables split into files by id only')
+        pages = [engine.get_id_list(tname, limit, cursor, order) for engine in engines]
+        return self._merge(pages, lambda oid: oid, limit, order)
+
+    def list_summaries(self, tname, filters=None, sort='id', descending=False, limit=None, cursor=None):
+        """Get page of summaries, merging the pages of the files of the table by sort."""
+        engines = self._engines(tname)
+        if len(engines) == 1:
+            return engines[0].list_summaries(tname, filters, sort, descending, limit, cursor)
+        pages = [engine.list_summaries(tname, filters, sort, descending, limit, cursor) for engine in engines]
+        return self._merge(
+            pages, lambda item: summary_key(item['id'], item, sort), limit, summary_order(sort, descending), descending
+        )
+
+    def get_by_column(self, tname, cname, cvalue):
+        """Get documents by column, from each file of the table."""
+        return [payload for engine in self._engines(tname) for payload in engine.get_by_column(tname, cname, cvalue)]
+
+    def find_by_prop(self, tname, name, value, ns=None):
+        """Get ids of documents by prop, from each file of the table."""
+        return [oid for engine in self._engines(tname) for oid in engine.find_by_prop(tname, name, value, ns)]
+
+    def train_dictionary(self):
+        """Train dictionary for the codec on a sample of the stored documents of all files, added to each file."""
+        if self.default.codec is codec.identity:
+            raise HTTPException(status_code=400, detail='compression is disabled')
+        count = helper.get_db_dictionary_samples()
+        samples = self.default.sample_documents(count)
+        for engines in self.shards.values():
+            # the sample of a table split into files is split between them
+            for engine in engines:
+                samples.extend(engine.sample_documents(-(-count // len(engines))))
+        dictionary = train_codec_dictionary(self.default.codec, samples)
+        result = self.default.add_dictionary(dictionary, len(samples))
+        for engine in self._all()[1:]:
+            engine.add_dictionary(dictionary, len(samples))
+        return result
+
+    def fragment_stats(self):
+        """Get statistics of the fragments of each file."""
+        return {'files': [dict(engine.fragment_stats(), path=engine.connections.path) for engine in self._all()]}
+
+    def close(self):
+        """Close all files."""
+        for engine in self._all():
+            engine.close()
+
+
+class MemoryEngine(Engine):
+    """In-memory engine, for benchmarks and tests, not persisted across restarts."""
+
+    def __init__(self, logger):
+        """Init."""
+        super().__init__(logger)
+        # table name -> id -> (payload, columns, props)
+        self.tables = {}
+        # (table name, prop name, prop value) -> id -> namespaces
+        self.props = {}
+        # table name -> id -> insertion sequence number
+        self.inserted = {}
+        # table name -> id -> summary
+        self.summaries = {}
+        self.sequence = 0
+        self.lock = threading.Lock()
+
+    def _index_props(self, tname, oid, props):
+        """Index props of document."""
+        for name, value, ns in props:
+            self.props.setdefault((tname, name, value), {}).setdefault(oid, set()).add(ns)
+
+    def _insert_sequence(self, tname, oid):
+        """Record insertion order of document."""
+        self.sequence += 1
+        self.inserted[tname][oid] = self.sequence
+
+    def _set_summary(self, tname, oid, summary):
+        """Set summary of document, or unset it if None."""
+        if summary is None:
+            self.summaries[tname].pop(oid, None)
+        else:
+            self.summaries[tname][oid] = summary
+
+    def _unindex_props(self, tname, oid, props):
+        """Unindex props of document."""
+        for name, value, _ in props:
+            oids = self.props.get((tname, name, value), {})
+            oids.pop(oid, None)
+            if not oids:
+                self.props.pop((tname, name, value), None)
+
+    def init_table(self, tname, qcols=None):
+        """Init table."""
+        with self.lock:
+            self.tables.setdefault(tname, {})
+            self.inserted.setdefault(tname, {})
+            self.summaries.setdefault(tname, {})
+
+    def add(self, tname, oid, payload, columns=None, props=None, summary=None):
+        """Add document."""
+        with self.lock:
+            table = self.tables[tname]
+            if oid in table:
+                raise HTTPException(status_code=400, detail=f'{oid} already exists')
+            table[oid] = (payload, columns or {}, props or [])
+            self._index_props(tname, oid, props or [])
+            self._insert_sequence(tname, oid)
+            self._set_summary(tname, oid, summary)
+        return oid
+
+    def add_many(self, rows):
+        """Add (tname, oid, payload, columns, props, summary) rows."""
+        result = []
+        with self.lock:
+            for tname, oid, payload, columns, props, summary in rows:
+                table = self.tables[tname]
+                if oid in table:
+                    result.append(f'{oid} already exists')
+                    continue
+                table[oid] = (payload, columns or {}, props or [])
+                self._index_props(tname, oid, props or [])
+                self._insert_sequence(tname, oid)
+                self._set_summary(tname, oid, summary)
+                result.append(None)
+        return result
+
+    def replace(self, tname, oid, payload, columns=None, props=None, summary=None, keep=None):
+        """Replace document."""
+        with self.lock:
+            table = self.tables[tname]
+            if oid not in table:
+                return None
+            if keep is not None:
+                keep(table[oid][0])
+            self._unindex_props(tname, oid, table[oid][2])
+            table[oid] = (payload, columns or {}, props or [])
+            self._index_props(tname, oid, props or [])
+            self._set_summary(tname, oid, summary)
+        return oid
+
+    def upsert(self, tname, oid, payload, columns=None, props=None, summary=None, keep=None):
+        """Add document, or replace it if it exists."""
+        with self.lock:
+            table = self.tables[tname]
+            if oid in table:
+                if keep is not None:
+                    keep(table[oid][0])
+                self._unindex_props(tname, oid, table[oid][2])
+            else:
+                self._insert_sequence(tname, oid)
+            table[oid] = (payload, columns or {}, props or [])
+            self._index_props(tname, oid, props or [])
+            self._set_summary(tname, oid, summary)
+        return oid
+
+    def delete(self, tname, oid):
+        """Delete document."""
+        with self.lock:
+            row = self.tables[tname].pop(oid, None)
+            if row is None:
+                return None
+            self._unindex_props(tname, oid, row[2])
+            self.inserted[tname].pop(oid)
+            self.summaries[tname].pop(oid, None)
+        return oid
+
+    def get(self, tname, oid):
+        """Get document."""
+        with self.lock:
+            row = self.tables[tname].get(oid)
+        return None if row is None else row[0]
+
+    def get_id_list(self, tname, limit=None, cursor=None, order='id'):
+        """Get page of document ids."""
+        with self.lock:
+            if order == 'id':
+                keyed_ids = sorted((oid, oid) for oid in self.tables[tname])
+            else:
+                keyed_ids = sorted((sequence, oid) for oid, sequence in self.inserted[tname].items())
+        return self._page(keyed_ids, limit, cursor, order)
+
+    def list_summaries(self, tname, filters=None, sort='id', descending=False, limit=None, cursor=None):
+        """Get page of summaries, scanning those of the table."""
+        with self.lock:
+            summaries = list(self.summaries[tname].items())
+        return self._list_summaries(summaries, filters, sort, descending, limit, cursor)
+
+    def get_by_column(self, tname, cname, cvalue):
+        """Get documents by scanning for column value."""
+        with self.lock:
+            return [payload for payload, columns, _ in self.tables[tname].values() if columns.get(cname) == cvalue]
+
+    def find_by_prop(self, tname, name, value, ns=None):
+        """Get ids of documents by prop."""
+        with self.lock:
+            oids = self.props.get((tname, name, value), {})
+            return [oid for oid, namespaces in oids.items() if ns is None or ns in namespaces]
+
+
+class FilesystemEngine(Engine):
+    """Filesystem engine, storing documents in a trestle workspace layout.
+
+    Each document is {workspace}/{model directory}/{id}/{oscal path}.json, with its secondary index columns, props and
+    summary, if any, alongside in .columns.json, .props.json and .summary.json, which lookups and listings scan.
+    Writes are atomic per document, bulk adds are not transactional.
+    """
+
+    def __init__(self, logger):
+        """Init."""
+        super().__init__(logger)
+        self.workspace = helper.get_db_workspace()
+        # table name -> model
+        self.tables = {model.table: model for model in models.values()}
+
+    def _directory(self, tname, oid=None):
+        """Get directory of table, or of document in table."""
+        directory = os.path.join(self.workspace, self.tables[tname].directory)
+        if oid is None:
+            return directory
+        # ids are used as directory names, so nothing that could escape the table directory
+        if not oid or oid.startswith('.') or os.path.basename(oid) != oid:
+            raise HTTPException(status_code=400, detail=f'{oid} is not a valid id')
+        return os.path.join(directory, oid)
+
+    def _file(self, tname, oid):
+        """Get file of document."""
+        return os.path.join(self._directory(tname, oid), f'{self.tables[tname].oscal_path}.json')
+
+    def _write(self, path, text):
+        """Write file atomically."""
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def _write_document(self, tname, oid, payload, columns, props, summary):
+        """Write document with its columns, props and summary."""
+        directory = self._directory(tname, oid)
+        sidecars = [('.columns.json', columns), ('.props.json', props), ('.summary.json', summary)]
+        for name, sidecar in sidecars:
+            path = os.path.join(directory, name)
+            if sidecar:
+                self._write(path, json.dumps(sidecar))
+            elif os.path.exists(path):
+                os.unlink(path)
+        if isinstance(payload, bytes):
+            payload = payload.decode('utf-8')
+        self._write(self._file(tname, oid), payload)
+
+    def init_table(self, tname, qcols=None):
+        """Init table directory."""
+        os.makedirs(self._directory(tname), exist_ok=True)
+
+    def add(self, tname, oid, payload, columns=None, props=None, summary=None):
+        """Add document, its directory removed again if it is not written."""
+        directory = self._directory(tname, oid)
+        try:
+            os.mkdir(directory)
+        except FileExistsError:
+            raise HTTPException(status_code=400, detail=f'{oid} already exists')
+        try:
+            self._write_document(tname, oid, payload, columns, props, summary)
+        except BaseException:
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+        return oid
+
+    def add_many(self, rows):
+        """Add (tname, oid, payload, columns, props, summary) rows, one at a time."""
+        result = []
+        for tname, oid, payload, columns, props, summary in rows:
+            try:
+                self.add(tname, oid, payload, columns, props, summary)
+                result.append(None)
+            except HTTPException as e:
+                result.append(e.detail)
+        return result
+
+    def replace(self, tname, oid, payload, columns=None, props=None, summary=None, keep=None):
+        """Replace document.
+
+        For keep the document is read before it is written, and writes being atomic per document only, another
+        process may write it in between.
+        """
+        if keep is None:
+            if not os.path.exists(self._file(tname, oid)):
+                return None
+        else:
+            old = self.get(tname, oid)
+            if old is None:
+                return None
+            keep(old)
+        self._write_document(tname, oid, payload, columns, props, summary)
+        return oid
+
+    def upsert(self, tname, oid, payload, columns=None, props=None, summary=None, keep=None):
+        """Add document, or replace it if it exists."""
+        if not os.path.exists(self._file(tname, oid)):
+            try:
+                return self.add(tname, oid, payload, columns, props, summary)
+            except HTTPException:
+                # added meanwhile
+                pass
+        if keep is not None:
+            old = self.get(tname, oid)
+            if old is not None:
+                keep(old)
+        self._write_document(tname, oid, payload, columns, props, summary)
+        return oid
+
+    def delete(self, tname, oid):
+        """Delete document."""
+        try:
+            shutil.rmtree(self._directory(tname, oid))
+        except FileNotFoundError:
+            return None
+        return oid
+
+    def get(self, tname, oid):
+        """Get document."""
+        try:
+            with open(self._file(tname, oid), 'r', encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def get_stream(self, tname, oid, chunk_size):
+        """Get (size, Stream) of document, read from its file in chunks."""
+        try:
+            f = open(self._file(tname, oid), 'rb')
+        except FileNotFoundError:
+            return None
+        size = os.fstat(f.fileno()).st_size
+        return size, Stream(iter(functools.partial(f.read, chunk_size), b''), f.close)
+
+    def _ids(self, tname):
+        """Get sorted document ids."""
+        directory = self._directory(tname)
+        return [
+            oid for oid in sorted(os.listdir(directory))
+            if not oid.startswith('.') and os.path.exists(self._file(tname, oid))
+        ]
+
+    def get_id_list(self, tname, limit=None, cursor=None, order='id'):
+        """Get page of document ids, ordered by id only since directories do not record insertion."""
+        if order != 'id':
+            raise NotImplementedError(f'{type(self).__name__} lists ids by id only')
+        return self._page(((oid, oid) for oid in self._ids(tname)), limit, cursor, order)
+
+    def _read_sidecar(self, tname, oid, name, default):
+        """Read sidecar of document."""
+        try:
+            with open(os.path.join(self._directory(tname, oid), name), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return default
+
+    def list_summaries(self, tname, filters=None, sort='id', descending=False, limit=None, cursor=None):
+        """Get page of summaries, scanning their sidecars."""
+        summaries = []
+        for oid in self._ids(tname):
+            summary = self._read_sidecar(tname, oid, '.summary.json', None)
+            if summary is not None:
+                summaries.append((oid, summary))
+        return self._list_summaries(summaries, filters, sort, descending, limit, cursor)
+
+    def get_by_column(self, tname, cname, cvalue):
+        """Get documents by scanning their columns."""
+        result = []
+        for oid in self._ids(tname):
+            columns = self._read_sidecar(tname, oid, '.columns.json', {})
+            if columns.get(cname) == cvalue:
+                payload = self.get(tname, oid)
+                if payload is not None:
+                    result.append(payload)
+        return result
+
+    def find_by_prop(self, tname, name, value, ns=None):
+        """Get ids of documents by scanning their props."""
+        result = []
+        for oid in self._ids(tname):
+            for prop_name, prop_value, prop_ns in self._read_sidecar(tname, oid, '.props.json', []):
+                if prop_name == name and prop_value == value and (ns is None or prop_ns == ns):
+                    result.append(oid)
+                    break
+        return result
+
+
+engines = {
+    'sqlite': SqliteEngine,
+    'sharded': ShardedEngine,
+    'memory': MemoryEngine,
+    'filesystem': FilesystemEngine,
+}
+
+
+def get_engine(logger, name):
+    """Get storage engine by name."""
+    if name not in engines:
+        raise ValueError(f'unknown storage engine {name}, expected one of {", ".join(engines)}')
+    return engines[name](logger)
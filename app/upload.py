@@ -0,0 +1,178 @@
+# -*- mode:python; coding:utf-8 -*-
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""OSCAL Exchange Protocol."""
+import codecs
+import hashlib
+import logging
+import re
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+# bytes of a multipart request body beyond its file, for the boundaries, part headers and other fields
+form_overhead = 65536
+
+# complete json string
+_string = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+# remainder of a json string that started in a previous chunk
+_string_body = re.compile(rb'[^"\\]*(?:\\.[^"\\]*)*', re.DOTALL)
+# anything outside of strings that can not be json
+_not_json = re.compile(rb'[^\s{}\[\]:,0-9eE+\-.truefalsn]')
+
+
+class JsonScanError(Exception):
+    """Json scan error."""
+
+
+class JsonScanner():
+    """Incremental structural json checker.
+
+    Fed one chunk at a time, it tracks string state and nesting depth so
+    malformed documents are rejected as soon as the offending chunk arrives.
+    Work per chunk is done with regular expressions and bytes.count, so
+    the cost is a fraction of that of the full parse.
+    """
+
+    def __init__(self):
+        """Init."""
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.started = False
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+
+    def feed(self, chunk):
+        """Scan next chunk."""
+        try:
+            self.decoder.decode(chunk)
+        except UnicodeDecodeError:
+            raise JsonScanError('not utf-8')
+        data = chunk
+        if self.in_string:
+            if self.escape:
+                data = data[1:]
+                self.escape = False
+            end = _string_body.match(data).end()
+            if end == len(data):
+                return
+            if data[end:end + 1] != b'"':
+                # chunk ends inside an escape sequence
+                self.escape = True
+                return
+            self.in_string = False
+            data = data[end + 1:]
+        self._scan_structure(data)
+
+    def _scan_structure(self, data):
+        """Scan data that starts outside of a string."""
+        stripped = _string.sub(b'', data)
+        quote = stripped.find(b'"')
+        if quote >= 0:
+            # a string starts here but does not end in this chunk
+            self.in_string = True
+            trailing = len(data) - len(data.rstrip(b'\\'))
+            self.escape = trailing % 2 == 1
+            stripped = stripped[:quote]
+        if not self.started:
+            stripped = stripped.lstrip()
+            if not stripped:
+                if self.in_string:
+                    raise JsonScanError('document is not an object')
+                return
+            if not stripped.startswith(b'{'):
+                raise JsonScanError('document is not an object')
+            self.started = True
+        elif self.depth == 0 and stripped.strip():
+            raise JsonScanError('content after end of document')
+        if _not_json.search(stripped):
+            raise JsonScanError('unexpected character')
+        self.depth += stripped.count(b'{') + stripped.count(b'[')
+        self.depth -= stripped.count(b'}') + stripped.count(b']')
+        if self.depth < 0:
+            raise JsonScanError('unbalanced brackets')
+
+    def close(self):
+        """Check document is complete."""
+        try:
+            self.decoder.decode(b'', final=True)
+        except UnicodeDecodeError:
+            raise JsonScanError('not utf-8')
+        if not self.started or self.depth != 0 or self.in_string:
+            raise JsonScanError('incomplete document')
+
+
+async def read_upload(oscal_path, oscal_file, max_size, chunk_size):
+    """Read uploaded file in chunks, rejecting oversized or malformed content early.
+
+    Returns the contents and their sha256 hex digest.
+    """
+    size = getattr(oscal_file, 'size', None)
+    if size is not None and size > max_size:
+        raise HTTPException(status_code=413, detail=f'{oscal_path} exceeds {max_size} bytes.')
+    scanner = JsonScanner()
+    digest = hashlib.sha256()
+    contents = bytearray()
+    try:
+        while True:
+            chunk = await oscal_file.read(chunk_size)
+            if not chunk:
+                break
+            if len(contents) + len(chunk) > max_size:
+                raise HTTPException(status_code=413, detail=f'{oscal_path} exceeds {max_size} bytes.')
+            scanner.feed(chunk)
+            digest.update(chunk)
+            contents += chunk
+        scanner.close()
+    except JsonScanError as e:
+        logger.error(f'read {oscal_path}: {e} near byte {len(contents)}')
+        raise HTTPException(status_code=400, detail=f'Invalid {oscal_path} in file.')
+    return contents, digest.hexdigest()
+
+
+class UploadLimit():
+    """ASGI middleware refusing request bodies larger than max size, before they are spooled to disk or parsed.
+
+    A body whose Content-Length is over the limit is refused without reading it. One without Content-Length, or
+    longer than it claims, is counted as it is received and refused once over the limit.
+    """
+
+    def __init__(self, app, max_size):
+        """Init."""
+        self.app = app
+        self.max_size = max_size + form_overhead
+
+    async def __call__(self, scope, receive, send):
+        """Handle request."""
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        length = dict(scope['headers']).get(b'content-length', b'')
+        if length.isdigit() and int(length) > self.max_size:
+            response = JSONResponse(status_code=413, content={'detail': f'request exceeds {self.max_size} bytes.'})
+            return await response(scope, receive, send)
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > self.max_size:
+                    # raised in the handler reading the body, so it is answered by the app like its own errors
+                    raise HTTPException(status_code=413, detail=f'request exceeds {self.max_size} bytes.')
+            return message
+
+        return await self.app(scope, limited_receive, send)
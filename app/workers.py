@@ -0,0 +1,86 @@
+# -*- mode:python; coding:utf-8 -*-
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""OSCAL Exchange Protocol."""
+import asyncio
+import functools
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+
+class Workers():
+    """Worker pools keeping validation and upload reading off the event loop."""
+
+    def __init__(self, logger, processes, threads, queue_depth):
+        """Init."""
+        self.logger = logger
+        self.queue_depth = queue_depth
+        self.processes = processes
+        self.concurrency = max(1, min(processes or threads, queue_depth))
+        self.pending = {'cpu': 0, 'io': 0}
+        self.thread_pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='oxp-io')
+        if processes > 0:
+            # spawn, since forking a process that is already running threads is unsafe
+            context = multiprocessing.get_context('spawn')
+            self.process_pool = ProcessPoolExecutor(max_workers=processes, mp_context=context)
+        else:
+            self.process_pool = self.thread_pool
+        self.logger.info(f'workers: processes={processes} threads={threads} queue-depth={queue_depth}')
+
+    async def _submit(self, kind, executor, func, *args, **kwargs):
+        """Run function in executor, bounded by queue depth."""
+        if self.pending[kind] >= self.queue_depth:
+            raise HTTPException(status_code=503, detail=f'{kind} queue full, retry later')
+        self.pending[kind] += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+        finally:
+            self.pending[kind] -= 1
+
+    async def cpu(self, func, *args, **kwargs):
+        """Run CPU-bound function in the process pool."""
+        return await self._submit('cpu', self.process_pool, func, *args, **kwargs)
+
+    async def cpu_map(self, func, batches):
+        """Run CPU-bound function over batches in the process pool, one batch per worker at a time."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(batch):
+            async with semaphore:
+                return await self.cpu(func, batch)
+
+        return await asyncio.gather(*[run(batch) for batch in batches])
+
+    async def warm_up(self, func):
+        """Run function once per process pool worker, starting the workers ahead of first use.
+
+        Workers are started on demand by concurrent submissions, each then typically runs one call.
+        """
+        return await asyncio.gather(*[self.cpu(func) for _ in range(max(1, self.processes))])
+
+    async def io(self, func, *args, **kwargs):
+        """Run I/O-bound function in the thread pool."""
+        return await self._submit('io', self.thread_pool, func, *args, **kwargs)
+
+    def shutdown(self):
+        """Shutdown pools."""
+        if self.process_pool is not self.thread_pool:
+            self.process_pool.shutdown(wait=True, cancel_futures=True)
+        self.thread_pool.shutdown(wait=True, cancel_futures=True)
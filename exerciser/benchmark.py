@@ -0,0 +1,219 @@
+# -*- mode:python; coding:utf-8 -*-
+
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmarks for the OSCAL Exchange Protocol server internals."""
+import argparse
+import pathlib
+import sys
+import tempfile
+import time
+
+base_dir = (pathlib.Path(__file__).resolve()).parent.parent
+dir_app = base_dir / 'app'
+dir_trestle = base_dir / 'trestle.workspace'
+
+sys.path.insert(0, str(dir_app))
+
+samples = {
+    'catalog': dir_trestle / 'catalogs' / 'sample' / 'catalog.json',
+    'profile': dir_trestle / 'profiles' / 'sample' / 'profile.json',
+    'component-definition': dir_trestle / 'component-definitions' / 'sample' / 'component-definition.json',
+    'system-security-plan': dir_trestle / 'system-security-plans' / 'sample' / 'system-security-plan.json',
+    'assessment-results': dir_trestle / 'assessment-results' / 'assessment-results.json',
+    'plan-of-action-and-milestones':
+    dir_trestle / 'plan-of-action-and-milestones' / 'sample' / 'plan-of-action-and-milestones.json',
+}
+
+
+def sample_contents():
+    """Get (model, source, contents) of a valid document of every model type, generated where the workspace has none."""
+    import documents
+
+    from ingest import IngestError, oscal_read_bytes
+
+    from registry import models
+
+    for oscal_path in models:
+        sample = samples.get(oscal_path)
+        if sample is not None:
+            contents = sample.read_bytes()
+            try:
+                oscal_read_bytes(oscal_path, contents)
+                yield oscal_path, 'workspace', contents
+                continue
+            except IngestError:
+                pass
+        yield oscal_path, 'generated', documents.dumps(documents.sample(oscal_path))
+
+
+def io_counters():
+    """Get read and write syscall counts of this process (linux only)."""
+    counters = {}
+    try:
+        with open('/proc/self/io', 'r') as f:
+            for line in f:
+                key, value = line.split(':')
+                counters[key] = int(value)
+    except OSError:
+        pass
+    return counters.get('syscr', 0), counters.get('syscw', 0)
+
+
+def measure(func, iterations):
+    """Measure mean latency (ms) and read/write syscalls per call."""
+    func()
+    syscr, syscw = io_counters()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    elapsed = time.perf_counter() - start
+    syscr_end, syscw_end = io_counters()
+    # the counter read itself costs syscalls, so this is an upper bound
+    return elapsed * 1000 / iterations, (syscr_end - syscr) / iterations, (syscw_end - syscw) / iterations
+
+
+def bench_ingest(iterations):
+    """Compare temp file round-trip validation against in-memory validation."""
+    import trestle.core.models.elements as elements
+
+    from ingest import oscal_read_bytes
+
+    print('*** Ingest: temp file vs in-memory ***')
+    print(f'{"model":32} {"sample":10} {"path":10} {"ms/doc":>10} {"syscr/doc":>10} {"syscw/doc":>10}')
+    temp_path = pathlib.Path(tempfile.gettempdir()) / 'upload.json'
+    for oscal_path, source, contents in sample_contents():
+
+        def temp_file(oscal_path=oscal_path, contents=contents):
+            obm_type = elements.ElementPath(oscal_path).get_obm_wrapped_type()
+            with open(temp_path, 'w') as f:
+                f.write(str(contents, 'utf-8'))
+            return obm_type.oscal_read(temp_path)
+
+        def in_memory(oscal_path=oscal_path, contents=contents):
+            return oscal_read_bytes(oscal_path, contents)
+
+        for name, func in [('temp-file', temp_file), ('in-memory', in_memory)]:
+            ms, syscr, syscw = measure(func, iterations)
+            print(f'{oscal_path:32} {source:10} {name:10} {ms:10.3f} {syscr:10.1f} {syscw:10.1f}')
+    print('')
+
+
+def bench_storage(iterations):
+    """Compare storage engines under the same document operations."""
+    import itertools
+    import logging
+
+    from helper import helper
+
+    from storage import engines
+
+    print('*** Storage: engines ***')
+    print(f'{"engine":12} {"operation":10} {"ms/op":>10} {"syscr/op":>10} {"syscw/op":>10}')
+    payload = samples['system-security-plan'].read_text()
+    tname = 'SYSTEM_SECURITY_PLANS'
+    with tempfile.TemporaryDirectory() as temp_dir:
+        helper.config['db-path'] = str(pathlib.Path(temp_dir) / 'oscal.sqlite')
+        helper.config['db-workspace'] = str(pathlib.Path(temp_dir) / 'oxp.workspace')
+        helper.config['db-shards'] = {tname: 4}
+        for name, engine_type in engines.items():
+            engine = engine_type(logging.getLogger(__name__))
+            engine.init_table(tname)
+            ids = (f'{name}-{n}' for n in itertools.count())
+            engine.add(tname, 'fixed', payload)
+            operations = [
+                ('add', lambda engine=engine, ids=ids: engine.add(tname, next(ids), payload)),
+                ('get', lambda engine=engine: engine.get(tname, 'fixed')),
+                ('replace', lambda engine=engine: engine.replace(tname, 'fixed', payload)),
+                ('id-list', lambda engine=engine: engine.get_id_list(tname, helper.get_id_list_limit())),
+            ]
+            for operation, func in operations:
+                ms, syscr, syscw = measure(func, iterations)
+                print(f'{name:12} {operation:10} {ms:10.3f} {syscr:10.1f} {syscw:10.1f}')
+            engine.close()
+    print('')
+
+
+def variants(contents, count):
+    """Get copies of document contents with fresh uuids, as a corpus of similar documents."""
+    import re
+    import uuid
+
+    pattern = re.compile(rb'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}')
+    return [pattern.sub(lambda _: str(uuid.uuid4()).encode(), contents) for _ in range(count)]
+
+
+def bench_compression(iterations):
+    """Compare payload codecs, with and without a trained dictionary, per model type."""
+    import codec
+
+    print('*** Compression: ratio and cpu per codec ***')
+    print(f'{"model":32} {"codec":14} {"bytes":>8} {"ratio":>8} {"comp ms":>10} {"decomp ms":>10}')
+    levels = {'zlib': 6, 'zstd': 3}
+    for oscal_path, _, contents in sample_contents():
+        corpus = variants(contents, 500)
+        payload = corpus[0]
+        for name in codec.codecs:
+            try:
+                codec.check(name)
+            except codec.CodecError as e:
+                print(f'{oscal_path:32} {name:14} skipped, {e}')
+                continue
+            try:
+                trained = codec.train(name, corpus[1:], 32768) or None
+            except Exception:
+                trained = None
+            for label, dictionary in [(name, None), (f'{name}+dict', trained)]:
+                if label != name and dictionary is None:
+                    print(f'{oscal_path:32} {label:14} skipped, too few similar documents')
+                    continue
+                compressed = codec.compress(payload, name, levels[name], dictionary)
+                comp_ms, _, _ = measure(
+                    lambda payload=payload, name=name, dictionary=dictionary: codec.compress(
+                        payload, name, levels[name], dictionary
+                    ),
+                    iterations,
+                )
+                decomp_ms, _, _ = measure(
+                    lambda compressed=compressed, name=name, dictionary=dictionary: codec.decompress(
+                        compressed, name, dictionary
+                    ),
+                    iterations,
+                )
+                ratio = len(payload) / len(compressed)
+                print(f'{oscal_path:32} {label:14} {len(payload):8} {ratio:8.2f} {comp_ms:10.4f} {decomp_ms:10.4f}')
+    print('')
+
+
+benchmarks = {
+    'ingest': bench_ingest,
+    'storage': bench_storage,
+    'compression': bench_compression,
+}
+
+
+def main():
+    """Run benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('benchmark', nargs='*', help=f'benchmarks to run: {", ".join(benchmarks)} (default all)')
+    parser.add_argument('--iterations', type=int, default=200, help='iterations per measurement')
+    args = parser.parse_args()
+    for name in args.benchmark or benchmarks:
+        if name not in benchmarks:
+            parser.error(f'unknown benchmark {name}')
+        benchmarks[name](args.iterations)
+
+
+if __name__ == '__main__':
+    main()
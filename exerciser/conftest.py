@@ -0,0 +1,113 @@
+# -*- mode:python; coding:utf-8 -*-
+
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Fixtures of the OSCAL Exchange Protocol tests, run in process against the app of ../app."""
+import logging
+import pathlib
+import sys
+
+import pytest
+
+dir_app = pathlib.Path(__file__).resolve().parent.parent / 'app'
+
+sys.path.insert(0, str(dir_app))
+
+from helper import helper  # noqa: E402, I100
+
+# validation runs in threads, as spawned worker processes would read app.yaml rather than the test configuration
+helper.config['worker-processes'] = 0
+helper.config['warm-up'] = False
+
+logger = logging.getLogger('oxp-test')
+
+authorize = {'Authorization': 'Bearer token'}
+
+
+@pytest.fixture
+def config(monkeypatch):
+    """Get setter of app.yaml keys for the test, restored after it."""
+
+    def set_config(**values):
+        for key, value in values.items():
+            monkeypatch.setitem(helper.config, key.replace('_', '-'), value)
+
+    return set_config
+
+
+@pytest.fixture
+def open_db(tmp_path, monkeypatch):
+    """Get opener of Db in a directory of the test, closing those opened after it."""
+    from db import Db
+
+    monkeypatch.chdir(tmp_path)
+    opened = []
+
+    def open_():
+        opened.append(Db(logger))
+        return opened[-1]
+
+    yield open_
+    for db in opened:
+        db.close()
+
+
+@pytest.fixture
+def db(open_db):
+    """Get Db in a directory of the test, with the configuration of app.yaml."""
+    return open_db()
+
+
+@pytest.fixture
+def open_engine(tmp_path, config):
+    """Get opener of storage engines by name, storing in a directory of the test, closing those opened after it.
+
+    Engines are opened with the tables of the registry.
+    """
+    from registry import models
+    from storage import get_engine
+
+    config(db_path=str(tmp_path / 'oscal.sqlite'), db_workspace=str(tmp_path / 'oxp.workspace'))
+    opened = []
+
+    def open_(name):
+        opened.append(get_engine(logger, name))
+        for model in models.values():
+            opened[-1].init_table(model.table, list(model.indexes))
+        return opened[-1]
+
+    yield open_
+    for engine in opened:
+        engine.close()
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'filesystem'])
+def engine(request, open_engine):
+    """Get storage engine of each kind."""
+    return open_engine(request.param)
+
+
+@pytest.fixture(scope='session')
+def client(tmp_path_factory):
+    """Get client of the app, in a directory of the test session.
+
+    The app is started once, as its lifespan shuts down the worker pools, so tests of the app share its db.
+    """
+    from fastapi.testclient import TestClient
+
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.chdir(tmp_path_factory.mktemp('app'))
+        import main
+        with TestClient(main.app) as client:
+            yield client
@@ -0,0 +1,103 @@
+# -*- mode:python; coding:utf-8 -*-
+
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""OSCAL documents of the OSCAL Exchange Protocol tests."""
+import json
+import uuid
+
+from helper import helper
+
+from registry import models
+
+
+def dumps(obj):
+    """Serialize json object as uploaded."""
+    return json.dumps(obj).encode('utf-8')
+
+
+def metadata(title, props=None, last_modified='2022-05-09T07:59:38.490+00:00', version='1.0'):
+    """Get metadata."""
+    result = {'title': title, 'last-modified': last_modified, 'version': version, 'oscal-version': '1.0.2'}
+    if props:
+        result['props'] = props
+    return result
+
+
+def control(group, number):
+    """Get control of group, with a parameter and a statement."""
+    control_id = f'{group}-{number}'
+    return {
+        'id': control_id,
+        'title': f'Control {control_id.upper()}',
+        'params': [{'id': f'{control_id}_prm_1', 'label': 'frequency'}],
+        'parts': [
+            {
+                'id': f'{control_id}_smt',
+                'name': 'statement',
+                'prose': f'Review the {group} policy at {{{{ insert: param, {control_id}_prm_1 }}}}.',
+            }
+        ],
+    }
+
+
+def catalog(title='Test catalog', groups=('ac', 'au'), controls=3, props=None, resources=0):
+    """Get catalog of groups of controls, with optional metadata props and back matter resources."""
+    obj = {
+        'uuid': str(uuid.uuid4()),
+        'metadata': metadata(title, props),
+        'groups': [
+            {
+                'id': group,
+                'title': f'Group {group.upper()}',
+                'controls': [control(group, number) for number in range(1, controls + 1)],
+            } for group in groups
+        ],
+    }
+    if resources:
+        obj['back-matter'] = {'resources': [resource(number) for number in range(resources)]}
+    return {'catalog': obj}
+
+
+def resource(number):
+    """Get back matter resource, the same for the same number."""
+    return {
+        'uuid': str(uuid.UUID(int=number + 1, version=4)),
+        'title': f'Reference {number}',
+        'description': f'Reference {number} of the test documents, shared by all of them. ' * 8,
+    }
+
+
+def profile(title='Test profile', mnemonic='test-profile', href='https://example.com/catalog.json'):
+    """Get profile importing all controls of a catalog, with a profile mnemonic prop."""
+    props = [{'name': helper.get_profile_mnemonic(), 'value': mnemonic}]
+    return {
+        'profile': {
+            'uuid': str(uuid.uuid4()),
+            'metadata': metadata(title, props),
+            'imports': [{'href': href, 'include-all': {}, 'exclude-controls': [{'with-ids': ['ac-1']}]}],
+        }
+    }
+
+
+def sample(oscal_path):
+    """Get minimal valid document of model type, with a fresh uuid."""
+    from trestle.core.generators import generate_sample_model
+
+    return json.loads(generate_sample_model(models[oscal_path].obm_type).oscal_serialize_json())
+
+
+def oid(obj):
+    """Get uuid of wrapped OSCAL object."""
+    return next(iter(obj.values()))['uuid']
@@ -0,0 +1,83 @@
+# -*- mode:python; coding:utf-8 -*-
+
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests of the awaitable db of the app."""
+import asyncio
+import threading
+
+from conftest import logger
+
+from db import AsyncDb
+
+from fastapi import HTTPException
+
+import pytest
+
+
+def run_db(func, threads=2, queue_depth=4):
+    """Run coroutine function of AsyncDb, connected around it."""
+
+    async def run():
+        db = AsyncDb(logger, threads, queue_depth)
+        await db.connect()
+        try:
+            return await func(db)
+        finally:
+            await db.close()
+
+    return asyncio.run(run())
+
+
+def test_documents(tmp_path, monkeypatch):
+    """Documents are added, got, streamed and deleted by awaiting."""
+    monkeypatch.chdir(tmp_path)
+
+    async def run(db):
+        await db.add('catalog', 'a', '{"catalog": {}}')
+        got = await db.get('catalog', 'a')
+        size, chunks = await db.get_stream('catalog', 'a', 4)
+        streamed = b''.join([chunk async for chunk in chunks])
+        await db.delete('catalog', 'a')
+        return got, size, streamed, await db.get('catalog', 'a')
+
+    assert run_db(run) == ('{"catalog": {}}', 15, b'{"catalog": {}}', None)
+
+
+def test_off_event_loop(tmp_path, monkeypatch):
+    """Calls run on the threads of the db, not that of the event loop."""
+    monkeypatch.chdir(tmp_path)
+
+    async def run(db):
+        return threading.get_ident(), await db._run(threading.get_ident)
+
+    loop_thread, db_thread = run_db(run)
+    assert loop_thread != db_thread
+
+
+def test_queue_full(tmp_path, monkeypatch):
+    """Calls beyond the queue depth are refused with 503."""
+    monkeypatch.chdir(tmp_path)
+    release = threading.Event()
+
+    async def run(db):
+        pending = asyncio.ensure_future(db._run(release.wait, 5))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as e:
+            await db.get('catalog', 'a')
+        release.set()
+        await pending
+        return e.value.status_code
+
+    assert run_db(run, threads=1, queue_depth=1) == 503
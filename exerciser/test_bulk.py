@@ -0,0 +1,110 @@
+# -*- mode:python; coding:utf-8 -*-
+
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests of bulk ingest of archives and ndjson."""
+import io
+import tarfile
+import zipfile
+
+from bulk import BulkError, read_documents
+
+from conftest import authorize
+
+import documents
+
+from ingest import validate_batch
+
+import pytest
+
+
+def zip_archive(members):
+    """Get zip archive of (name, contents) members."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, contents in members:
+            archive.writestr(name, contents)
+    return buffer.getvalue()
+
+
+def tar_archive(members):
+    """Get gzipped tar archive of (name, contents) members."""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+        for name, contents in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(contents)
+            archive.addfile(info, io.BytesIO(contents))
+    return buffer.getvalue()
+
+
+members = [('a.json', b'{"a": 1}'), ('notes.txt', b'skipped'), ('dir/b.json', b'{"b": 2}')]
+
+
+@pytest.mark.parametrize('archive', [zip_archive, tar_archive])
+def test_read_archive(archive):
+    """Json members of archives are read, others skipped."""
+    assert read_documents(io.BytesIO(archive(members)), 1024) == [members[0], members[2]]
+
+
+def test_read_ndjson():
+    """Each non blank line of ndjson is a document."""
+    contents = b'{"a": 1}\n\n{"b": 2}\n'
+    assert read_documents(io.BytesIO(contents), 1024) == [('line 1', b'{"a": 1}\n'), ('line 3', b'{"b": 2}\n')]
+
+
+@pytest.mark.parametrize('archive', [zip_archive, tar_archive])
+def test_read_archive_member_too_large(archive):
+    """A member over max size fails the whole archive."""
+    with pytest.raises(BulkError, match='exceeds 4 bytes'):
+        read_documents(io.BytesIO(archive(members)), 4)
+
+
+def test_validate_batch():
+    """Documents of any model type are validated, each with its own result."""
+    catalog = documents.catalog()
+    profile = documents.profile()
+    batch = [
+        ('catalog', documents.dumps(catalog)),
+        ('profile', documents.dumps(profile)),
+        ('unknown', b'{"unknown": {}}'),
+        ('broken', b'{'),
+    ]
+    results = validate_batch(batch)
+    assert [(name, oscal_path, error) for name, oscal_path, _, error in results[:2]] == [
+        ('catalog', 'catalog', None),
+        ('profile', 'profile', None),
+    ]
+    assert [validated.uuid for _, _, validated, _ in results[:2]] == [documents.oid(catalog), documents.oid(profile)]
+    assert results[2][3] == 'not a known OSCAL model'
+    assert results[3][3].startswith('not valid json')
+
+
+def test_add_bulk(client):
+    """Bulk add reports each document, adding the valid ones and rejecting duplicates."""
+    catalog = documents.catalog()
+    profile = documents.profile()
+    lines = [documents.dumps(catalog), documents.dumps(profile), b'{"catalog": {}}', documents.dumps(catalog)]
+    ndjson = b'\n'.join(lines)
+    response = client.post('/bulk', files={'documents': ndjson}, headers=authorize)
+    assert response.status_code == 200
+    statuses = [(item['name'], item['type'], item['status']) for item in response.json()]
+    assert statuses == [
+        ('line 1', 'catalog', 'added'),
+        ('line 2', 'profile', 'added'),
+        ('line 3', 'catalog', 'invalid'),
+        ('line 4', 'catalog', 'rejected'),
+    ]
+    response = client.get('/profiles/profile-id', params={'profile_id': documents.oid(profile)})
+    assert response.json() == profile
@@ -0,0 +1,90 @@
+# -*- mode:python; coding:utf-8 -*-
+
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests of payload compression, with and without trained dictionaries."""
+import codec
+
+from conftest import logger
+
+import documents
+
+import pytest
+
+from storage import SqliteEngine
+
+available = [None] + [name for name in codec.codecs if name != 'zstd' or codec.zstandard is not None]
+
+
+def corpus(count):
+    """Get payload bytes of count similar catalogs."""
+    return [documents.dumps(documents.catalog(title=f'Catalog {n}')) for n in range(count)]
+
+
+@pytest.mark.parametrize('name', available)
+def test_round_trip(name):
+    """Payloads decompress to what was compressed, whole or in chunks of at most chunk size."""
+    payload = corpus(1)[0]
+    data = codec.compress(payload.decode('utf-8'), name, 6)
+    assert codec.decompress(data, name) == payload.decode('utf-8')
+    chunks = list(codec.decompress_chunks(data, name, chunk_size=64))
+    assert b''.join(chunks) == payload
+    assert max(len(chunk) for chunk in chunks) <= 64
+
+
+@pytest.mark.parametrize('name', [name for name in available if name is not None])
+def test_dictionary(name):
+    """A dictionary trained on similar documents compresses better, and is needed to decompress."""
+    samples = corpus(40)
+    dictionary = codec.train(name, samples[1:], 4096)
+    assert dictionary
+    payload = samples[0]
+    plain = codec.compress(payload, name, 6)
+    trained = codec.compress(payload, name, 6, dictionary)
+    assert len(trained) < len(plain)
+    assert codec.decompress(trained, name, dictionary) == payload.decode('utf-8')
+
+
+def test_check():
+    """Unknown codecs are refused."""
+    codec.check(None)
+    with pytest.raises(codec.CodecError, match='unknown codec'):
+        codec.check('lz4')
+    with pytest.raises(codec.CodecError):
+        codec.train(None, [], 1024)
+
+
+def test_rows_keep_their_codec(open_db, config):
+    """Rows stored before a change of codec or dictionary remain readable."""
+    config(db_compression='none')
+    engine = SqliteEngine(logger)
+    engine.init_table('CATALOGS')
+    engine.add('CATALOGS', 'plain', '{"plain": 1}')
+    engine.close()
+    config(db_compression='zlib')
+    engine = SqliteEngine(logger)
+    engine.init_table('CATALOGS')
+    engine.add('CATALOGS', 'zlib', '{"zlib": 1}')
+    for n, payload in enumerate(corpus(20)):
+        engine.add('CATALOGS', f'doc-{n}', payload)
+    trained = engine.train_dictionary()
+    assert (trained['codec'], trained['samples']) == ('zlib', 22)
+    engine.add('CATALOGS', 'trained', '{"trained": 1}')
+    rows = {oid: (codec_tag, dictionary) for oid, codec_tag, dictionary in engine.con.execute(
+        'SELECT id, codec, dictionary FROM CATALOGS;'
+    )}
+    assert (rows['plain'], rows['zlib'], rows['trained']) == ((None, None), ('zlib', None), ('zlib', trained['id']))
+    for oid in ['plain', 'zlib', 'trained']:
+        assert engine.get('CATALOGS', oid) == f'{{"{oid}": 1}}'
+    engine.close()
@@ -0,0 +1,87 @@
+# -*- mode:python; coding:utf-8 -*-
+
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests of the per-thread sqlite connections."""
+import sqlite3
+import threading
+
+import pytest
+
+from storage import Connections
+
+
+@pytest.fixture
+def connections(tmp_path):
+    """Get connections of a database of the test."""
+    connections = Connections(str(tmp_path / 'oscal.sqlite'))
+    yield connections
+    connections.close()
+
+
+def in_thread(func):
+    """Get result of func run in a thread of its own."""
+    results = []
+    thread = threading.Thread(target=lambda: results.append(func()))
+    thread.start()
+    thread.join()
+    return results[0]
+
+
+def test_connection_per_thread(connections):
+    """Each thread gets a connection of its own, the same on each use."""
+    con = connections.get()
+    assert connections.get() is con
+    assert in_thread(connections.get) is not con
+    assert len(connections.connections) == 2
+
+
+def test_pragmas(connections, config):
+    """Connections run in WAL mode, tuned by app.yaml."""
+    config(db_synchronous='off', db_cache_size=-1024)
+    con = connections.get()
+    assert con.execute('PRAGMA journal_mode;').fetchone() == ('wal', )
+    assert con.execute('PRAGMA synchronous;').fetchone() == (0, )
+    assert con.execute('PRAGMA cache_size;').fetchone() == (-1024, )
+
+
+def test_read_while_writing(connections):
+    """A reader proceeds while a writer holds an open write transaction."""
+    con = connections.get()
+    con.execute('CREATE TABLE T (id TEXT);')
+    con.execute("INSERT INTO T VALUES ('a');")
+    con.commit()
+    con.execute("INSERT INTO T VALUES ('b');")
+    assert con.in_transaction
+    assert in_thread(lambda: connections.get().execute('SELECT id FROM T;').fetchall()) == [('a', )]
+    con.commit()
+
+
+def test_reset(connections):
+    """After a reset each thread reopens its connection on its next use."""
+    con = connections.get()
+    connections.reset()
+    assert connections.get() is not con
+    with pytest.raises(sqlite3.ProgrammingError):
+        con.execute('SELECT 1;')
+
+
+def test_close(connections):
+    """Close closes the connections of all threads."""
+    cons = [connections.get(), in_thread(connections.get)]
+    connections.close()
+    assert connections.connections == []
+    for con in cons:
+        with pytest.raises(sqlite3.ProgrammingError):
+            con.execute('SELECT 1;')
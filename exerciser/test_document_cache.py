@@ -0,0 +1,81 @@
+# -*- mode:python; coding:utf-8 -*-
+
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests of the cache of parsed stored documents."""
+from cache import DocumentCache
+
+
+def test_get_put():
+    """Documents put are got by key, counting hits and misses."""
+    cache = DocumentCache(4, 1024)
+    assert cache.get('a') is None
+    cache.put('a', {'a': 1}, 10, cache.generation)
+    assert cache.get('a') == {'a': 1}
+    assert cache.stats() == {
+        'hits': 1,
+        'misses': 1,
+        'evictions': 0,
+        'entries': 1,
+        'bytes': 10,
+        'max-entries': 4,
+        'max-bytes': 1024,
+    }
+
+
+def test_evict_least_recently_used():
+    """Beyond max entries or max bytes the least recently used documents are evicted."""
+    cache = DocumentCache(2, 100)
+    for key in ['a', 'b']:
+        cache.put(key, key, 10, cache.generation)
+    cache.get('a')
+    cache.put('c', 'c', 10, cache.generation)
+    assert [cache.get(key) for key in ['a', 'b', 'c']] == ['a', None, 'c']
+    cache.put('d', 'd', 85, cache.generation)
+    assert [cache.get(key) for key in ['a', 'c', 'd']] == [None, 'c', 'd']
+    assert cache.stats()['evictions'] == 2
+    assert cache.stats()['bytes'] == 95
+
+
+def test_too_large_not_cached():
+    """Documents over max bytes are not cached, nor any with max entries 0."""
+    cache = DocumentCache(2, 100)
+    cache.put('a', 'a', 101, cache.generation)
+    assert cache.get('a') is None
+    cache = DocumentCache(0, 100)
+    cache.put('a', 'a', 1, cache.generation)
+    assert cache.get('a') is None
+
+
+def test_replace_entry():
+    """Putting a cached key again replaces its entry and its bytes."""
+    cache = DocumentCache(2, 100)
+    cache.put('a', 'old', 10, cache.generation)
+    cache.put('a', 'new', 30, cache.generation)
+    assert cache.get('a') == 'new'
+    assert cache.stats()['bytes'] == 30
+
+
+def test_invalidate():
+    """Invalidated documents are dropped, and documents read before an invalidation are not cached after it."""
+    cache = DocumentCache(4, 100)
+    cache.put('a', 'a', 10, cache.generation)
+    read_at = cache.generation
+    cache.invalidate(['a'])
+    assert cache.get('a') is None
+    assert cache.stats()['bytes'] == 0
+    cache.put('b', 'stale', 10, read_at)
+    assert cache.get('b') is None
+    cache.put('b', 'b', 10, cache.generation)
+    assert cache.get('b') == 'b'
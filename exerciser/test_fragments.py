@@ -0,0 +1,124 @@
+# -*- mode:python; coding:utf-8 -*-
+
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests of documents split into fragments stored once per content."""
+import documents
+
+import fragment
+
+import pytest
+
+from registry import models
+
+tname = 'CATALOGS'
+paths = ['*.back-matter.resources', 'catalog.metadata']
+
+
+def serialized(title='Test catalog', resources=3):
+    """Get catalog with shared back matter resources, serialized by its model as documents are stored."""
+    obj = documents.catalog(title, resources=resources)
+    obj['catalog']['metadata']['remarks'] = 'Ünïcode – and "quotes" / slashes'
+    model = models['catalog']
+    return model.serialize(model.obm_type.model_validate(obj['catalog']))
+
+
+@pytest.fixture
+def split_engine(open_engine, config):
+    """Get sqlite engine splitting back matter resources and catalog metadata into fragments."""
+    config(db_fragment_paths=paths, db_fragment_min_size=64)
+    return open_engine('sqlite')
+
+
+def test_split_assemble():
+    """Splicing the fragments back reproduces the serialized document byte for byte."""
+    payload = serialized()
+    text, size, fragments = fragment.split('catalog', payload, fragment.parse_paths(paths), 64)
+    assert len(fragments) == 4
+    assert len(text) < len(payload)
+    assert size == len(payload.encode('utf-8'))
+    assert fragment.assemble(text, fragments) == payload
+
+
+def test_small_values_stay():
+    """Values serializing to less than min size stay in place, and nothing split gives None."""
+    payload = serialized()
+    assert fragment.split('catalog', payload, fragment.parse_paths(paths), 1 << 20) is None
+    assert fragment.split('catalog', payload, fragment.parse_paths(['profile.imports']), 0) is None
+
+
+def test_missing_fragment():
+    """A reference to a fragment not given is an error."""
+    text, _, fragments = fragment.split('catalog', serialized(), fragment.parse_paths(paths), 64)
+    fragments.popitem()
+    with pytest.raises(fragment.FragmentError, match='not found'):
+        fragment.assemble(text, fragments)
+
+
+@pytest.mark.parametrize('path', ['catalog', 'catalog.', 'catalog..title'])
+def test_invalid_path(path):
+    """Paths without element, or with an empty one, are refused."""
+    with pytest.raises(fragment.FragmentError):
+        fragment.parse_paths([path])
+
+
+def test_engine_reassembles(split_engine):
+    """Documents split by the engine read back byte for byte, by get and by stream."""
+    payload = serialized()
+    split_engine.add(tname, 'a', payload)
+    assert split_engine.get(tname, 'a') == payload
+    size, stream = split_engine.get_stream(tname, 'a', 256)
+    try:
+        assert b''.join(stream) == payload.encode('utf-8')
+    finally:
+        stream.close()
+    assert size == len(payload.encode('utf-8'))
+
+
+def counts(engine):
+    """Get (fragments, references) of the fragments table of engine."""
+    stats = engine.fragment_stats()
+    return stats['fragments'], stats['references']
+
+
+def test_reference_counts(split_engine):
+    """Fragments are stored once however many documents refer to them, and deleted with the last of them."""
+    split_engine.add(tname, 'a', serialized('A'))
+    assert counts(split_engine) == (4, 4)
+    split_engine.add(tname, 'b', serialized('B'))
+    # the resources are shared, the metadata of each differs
+    assert counts(split_engine) == (5, 8)
+    assert split_engine.fragment_stats()['deduplicated-bytes'] > 0
+    split_engine.replace(tname, 'b', serialized('B', resources=1))
+    assert counts(split_engine) == (5, 6)
+    split_engine.upsert(tname, 'a', serialized('A', resources=0))
+    assert counts(split_engine) == (3, 3)
+    split_engine.delete(tname, 'a')
+    split_engine.delete(tname, 'b')
+    assert counts(split_engine) == (0, 0)
+
+
+def test_unsplit_rows_readable(open_engine, config):
+    """Documents stored before the paths were configured remain readable, and are split when next written."""
+    engine = open_engine('sqlite')
+    payload = serialized()
+    engine.add(tname, 'a', payload)
+    engine.close()
+    config(db_fragment_paths=paths, db_fragment_min_size=64)
+    engine = open_engine('sqlite')
+    assert engine.get(tname, 'a') == payload
+    assert counts(engine) == (0, 0)
+    engine.replace(tname, 'a', payload)
+    assert counts(engine) == (4, 4)
+    assert engine.get(tname, 'a') == payload
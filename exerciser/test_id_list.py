@@ -0,0 +1,101 @@
+# -*- mode:python; coding:utf-8 -*-
+
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests of keyset-paginated id lists."""
+from conftest import authorize
+
+import documents
+
+from fastapi import HTTPException
+
+import pytest
+
+from storage import encode_cursor
+
+tname = 'CATALOGS'
+
+
+def pages(engine, limit, order='id'):
+    """Get all pages of ids of limit, following the cursors."""
+    result = []
+    cursor = None
+    while True:
+        ids, cursor = engine.get_id_list(tname, limit, cursor, order)
+        result.append(ids)
+        if cursor is None:
+            return result
+
+
+def test_pages_by_id(engine):
+    """Pages follow on by id, the last without a next cursor."""
+    for oid in ['c', 'a', 'e', 'b', 'd']:
+        engine.add(tname, oid, '{}')
+    assert pages(engine, 2) == [['a', 'b'], ['c', 'd'], ['e']]
+    assert pages(engine, 5) == [['a', 'b', 'c', 'd', 'e']]
+    assert engine.get_id_list(tname) == (['a', 'b', 'c', 'd', 'e'], None)
+
+
+@pytest.mark.parametrize('name', ['memory', 'sqlite'])
+def test_pages_by_inserted(open_engine, name):
+    """Pages follow on by insertion, unaffected by documents deleted meanwhile."""
+    engine = open_engine(name)
+    for oid in ['c', 'a', 'e', 'b']:
+        engine.add(tname, oid, '{}')
+    ids, cursor = engine.get_id_list(tname, 2, None, 'inserted')
+    assert ids == ['c', 'a']
+    engine.delete(tname, 'e')
+    engine.add(tname, 'd', '{}')
+    assert engine.get_id_list(tname, 2, cursor, 'inserted') == (['b', 'd'], None)
+
+
+def test_sqlite_reads_ids_only(open_engine):
+    """The sqlite engine lists ids without reading payloads."""
+    engine = open_engine('sqlite')
+    engine.add(tname, 'a', '{}')
+    statements = []
+    engine.con.set_trace_callback(statements.append)
+    engine.get_id_list(tname, 2)
+    engine.get_id_list(tname, 2, None, 'inserted')
+    engine.con.set_trace_callback(None)
+    assert statements
+    assert not any('payload' in statement for statement in statements)
+
+
+def test_filesystem_by_id_only(open_engine):
+    """The filesystem engine does not record insertion."""
+    with pytest.raises(NotImplementedError):
+        open_engine('filesystem').get_id_list(tname, 2, None, 'inserted')
+
+
+def test_invalid_cursor(engine):
+    """Cursors that do not decode, or were made for another order, are refused."""
+    for cursor in ['!', encode_cursor('inserted', [1, 'a'])]:
+        with pytest.raises(HTTPException) as e:
+            engine.get_id_list(tname, 2, cursor)
+        assert e.value.status_code == 400
+
+
+def test_id_list_endpoint(client, config):
+    """The id-list endpoint returns a json page of ids with the next cursor, limit capped by the maximum."""
+    config(id_list_max_limit=2)
+    for _ in range(3):
+        client.post('/profiles', files={'profile': documents.dumps(documents.profile())}, headers=authorize)
+    page = client.get('/profiles/id-list', params={'limit': 10, 'order': 'inserted'}).json()
+    assert len(page['ids']) == 2
+    assert page['next-cursor'] is not None
+    page = client.get('/profiles/id-list', params={'cursor': page['next-cursor'], 'order': 'inserted'}).json()
+    assert len(page['ids']) >= 1
+    assert client.get('/profiles/id-list', params={'limit': 0}).status_code == 422
+    assert client.get('/profiles/id-list', params={'cursor': '!'}).status_code == 400
@@ -0,0 +1,80 @@
+# -*- mode:python; coding:utf-8 -*-
+
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests of in memory validation of uploads."""
+import json
+
+from conftest import authorize
+
+import documents
+
+from ingest import IngestError, oscal_read_bytes, validate
+
+import pytest
+
+
+def test_validate_in_memory():
+    """Validate returns the uuid and the serialized document, without a file."""
+    obj = documents.catalog()
+    validated = validate('catalog', documents.dumps(obj))
+    assert validated.uuid == documents.oid(obj)
+    assert json.loads(validated.payload) == obj
+
+
+def test_validate_model_type():
+    """Contents are read as the OSCAL model type."""
+    oscal = oscal_read_bytes('catalog', documents.dumps(documents.catalog(title='Read')))
+    assert type(oscal).__name__ == 'Catalog'
+    assert oscal.metadata.title == 'Read'
+
+
+@pytest.mark.parametrize(
+    'contents, message',
+    [
+        (b'{"catalog": ', 'is not valid json'),
+        (documents.dumps({'profile': {}}), 'is not the single top level key'),
+        (documents.dumps({'catalog': {'uuid': 'x'}}), 'failed validation'),
+    ],
+)
+def test_validate_invalid(contents, message):
+    """Invalid contents raise IngestError."""
+    with pytest.raises(IngestError, match=message):
+        validate('catalog', contents)
+
+
+def test_error_of_intended_union_member():
+    """Validation errors inside a union are those of the member the value was meant as, pointing into the document."""
+    obj = documents.catalog()
+    obj['catalog']['groups'][1]['bogus'] = 1
+    with pytest.raises(IngestError, match='at /catalog/groups/1/bogus: Extra inputs are not permitted'):
+        validate('catalog', documents.dumps(obj))
+
+
+def test_add_and_get(client):
+    """An uploaded document is validated, stored and read back."""
+    obj = documents.catalog()
+    response = client.post('/catalogs', files={'catalog': documents.dumps(obj)}, headers=authorize)
+    assert response.status_code == 200
+    assert response.json() == documents.oid(obj)
+    response = client.get('/catalogs/catalog-id', params={'catalog_id': documents.oid(obj)})
+    assert response.status_code == 200
+    assert response.json() == obj
+
+
+def test_add_invalid(client):
+    """An invalid upload is rejected."""
+    response = client.post('/catalogs', files={'catalog': b'{"catalog": {}}'}, headers=authorize)
+    assert response.status_code == 400
+    assert response.json()['detail'].startswith('Invalid catalog in file')
@@ -0,0 +1,164 @@
+# -*- mode:python; coding:utf-8 -*-
+
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests of background ingest jobs."""
+import asyncio
+import sqlite3
+import time
+
+from conftest import authorize, logger
+
+from db import AsyncDb
+
+import documents
+
+from fastapi import HTTPException
+
+from jobs import Jobs
+
+import pytest
+
+
+def wait_job(client, job_id, timeout=10):
+    """Wait for job to finish, returning its status."""
+    deadline = time.time() + timeout
+    while True:
+        status = client.get('/jobs/job-id', params={'job_id': job_id}).json()
+        if status['status'] in ['done', 'failed'] or time.time() > deadline:
+            return status
+        time.sleep(0.05)
+
+
+def test_background_add(client):
+    """A background add is accepted with 202 and the job status location, then stored."""
+    obj = documents.catalog()
+    params = {'background': True}
+    response = client.post('/catalogs', params=params, files={'catalog': documents.dumps(obj)}, headers=authorize)
+    assert response.status_code == 202
+    job_id = response.json()
+    assert response.headers['Location'] == f'/jobs/job-id?job_id={job_id}'
+    status = wait_job(client, job_id)
+    assert (status['status'], status['type'], status['uuid']) == ('done', 'catalog', documents.oid(obj))
+    assert client.get('/catalogs/catalog-id', params={'catalog_id': documents.oid(obj)}).json() == obj
+
+
+def test_background_add_invalid(client):
+    """A background add of an invalid document fails its job with the reason."""
+    params = {'background': True}
+    response = client.post('/catalogs', params=params, files={'catalog': b'{"catalog": {}}'}, headers=authorize)
+    assert response.status_code == 202
+    status = wait_job(client, response.json())
+    assert status['status'] == 'failed'
+    assert status['error'].startswith('Invalid catalog in file')
+
+
+def test_unknown_job(client):
+    """An unknown job is not found."""
+    assert client.get('/jobs/job-id', params={'job_id': 'unknown'}).status_code == 404
+
+
+def test_requeue_expired(db):
+    """Jobs whose lease expired are queued again, and claimed once, jobs of live leases are left to their owner."""
+    db.add_job('a', 'catalog', 'digest', b'{}')
+    db.add_job('b', 'catalog', 'digest', b'{}')
+    assert db.claim_job('stopped', -1) == ('a', 'catalog', 'digest', b'{}')
+    assert db.claim_job('live', 60)[0] == 'b'
+    assert db.claim_job('live', 60) is None
+    assert db.get_job('a')['status'] == 'validating'
+    assert db.requeue_jobs() == 1
+    assert db.claim_job('live', 60)[0] == 'a'
+    assert db.get_job('b')['status'] == 'validating'
+
+
+def test_lease_owner(db):
+    """Only the owner of a lease updates its job, the lease renewed while it runs, and lost once expired."""
+    db.add_job('a', 'catalog', 'digest', b'{}')
+    db.claim_job('first', -1)
+    assert db.renew_jobs('other', 60) == 0
+    assert db.renew_jobs('first', 60) == 1
+    assert db.requeue_jobs() == 0
+    db.renew_jobs('first', -1)
+    db.requeue_jobs()
+    db.claim_job('second', 60)
+    assert not db.update_job('a', 'done', uuid='uuid', owner='first')
+    assert db.update_job('a', 'storing', uuid='uuid', owner='second')
+    assert db.get_job('a')['status'] == 'storing'
+
+
+def test_jobs_table_gets_leases(open_db):
+    """A jobs table created before leases gets owner and lease columns, its running jobs queued again."""
+    con = sqlite3.connect('oscal.sqlite')
+    query = (
+        'CREATE TABLE JOBS (id TEXT NOT NULL PRIMARY KEY, oscal_path TEXT, digest TEXT, '
+        'payload BLOB, status TEXT, uuid TEXT, error TEXT, created REAL, updated REAL);'
+    )
+    with con:
+        con.execute(query)
+        con.execute("INSERT INTO JOBS (id, status, created) VALUES ('a', 'validating', 0);")
+    con.close()
+    db = open_db()
+    assert db.requeue_jobs() == 1
+    assert db.claim_job('owner', 60)[0] == 'a'
+
+
+def run_job(process):
+    """Submit a job to jobs processing it with process, returning its status once finished."""
+
+    async def run():
+        db = AsyncDb(logger, 2, 8)
+        await db.connect()
+        jobs = Jobs(logger, db, process, 1, 0.01, 60)
+        await jobs.start()
+        try:
+            job_id = await jobs.submit('catalog', b'{}', 'digest')
+            for _ in range(500):
+                status = await db.get_job(job_id)
+                if status['status'] in ['done', 'failed']:
+                    return status
+                await asyncio.sleep(0.01)
+            return status
+        finally:
+            await jobs.stop()
+            await db.close()
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize(
+    'status_code, expected',
+    [(503, ('done', 'uuid', None)), (400, ('failed', None, 'invalid'))],
+)
+def test_busy_queued_again(tmp_path, monkeypatch, status_code, expected):
+    """A job refused as workers are busy is queued again and processed later, an invalid one fails."""
+    monkeypatch.chdir(tmp_path)
+    calls = []
+
+    async def process(job_id, owner, oscal_path, contents, digest):
+        calls.append(owner)
+        if len(calls) == 1:
+            raise HTTPException(status_code=status_code, detail='invalid')
+        return 'uuid'
+
+    status = run_job(process)
+    assert (status['status'], status['uuid'], status['error']) == expected
+    assert len(calls) == (2 if status_code == 503 else 1)
+
+
+def test_finished_job_drops_upload(db):
+    """The upload of a finished job is dropped, its status kept."""
+    db.add_job('a', 'catalog', 'digest', b'{}')
+    db.update_job('a', 'done', uuid='uuid')
+    assert db.con.execute('SELECT payload FROM JOBS WHERE id=?;', ['a']).fetchone() == (None, )
+    assert db.get_job('a')['uuid'] == 'uuid'
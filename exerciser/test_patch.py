@@ -0,0 +1,101 @@
+# -*- mode:python; coding:utf-8 -*-
+
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests of json patches."""
+import copy
+
+import documents
+
+import patch
+
+import pytest
+
+pairs = [
+    ({'a': 1, 'b': [1, 2, 3]}, {'a': 1, 'b': [1, 4, 3], 'c': None}),
+    ({'a': [1, 2, 3, 4]}, {'a': [1, 4]}),
+    ({'a': [1]}, {'a': [0, 1, 2]}),
+    ({'a/b': {'c~d': True}}, {'a/b': {'c~d': 1}}),
+    ({'a': 1.0}, {'a': 1}),
+    ([1, {'a': 1}], {'a': [1]}),
+    ('a', 'b'),
+]
+
+
+@pytest.mark.parametrize('old, new', pairs)
+def test_diff_apply(old, new):
+    """The diff of two values turns the first into the second, leaving it unchanged unless in place."""
+    ops = patch.diff(old, new)
+    kept = copy.deepcopy(old)
+    assert patch.equal(patch.apply(old, ops), new)
+    assert patch.equal(old, kept)
+
+
+def test_diff_of_edit_is_small():
+    """The diff of an edit to a large document is about the size of the edit."""
+    old = documents.catalog(groups=('ac', 'au', 'cm', 'ia'), controls=20)
+    new = copy.deepcopy(old)
+    new['catalog']['groups'][2]['controls'][5]['title'] = 'Edited'
+    assert patch.diff(old, new) == [{'op': 'replace', 'path': '/catalog/groups/2/controls/5/title', 'value': 'Edited'}]
+    assert patch.diff(old, old) == []
+
+
+def test_equal():
+    """Json equality tells booleans from numbers, and integers from floats."""
+    assert patch.equal({'a': [1, 'x']}, {'a': [1, 'x']})
+    assert not patch.equal(True, 1)
+    assert not patch.equal(1.0, 1)
+    assert not patch.equal({'a': 1}, {'b': 1})
+
+
+@pytest.mark.parametrize(
+    'ops, result',
+    [
+        ([{'op': 'add', 'path': '/b/-', 'value': 3}], {'a': {'x': 1}, 'b': [1, 2, 3]}),
+        ([{'op': 'add', 'path': '/b/0', 'value': 0}], {'a': {'x': 1}, 'b': [0, 1, 2]}),
+        ([{'op': 'remove', 'path': '/a/x'}], {'a': {}, 'b': [1, 2]}),
+        ([{'op': 'replace', 'path': '/b/1', 'value': 5}], {'a': {'x': 1}, 'b': [1, 5]}),
+        ([{'op': 'replace', 'path': '', 'value': 5}], 5),
+        ([{'op': 'move', 'from': '/a/x', 'path': '/c'}], {'a': {}, 'b': [1, 2], 'c': 1}),
+        ([{'op': 'copy', 'from': '/b', 'path': '/a/y'}], {'a': {'x': 1, 'y': [1, 2]}, 'b': [1, 2]}),
+        ([{'op': 'test', 'path': '/a', 'value': {'x': 1}}], {'a': {'x': 1}, 'b': [1, 2]}),
+    ],
+)
+def test_apply(ops, result):
+    """Each RFC 6902 operation is applied."""
+    assert patch.apply({'a': {'x': 1}, 'b': [1, 2]}, ops) == result
+
+
+@pytest.mark.parametrize(
+    'ops, message',
+    [
+        ({'op': 'add'}, 'not an array'),
+        ([{'op': 'add', 'path': '/c'}], 'has no value'),
+        ([{'op': 'move', 'path': '/c'}], 'has no from'),
+        ([{'op': 'bogus', 'path': '/c'}], 'unknown operation'),
+        ([{'path': '/c'}], 'unknown operation'),
+        (['add'], 'invalid operation'),
+        ([{'op': 'remove', 'path': '/c'}], 'not found'),
+        ([{'op': 'remove', 'path': ''}], 'whole document'),
+        ([{'op': 'add', 'path': '/b/3', 'value': 1}], 'out of range'),
+        ([{'op': 'add', 'path': '/b/01', 'value': 1}], 'invalid array index'),
+        ([{'op': 'add', 'path': 'b', 'value': 1}], 'invalid pointer'),
+        ([{'op': 'move', 'from': '/a', 'path': '/a/x'}], 'into itself'),
+        ([{'op': 'test', 'path': '/b', 'value': [2, 1]}], 'failed'),
+    ],
+)
+def test_apply_error(ops, message):
+    """Invalid patches and operations failing on the document raise PatchError."""
+    with pytest.raises(patch.PatchError, match=message):
+        patch.apply({'a': {'x': 1}, 'b': [1, 2]}, ops)
@@ -0,0 +1,149 @@
+# -*- mode:python; coding:utf-8 -*-
+
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests of patching stored documents, validating the changed elements."""
+import json
+
+from conftest import authorize
+
+import documents
+
+import ingest
+from ingest import IngestError, validate, validate_patch, validation_root
+
+import pytest
+
+from registry import models
+
+
+def stored(obj):
+    """Get id and payload of OSCAL object as stored by add."""
+    validated = validate(next(iter(obj)), documents.dumps(obj))
+    return validated.uuid, validated.payload
+
+
+def validate_part(oscal_path, oid, payload, kind, body):
+    """Validate patch, failing if the whole document is validated."""
+
+    def fail(oscal_path, obj):
+        raise AssertionError('whole document validated')
+
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(ingest, 'oscal_read_obj', fail)
+        return validate_patch(oscal_path, oid, payload, kind, body)
+
+
+@pytest.mark.parametrize(
+    'oscal_path, tokens, root, type_name',
+    [
+        ('catalog', ['groups', '1', 'controls', '0', 'title'], ['groups', '1', 'controls', '0'], 'Control'),
+        ('catalog', ['groups', '1', 'title'], ['groups', '1'], 'Union'),
+        ('catalog', ['params', '0', 'label'], ['params', '0'], 'Union'),
+        ('catalog', ['metadata', 'title'], ['metadata'], 'Metadata'),
+        ('catalog', ['back-matter'], [], 'Catalog'),
+        ('profile', ['imports', '0', 'href'], ['imports', '0'], 'Union'),
+        ('profile', ['imports', '0', 'include-controls', '0', 'with-ids'], ['imports', '0', 'include-controls', '0'],
+         'SelectControl'),
+    ],
+)
+def test_validation_root(oscal_path, tokens, root, type_name):
+    """Changes are validated at their deepest containing element, through elements of a union of model types."""
+    found, obm_type = validation_root(models[oscal_path].obm_type, tokens)
+    assert found == root
+    assert getattr(obm_type, '__name__', type(obm_type).__name__) == type_name
+
+
+def test_json_patch_in_union():
+    """A json patch inside the groups of a catalog validates only their elements, storing what a replace would."""
+    obj = documents.catalog(controls=3)
+    oid, payload = stored(obj)
+    ops = [
+        {'op': 'replace', 'path': '/catalog/groups/1/controls/2/title', 'value': 'Patched'},
+        {'op': 'add', 'path': '/catalog/groups/0/props', 'value': [{'name': 'label', 'value': 'AC'}]},
+    ]
+    validated = validate_part('catalog', oid, payload, 'json-patch', ops)
+    obj['catalog']['groups'][1]['controls'][2]['title'] = 'Patched'
+    obj['catalog']['groups'][0]['props'] = [{'name': 'label', 'value': 'AC'}]
+    assert validated.payload == stored(obj)[1]
+    assert validated.summary['counts'] == {'groups': 2, 'controls': 6, 'params': 6}
+
+
+def test_merge_patch_metadata():
+    """A merge patch of the metadata updates the summary, props and index columns of the document."""
+    obj = documents.profile('Profile', 'mnemonic')
+    oid, payload = stored(obj)
+    body = {'profile': {'metadata': {'title': 'Merged', 'props': [{'name': 'profile_mnemonic', 'value': 'merged'}]}}}
+    validated = validate_part('profile', oid, payload, 'merge-patch', body)
+    assert validated.summary['title'] == 'Merged'
+    assert validated.props == [('profile_mnemonic', 'merged', None)]
+    assert validated.columns == {'profile_mnemonic': 'merged'}
+    obj['profile']['metadata'].update(body['profile']['metadata'])
+    assert validated.payload == stored(obj)[1]
+
+
+def test_root_change_validates_whole(monkeypatch):
+    """A change of the root element validates the whole document."""
+    obj = documents.catalog(controls=1)
+    oid, payload = stored(obj)
+    validated = []
+    read_obj = ingest.oscal_read_obj
+    monkeypatch.setattr(ingest, 'oscal_read_obj', lambda *args: validated.append(args) or read_obj(*args))
+    ops = [{'op': 'add', 'path': '/catalog/back-matter', 'value': {'resources': [documents.resource(0)]}}]
+    result = validate_patch('catalog', oid, payload, 'json-patch', ops)
+    assert len(validated) == 1
+    assert json.loads(result.payload)['catalog']['back-matter']['resources'][0]['title'] == 'Reference 0'
+
+
+@pytest.mark.parametrize(
+    'ops, message',
+    [
+        ([{'op': 'add', 'path': '/catalog/groups/1/bogus', 'value': 1}],
+         'failed validation at /catalog/groups/1/bogus: Extra inputs are not permitted'),
+        ([{'op': 'replace', 'path': '/catalog/groups/0/controls/0/id', 'value': '1 bad'}],
+         'failed validation at /catalog/groups/0/controls/0/id: String should match pattern'),
+        ([{'op': 'remove', 'path': '/catalog/groups/0/title'}], 'failed validation at /catalog/groups/0/title'),
+        ([{'op': 'replace', 'path': '/catalog/uuid', 'value': 'x'}], 'changes uuid'),
+        ([{'op': 'replace', 'path': '', 'value': {'profile': {}}}], 'not the single top level key'),
+        ([{'op': 'remove', 'path': '/catalog/nothing'}], 'patch failed'),
+    ],
+)
+def test_invalid_patch(ops, message):
+    """Patches making the document invalid are refused, pointing at the invalid value."""
+    oid, payload = stored(documents.catalog(controls=1))
+    with pytest.raises(IngestError, match=message):
+        validate_patch('catalog', oid, payload, 'json-patch', ops)
+
+
+def test_patch_endpoint(client):
+    """PATCH applies json patch and merge patch bodies to the stored document."""
+    obj = documents.catalog(controls=1)
+    oid = documents.oid(obj)
+    client.post('/catalogs', files={'catalog': documents.dumps(obj)}, headers=authorize)
+    params = {'catalog_id': oid}
+    ops = [{'op': 'replace', 'path': '/catalog/groups/0/title', 'value': 'Patched'}]
+    headers = {**authorize, 'Content-Type': 'application/json-patch+json'}
+    assert client.patch('/catalogs/catalog-id', params=params, content=json.dumps(ops), headers=headers).json() == oid
+    body = {'catalog': {'metadata': {'title': 'Merged'}}}
+    headers = {**authorize, 'Content-Type': 'application/merge-patch+json'}
+    client.patch('/catalogs/catalog-id', params=params, content=json.dumps(body), headers=headers)
+    patched = client.get('/catalogs/catalog-id', params=params).json()
+    assert (patched['catalog']['groups'][0]['title'], patched['catalog']['metadata']['title']) == ('Patched', 'Merged')
+    headers = {**authorize, 'Content-Type': 'application/json'}
+    assert client.patch('/catalogs/catalog-id', params=params, content='[]', headers=headers).status_code == 415
+    headers = {**authorize, 'Content-Type': 'application/json-patch+json'}
+    bad = [{'op': 'add', 'path': '/catalog/bogus', 'value': 1}]
+    assert client.patch('/catalogs/catalog-id', params=params, content=json.dumps(bad), headers=headers).status_code == 400
+    params = {'catalog_id': 'missing'}
+    assert client.patch('/catalogs/catalog-id', params=params, content='[]', headers=headers).status_code == 404
@@ -0,0 +1,100 @@
+# -*- mode:python; coding:utf-8 -*-
+
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests of projections of documents to the values at a path."""
+import json
+
+from conftest import authorize
+
+import documents
+
+from projection import ProjectionError, WILDCARD, parse_path, select
+
+import pytest
+
+
+@pytest.mark.parametrize(
+    'path, steps',
+    [
+        ('catalog', ['catalog']),
+        ('catalog.groups.*.controls.*.id', ['catalog', 'groups', WILDCARD, 'controls', WILDCARD, 'id']),
+        ('catalog.groups.0', ['catalog', 'groups', 0]),
+        ('$', []),
+        ('$.catalog.groups[*].controls[1].id', ['catalog', 'groups', WILDCARD, 'controls', 1, 'id']),
+        ("$.catalog['back-matter'][\"resources\"].*", ['catalog', 'back-matter', 'resources', WILDCARD]),
+    ],
+)
+def test_parse_path(path, steps):
+    """Element paths and JSONPaths of the supported subset parse to the same steps."""
+    assert parse_path(path, 'catalog') == steps
+
+
+@pytest.mark.parametrize(
+    'path, message',
+    [
+        ('profile.imports', 'does not start at catalog'),
+        ('catalog..groups', 'empty part'),
+        ('*.groups', 'starts with wildcard'),
+        ('$.catalog..id', 'unsupported JSONPath'),
+        ('$.catalog.groups[?(@.id)]', 'unsupported JSONPath'),
+    ],
+)
+def test_parse_path_error(path, message):
+    """Paths of another model type, empty parts and JSONPath beyond the subset are refused."""
+    with pytest.raises(ProjectionError, match=message):
+        parse_path(path, 'catalog')
+
+
+def test_select():
+    """Values at the steps are selected in document order, wildcards over arrays and objects."""
+    obj = documents.catalog(groups=('ac', 'au'), controls=2)
+    ids = ['ac-1', 'ac-2', 'au-1', 'au-2']
+    assert select(obj, ['catalog', 'groups', WILDCARD, 'controls', WILDCARD, 'id']) == ids
+    assert select(obj, ['catalog', 'groups', 1, 'id']) == ['au']
+    assert select(obj, ['catalog', 'metadata', WILDCARD])[0] == 'Test catalog'
+    assert select(obj, ['catalog', 'groups', 2]) == []
+    assert select(obj, ['catalog', 'missing', WILDCARD]) == []
+    assert select(obj, ['catalog', 'uuid', 0]) == []
+    assert select(obj, []) == [obj]
+
+
+def test_db_projection(open_db):
+    """Projections are read from the parsed document cached on first read, and invalidated by writes."""
+    db = open_db()
+    obj = documents.catalog(controls=1)
+    db.add('catalog', 'a', documents.dumps(obj).decode('utf-8'))
+    steps = ['catalog', 'groups', WILDCARD, 'id']
+    assert json.loads(db.get_projection('catalog', 'a', steps)) == ['ac', 'au']
+    assert json.loads(db.get_projection('catalog', 'a', steps)) == ['ac', 'au']
+    assert db.documents.stats()['hits'] == 1
+    obj['catalog']['groups'].pop()
+    db.replace('catalog', 'a', documents.dumps(obj).decode('utf-8'))
+    assert json.loads(db.get_projection('catalog', 'a', steps)) == ['ac']
+    assert db.get_projection('catalog', 'missing', steps) is None
+
+
+def test_projection_endpoint(client):
+    """GET with path returns the values at the path, refusing invalid paths with 400."""
+    obj = documents.catalog(controls=2)
+    client.post('/catalogs', files={'catalog': documents.dumps(obj)}, headers=authorize)
+    params = {'catalog_id': documents.oid(obj), 'path': '$.catalog.groups[*].controls[*].id'}
+    response = client.get('/catalogs/catalog-id', params=params)
+    assert response.json() == ['ac-1', 'ac-2', 'au-1', 'au-2']
+    params['path'] = 'catalog.metadata.title'
+    assert client.get('/catalogs/catalog-id', params=params).json() == ['Test catalog']
+    params['path'] = 'profile.imports'
+    assert client.get('/catalogs/catalog-id', params=params).status_code == 400
+    params = {'catalog_id': 'missing', 'path': 'catalog.uuid'}
+    assert client.get('/catalogs/catalog-id', params=params).status_code == 404
@@ -0,0 +1,109 @@
+# -*- mode:python; coding:utf-8 -*-
+
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests of the index of metadata props."""
+from conftest import authorize
+
+import documents
+
+from ingest import validate
+
+import storage
+
+tname = 'CATALOGS'
+
+props = [('marking', 'public', None), ('status', 'draft', 'https://example.com/ns')]
+
+
+def test_find_by_prop(engine):
+    """Documents are found by prop name and value, and namespace if given."""
+    engine.add(tname, 'a', '{}', props=props)
+    engine.add(tname, 'b', '{}', props=[('marking', 'public', 'https://example.com/ns')])
+    assert sorted(engine.find_by_prop(tname, 'marking', 'public')) == ['a', 'b']
+    assert engine.find_by_prop(tname, 'marking', 'public', 'https://example.com/ns') == ['b']
+    assert engine.find_by_prop(tname, 'status', 'draft') == ['a']
+    assert engine.find_by_prop(tname, 'status', 'final') == []
+
+
+def test_props_follow_writes(engine):
+    """Replace, upsert and delete keep the props of documents current."""
+    engine.add(tname, 'a', '{}', props=props)
+    engine.replace(tname, 'a', '{}', props=[('marking', 'private', None)])
+    assert engine.find_by_prop(tname, 'marking', 'public') == []
+    assert engine.find_by_prop(tname, 'marking', 'private') == ['a']
+    engine.upsert(tname, 'a', '{}', props=props)
+    assert engine.find_by_prop(tname, 'marking', 'private') == []
+    engine.delete(tname, 'a')
+    assert engine.find_by_prop(tname, 'marking', 'public') == []
+
+
+def test_backfill(open_engine):
+    """Documents stored before the props table existed are indexed when it is created."""
+    obj = documents.catalog(props=[{'name': 'marking', 'value': 'public'}])
+    engine = open_engine('sqlite')
+    engine.add(tname, 'a', documents.dumps(obj).decode('utf-8'))
+    engine.con.execute('DROP TABLE PROPS;')
+    engine.close()
+    assert open_engine('sqlite').find_by_prop(tname, 'marking', 'public') == ['a']
+
+
+def test_backfill_in_batches(open_engine, monkeypatch):
+    """The backfill reads the stored documents a batch at a time rather than all at once."""
+    monkeypatch.setattr(storage, 'backfill_batch_size', 2)
+    obj = documents.catalog(props=[{'name': 'marking', 'value': 'public'}])
+    engine = open_engine('sqlite')
+    oids = [f'doc-{n}' for n in range(5)]
+    for oid in oids:
+        engine.add(tname, oid, documents.dumps(obj).decode('utf-8'))
+    statements = []
+    engine.con.set_trace_callback(statements.append)
+    assert [row[0] for row in engine._stored_rows(tname)] == oids
+    engine.con.set_trace_callback(None)
+    assert len([statement for statement in statements if statement.startswith('SELECT')]) == 3
+    engine.con.execute('DROP TABLE PROPS;')
+    engine.close()
+    assert open_engine('sqlite').find_by_prop(tname, 'marking', 'public') == oids
+
+
+def test_ingest_extracts_props():
+    """Validation extracts the metadata props of the document."""
+    obj = documents.catalog(props=[{'name': 'marking', 'value': 'public', 'ns': 'https://example.com/ns'}])
+    assert validate('catalog', documents.dumps(obj)).props == [('marking', 'public', 'https://example.com/ns')]
+
+
+def test_search_props(client):
+    """Documents of any model type are searched by prop, or of one model type."""
+    catalog = documents.catalog(props=[{'name': 'search-props', 'value': 'yes'}])
+    profile = documents.profile(mnemonic='search-props')
+    profile['profile']['metadata']['props'].append({'name': 'search-props', 'value': 'yes'})
+    client.post('/catalogs', files={'catalog': documents.dumps(catalog)}, headers=authorize)
+    client.post('/profiles', files={'profile': documents.dumps(profile)}, headers=authorize)
+    params = {'name': 'search-props', 'value': 'yes'}
+    assert client.get('/props/search', params=params).json() == [
+        {'type': 'catalog', 'uuid': documents.oid(catalog)},
+        {'type': 'profile', 'uuid': documents.oid(profile)},
+    ]
+    response = client.get('/props/search', params={**params, 'model_type': 'profile'})
+    assert response.json() == [{'type': 'profile', 'uuid': documents.oid(profile)}]
+    assert client.get('/props/search', params={**params, 'model_type': 'unknown'}).status_code == 400
+
+
+def test_search_profiles(db):
+    """Profiles are searched by their mnemonic prop, through the index."""
+    for mnemonic in ['a', 'b']:
+        validated = validate('profile', documents.dumps(documents.profile(mnemonic=mnemonic)))
+        db.add('profile', validated.uuid, validated.payload, validated.columns, validated.props)
+    (payload, ) = db.search_profiles('b')
+    assert '"value":"b"' in payload.replace(' ', '')
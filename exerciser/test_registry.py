@@ -0,0 +1,70 @@
+# -*- mode:python; coding:utf-8 -*-
+
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests of the model registry driving endpoints and tables."""
+from conftest import authorize
+
+import documents
+
+import pytest
+
+from registry import count_elements, models
+
+
+def endpoint(oscal_path):
+    """Get (path, upload field, id parameter) of the document endpoints of model type."""
+    field = oscal_path.replace('-', '_')
+    return f'/{models[oscal_path].directory}', field, f'{field}_id'
+
+
+def test_registry():
+    """The registry holds each OSCAL model type once, each with a table of its own."""
+    assert len({model.table for model in models.values()}) == len(models) == 7
+    for oscal_path, model in models.items():
+        assert model.oscal_path == oscal_path
+        assert model.obm_type.__name__.lower() == oscal_path.replace('-', '')
+
+
+@pytest.mark.parametrize('oscal_path', list(models))
+def test_lifecycle(client, oscal_path):
+    """Each model type is added, listed, got, replaced and deleted through its endpoints."""
+    path, field, id_name = endpoint(oscal_path)
+    obj = documents.sample(oscal_path)
+    oid = documents.oid(obj)
+    response = client.post(path, files={field: documents.dumps(obj)}, headers=authorize)
+    assert response.status_code == 200
+    assert response.json() == oid
+    assert oid in client.get(f'{path}/id-list').json()['ids']
+    params = {id_name: oid}
+    assert client.get(f'{path}/{oscal_path}-id', params=params).json() == obj
+    next(iter(obj.values()))['metadata']['title'] = 'Replaced'
+    files = {field: documents.dumps(obj)}
+    response = client.put(f'{path}/{oscal_path}-id', params=params, files=files, headers=authorize)
+    assert response.status_code == 200
+    assert client.get(f'{path}/{oscal_path}-id', params=params).json() == obj
+    assert client.delete(f'{path}/{oscal_path}-id', params=params, headers=authorize).json() == oid
+    assert client.get(f'{path}/{oscal_path}-id', params=params).status_code == 404
+
+
+def test_wrong_model_type(client):
+    """A document of another model type is refused."""
+    response = client.post('/catalogs', files={'catalog': documents.dumps(documents.profile())}, headers=authorize)
+    assert response.status_code == 400
+
+
+def test_count_elements():
+    """Items of the named arrays are counted at any depth."""
+    obj = documents.catalog(groups=('ac', 'au', 'cm'), controls=2)
+    assert count_elements(obj, ['groups', 'controls', 'params']) == {'groups': 3, 'controls': 6, 'params': 6}
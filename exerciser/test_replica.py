@@ -0,0 +1,149 @@
+# -*- mode:python; coding:utf-8 -*-
+
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests of the read only replica of the sqlite engine."""
+import asyncio
+import os
+
+from conftest import logger
+
+from db import AsyncDb
+
+import documents
+
+from fastapi import HTTPException
+
+import pytest
+
+from registry import models
+
+
+@pytest.fixture
+def replica_db(open_db, config):
+    """Get opener of Db with a replica, refreshed after writes of the given number."""
+
+    def open_(writes=0):
+        config(db_replica_path='replica.sqlite', db_replica_interval=0, db_replica_writes=writes)
+        return open_db()
+
+    return open_
+
+
+def test_replica_is_snapshot(replica_db):
+    """The replica serves the documents of its snapshot until refreshed, while the primary serves the latest."""
+    db = replica_db()
+    payload = documents.dumps(documents.catalog()).decode('utf-8')
+    db.add('catalog', 'a', payload, summary=models['catalog'].summarize(payload))
+    assert db.get_id_list('catalog', replica=True)['ids'] == []
+    assert db.get_stream('catalog', 'a', 1024, replica=True) is None
+    db.refresh_replica()
+    assert db.get_id_list('catalog', replica=True)['ids'] == ['a']
+    size, chunks = db.get_stream('catalog', 'a', 1024, replica=True)
+    try:
+        assert b''.join(chunks) == payload.encode('utf-8')
+    finally:
+        chunks.close()
+    assert [item['id'] for item in db.list_summaries('catalog', replica=True)['summaries']] == ['a']
+    assert db.get_id_list('catalog')['ids'] == ['a']
+
+
+def test_replica_is_read_only(replica_db):
+    """The replica refuses writes."""
+    db = replica_db()
+    with pytest.raises(HTTPException):
+        db.replica.engine.add('CATALOGS', 'a', '{}')
+    assert db.get('catalog', 'a') is None
+    assert not os.path.exists('replica.sqlite.tmp')
+
+
+def test_open_stream_keeps_snapshot(replica_db):
+    """A stream of the replica opened before a refresh keeps reading the snapshot it opened."""
+    db = replica_db()
+    payload = documents.dumps(documents.catalog(controls=20)).decode('utf-8')
+    db.add('catalog', 'a', payload)
+    db.refresh_replica()
+    size, chunks = db.get_stream('catalog', 'a', 256, replica=True)
+    try:
+        first = next(chunks)
+        db.replace('catalog', 'a', '{"catalog": {}}')
+        db.refresh_replica()
+        assert first + b''.join(chunks) == payload.encode('utf-8')
+    finally:
+        chunks.close()
+    size, chunks = db.get_stream('catalog', 'a', 256, replica=True)
+    try:
+        assert b''.join(chunks) == b'{"catalog": {}}'
+    finally:
+        chunks.close()
+
+
+def test_due_after_writes(replica_db):
+    """A refresh is due once the configured number of writes was made since the snapshot."""
+    db = replica_db(writes=2)
+    db.add('catalog', 'a', '{"catalog": {}}')
+    assert not db.replica.due()
+    db.delete('catalog', 'a')
+    assert db.replica.due()
+    db.refresh_replica()
+    assert not db.replica.due()
+
+
+def test_age(replica_db):
+    """The age of the replica is that of its snapshot, and None when not reading from it."""
+    db = replica_db()
+    age = db.replica_age()
+    assert 0 <= age < 60
+    db.refresh_replica()
+    assert db.replica_age() <= age + 1
+    assert db.replica_age(replica=False) is None
+
+
+def test_no_replica_other_engine(open_db, config):
+    """Other engines serve replica reads from the primary, without an age."""
+    config(db_engine='memory', db_replica_path='replica.sqlite')
+    db = open_db()
+    db.add('catalog', 'a', '{"catalog": {}}')
+    assert db.replica is None
+    assert db.get_id_list('catalog', replica=True)['ids'] == ['a']
+    assert db.replica_age() is None
+
+
+def test_replicator(tmp_path, monkeypatch, config):
+    """The awaitable db refreshes the replica once writes make it due."""
+    monkeypatch.chdir(tmp_path)
+    config(db_replica_path='replica.sqlite', db_replica_interval=0, db_replica_writes=1)
+
+    async def run():
+        db = AsyncDb(logger, 2, 4)
+        await db.connect()
+        try:
+            await db.add('catalog', 'a', '{"catalog": {}}')
+            for _ in range(200):
+                ids = (await db.get_id_list('catalog', replica=True))['ids']
+                if ids:
+                    return ids
+                await asyncio.sleep(0.01)
+            return []
+        finally:
+            await db.close()
+
+    assert asyncio.run(run()) == ['a']
+
+
+def test_replica_header(client):
+    """Replica reads of an app without replica carry no age header."""
+    response = client.get('/catalogs/id-list', params={'replica': True})
+    assert response.status_code == 200
+    assert 'OXP-Replica-Age' not in response.headers
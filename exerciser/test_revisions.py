@@ -0,0 +1,165 @@
+# -*- mode:python; coding:utf-8 -*-
+
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests of document revisions."""
+import json
+import threading
+
+from conftest import authorize
+
+import documents
+
+from fastapi import HTTPException
+
+import pytest
+
+
+def versions(count):
+    """Get count versions of a catalog, each with another title."""
+    obj = documents.catalog()
+    result = []
+    for n in range(count):
+        obj['catalog']['metadata']['title'] = f'Version {n}'
+        result.append(json.dumps(obj))
+    return result
+
+
+@pytest.fixture(params=['sqlite', 'memory', 'filesystem'])
+def revisions_db(request, open_db, config):
+    """Get Db of each engine, with a snapshot every third revision."""
+    config(db_engine=request.param, revision_snapshot_interval=3)
+    return open_db()
+
+
+def test_revisions(revisions_db):
+    """Each replace keeps the replaced version, which is rebuilt exactly from deltas and snapshots."""
+    db = revisions_db
+    payloads = versions(8)
+    db.add('catalog', 'a', payloads[0])
+    for payload in payloads[1:]:
+        assert db.replace('catalog', 'a', payload) == 'a'
+    listed = db.get_revision_list('catalog', 'a')
+    assert [item['revision'] for item in listed] == list(range(1, 9))
+    assert listed[-1]['replaced'] is None
+    for revision, payload in enumerate(payloads, 1):
+        assert json.loads(db.get_revision('catalog', 'a', revision)) == json.loads(payload)
+    assert db.get_revision('catalog', 'a', 0) is None
+    assert db.get_revision('catalog', 'a', 9) is None
+    kinds = db.con.execute('SELECT revision, kind FROM REVISIONS ORDER BY revision;').fetchall()
+    assert [revision for revision, kind in kinds if kind == 'snapshot'] == [3, 6]
+
+
+def test_upsert_revisions(revisions_db):
+    """An upsert keeps a revision only when it replaces."""
+    db = revisions_db
+    payloads = versions(2)
+    db.upsert('catalog', 'a', payloads[0])
+    assert db.get_revision_list('catalog', 'a') == [{'revision': 1, 'replaced': None}]
+    db.upsert('catalog', 'a', payloads[1])
+    assert json.loads(db.get_revision('catalog', 'a', 1)) == json.loads(payloads[0])
+    assert db.get_revision('catalog', 'a', 2) == payloads[1]
+
+
+def test_expected(revisions_db):
+    """A replace expecting another version than the stored one is refused, writing neither it nor a revision."""
+    db = revisions_db
+    payloads = versions(3)
+    db.add('catalog', 'a', payloads[0])
+    with pytest.raises(HTTPException) as e:
+        db.replace('catalog', 'a', payloads[2], expected=payloads[1])
+    assert e.value.status_code == 409
+    assert db.get('catalog', 'a') == payloads[0]
+    assert len(db.get_revision_list('catalog', 'a')) == 1
+    assert db.replace('catalog', 'a', payloads[1], expected=payloads[0]) == 'a'
+    assert db.replace('catalog', 'x', payloads[1], expected=payloads[0]) is None
+
+
+def test_delete_drops_revisions(revisions_db):
+    """Deleting a document deletes its revisions."""
+    db = revisions_db
+    payloads = versions(2)
+    db.add('catalog', 'a', payloads[0])
+    db.replace('catalog', 'a', payloads[1])
+    db.delete('catalog', 'a')
+    assert db.get_revision_list('catalog', 'a') is None
+    assert db.get_revision('catalog', 'a', 1) is None
+
+
+def test_sqlite_revision_in_write(open_db):
+    """With the sqlite engine the revision is added in the write transaction of the document, no lock needed."""
+    db = open_db()
+    assert db.revision_locks is None
+    payloads = versions(2)
+    db.add('catalog', 'a', payloads[0])
+    statements = []
+    db.con.set_trace_callback(statements.append)
+    db.replace('catalog', 'a', payloads[1])
+    db.con.set_trace_callback(None)
+    begin = statements.index('BEGIN IMMEDIATE;')
+    insert = next(n for n, statement in enumerate(statements) if statement.startswith('INSERT INTO REVISIONS'))
+    update = next(n for n, statement in enumerate(statements) if statement.startswith('UPDATE CATALOGS'))
+    commit = statements.index('COMMIT', begin)
+    assert begin < insert < update < commit
+
+
+def test_concurrent_replaces(open_db):
+    """Replaces by two dbs of their own connections, as by two processes, each keep the version they replaced."""
+    dbs = [open_db(), open_db()]
+    payloads = versions(21)
+    dbs[0].add('catalog', 'a', payloads[0])
+
+    def replace(db, start):
+        for payload in payloads[start::2]:
+            db.replace('catalog', 'a', payload)
+
+    threads = [threading.Thread(target=replace, args=(db, start)) for db, start in zip(dbs, [1, 2])]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    rebuilt = [json.loads(dbs[0].get_revision('catalog', 'a', revision)) for revision in range(1, 22)]
+    assert rebuilt[0] == json.loads(payloads[0])
+    assert sorted(obj['catalog']['metadata']['title'] for obj in rebuilt) == sorted(f'Version {n}' for n in range(21))
+
+
+def test_keep_aborts_write(engine):
+    """An exception of keep aborts the write."""
+
+    def keep(old):
+        raise HTTPException(status_code=409, detail='changed')
+
+    engine.add('CATALOGS', 'a', '{"a": 1}')
+    for write in [engine.replace, engine.upsert]:
+        with pytest.raises(HTTPException):
+            write('CATALOGS', 'a', '{"a": 2}', keep=keep)
+    assert engine.get('CATALOGS', 'a') == '{"a": 1}'
+
+
+def test_revision_endpoints(client):
+    """Revisions are listed and got by model type and document id."""
+    obj = documents.catalog()
+    oid = documents.oid(obj)
+    client.post('/catalogs', files={'catalog': documents.dumps(obj)}, headers=authorize)
+    replaced = json.loads(json.dumps(obj))
+    replaced['catalog']['metadata']['title'] = 'Replaced'
+    params = {'catalog_id': oid}
+    client.put('/catalogs/catalog-id', params=params, files={'catalog': documents.dumps(replaced)}, headers=authorize)
+    params = {'model_type': 'catalog', 'document_id': oid}
+    assert [item['revision'] for item in client.get('/revisions/revision-list', params=params).json()] == [1, 2]
+    assert client.get('/revisions/revision-id', params={**params, 'revision': 1}).json() == obj
+    assert client.get('/revisions/revision-id', params={**params, 'revision': 2}).json() == replaced
+    assert client.get('/revisions/revision-id', params={**params, 'revision': 3}).status_code == 404
+    params = {'model_type': 'catalog', 'document_id': 'unknown'}
+    assert client.get('/revisions/revision-list', params=params).status_code == 404
@@ -0,0 +1,149 @@
+# -*- mode:python; coding:utf-8 -*-
+
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests of json schema pre-validation and the json pointers of validation errors."""
+import pickle  # noqa: S403
+import re
+import warnings
+
+import documents
+
+import ingest
+from ingest import IngestError, validate
+
+import pytest
+
+from schema import SchemaError, check, json_pointer, translate_pattern
+
+
+def invalid_catalog(change):
+    """Get upload of catalog changed to be invalid."""
+    obj = documents.catalog()
+    change(obj['catalog'])
+    return documents.dumps(obj)
+
+
+def set_control(key, value):
+    """Get change of a control of the second group of a catalog."""
+
+    def change(catalog):
+        catalog['groups'][1]['controls'][0][key] = value
+
+    return change
+
+
+def set_title(value):
+    """Get change of the metadata title of a catalog."""
+
+    def change(catalog):
+        catalog['metadata']['title'] = value
+
+    return change
+
+
+def drop_title(catalog):
+    """Drop metadata title of catalog."""
+    del catalog['metadata']['title']
+
+
+@pytest.mark.parametrize(
+    'change, pointer',
+    [
+        (set_control('bogus', 1), '/catalog/groups/1/controls/0/bogus'),
+        (set_control('title', 5), '/catalog/groups/1/controls/0/title'),
+        (drop_title, '/catalog/metadata/title'),
+    ],
+)
+def test_validation_error_pointer(change, pointer):
+    """Validation errors locate the offending value, below unions too, by a pointer into the document."""
+    with pytest.raises(IngestError, match=f'failed validation at {re.escape(pointer)}: '):
+        validate('catalog', invalid_catalog(change))
+
+
+def test_validation_error_pointer_missing():
+    """A missing field is located where it is missing, not at the union member it is missing from."""
+    obj = documents.profile()
+    del obj['profile']['imports'][0]['include-all']
+    with pytest.raises(IngestError, match='failed validation at /profile/imports/0/include-all: Field required'):
+        validate('profile', documents.dumps(obj))
+
+
+@pytest.mark.parametrize(
+    'change, pointer',
+    [
+        (set_title(5), '/catalog/metadata/title'),
+        (drop_title, '/catalog/metadata'),
+        (set_control('title', 5), '/catalog/groups'),
+    ],
+)
+def test_schema_validation(monkeypatch, change, pointer):
+    """With schema validation, the schema check fails first, at a pointer into the document.
+
+    Within a union the schema check only locates the union.
+    """
+    monkeypatch.setattr(ingest, 'schema_validation', True)
+    with pytest.raises(IngestError, match=f'failed validation at {re.escape(pointer)}: '):
+        validate('catalog', invalid_catalog(change))
+    assert validate('catalog', documents.dumps(documents.catalog())).uuid
+
+
+def test_check():
+    """The schema check passes valid documents, and raises SchemaError with the pointer of an invalid one."""
+    obj = documents.catalog()
+    contents = documents.dumps(obj)
+    check('catalog', obj)
+    assert documents.dumps(obj) == contents
+    with pytest.raises(SchemaError) as e:
+        check('catalog', {'profile': {}})
+    assert str(e.value) == f'{e.value.pointer}: {e.value.message}'
+
+
+def test_schema_error_pickles():
+    """Schema errors cross process boundaries intact."""
+    error = pickle.loads(pickle.dumps(SchemaError('/catalog/uuid', 'must be string')))  # noqa: S301
+    assert (error.pointer, error.message) == ('/catalog/uuid', 'must be string')
+    assert str(error) == '/catalog/uuid: must be string'
+
+
+def test_json_pointer():
+    """Keys are escaped as RFC 6901 tokens."""
+    assert json_pointer(['catalog', 'a/b', 'c~d', 0]) == '/catalog/a~1b/c~0d/0'
+
+
+def test_translate_pattern():
+    """Unicode classes become python re ranges, in and out of character classes."""
+    pattern = translate_pattern(r'^[\p{L}_][\p{L}\p{N}]*\P{N}$')
+    assert re.match(pattern, 'é1x')
+    assert not re.match(pattern, '1x')
+    assert not re.match(pattern, 'x1')
+
+
+@pytest.mark.parametrize(
+    'pattern, matched, unmatched',
+    [
+        (r'^[_\P{L}]+$', ['_1', '-'], ['a', '_é']),
+        (r'^[\P{L}\P{N}]+$', ['a', '1', '-'], []),
+        (r'^[^_\P{L}]+$', ['aé'], ['a_', '1', '-']),
+        (r'^[^\P{L}\P{N}]$', [], ['a', '1', '-']),
+        (r'^[]\P{N}]$', [']', 'a'], ['1']),
+    ],
+)
+def test_translate_negated_in_class(pattern, matched, unmatched):
+    """Negated unicode classes inside character classes are rewritten, as python re does not nest classes."""
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        compiled = re.compile(translate_pattern(pattern))
+    assert all(compiled.match(value) for value in matched)
+    assert not any(compiled.match(value) for value in unmatched)
@@ -0,0 +1,160 @@
+# -*- mode:python; coding:utf-8 -*-
+
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests of the full text search of documents."""
+import uuid
+
+from conftest import authorize
+
+from db import Db, search_expression
+
+import documents
+
+from fastapi import HTTPException
+
+import pytest
+
+from registry import search_fields
+
+
+def add(db, title, groups=('ac', 'au'), oid=None):
+    """Add catalog of title and groups, returning its id."""
+    obj = documents.catalog(title, groups)
+    oid = oid or documents.oid(obj)
+    db.add('catalog', oid, documents.dumps(obj).decode('utf-8'))
+    return oid
+
+
+def found(db, query, oscal_path=None):
+    """Get ids of documents found by query."""
+    return [item['uuid'] for item in db.search(query, oscal_path)]
+
+
+@pytest.mark.parametrize(
+    'query, expression',
+    [
+        ('access control', '"access" "control"'),
+        ('ac-2.1', '"ac-2.1"'),
+        ('acc*', '"acc"*'),
+        ('*', '"*"'),
+        ('say "hi"', '"say" """hi"""'),
+        ('  ', ''),
+    ],
+)
+def test_search_expression(query, expression):
+    """Each term of the query is quoted and required, a trailing * making a term a prefix."""
+    assert search_expression(query) == expression
+
+
+def test_search_fields():
+    """Ids, titles and text are collected from the elements at any depth, with with-ids and prop values."""
+    obj = {
+        'id': 'x-1',
+        'title': 'Top',
+        'props': [{'name': 'p', 'value': 'propvalue'}],
+        'parts': [{'id': 'x-1_smt', 'prose': 'Some prose', 'with-ids': ['y-2']}],
+    }
+    assert search_fields(obj) == {'ids': ['x-1', 'x-1_smt', 'y-2'], 'titles': ['Top'], 'text': ['propvalue', 'Some prose']}
+
+
+def test_search(open_db):
+    """Documents are found by all terms of the query, best first, and no longer once deleted."""
+    db = open_db()
+    audit = add(db, 'Audit handbook', groups=('au',))
+    access = add(db, 'Access handbook', groups=('ac',))
+    assert set(found(db, 'handbook')) == {audit, access}
+    assert found(db, 'access handbook') == [access]
+    assert found(db, 'ac-1') == [access]
+    assert found(db, 'acc*') == [access]
+    assert found(db, 'handbook', 'profile') == []
+    result = db.search('policy audit')[0]
+    assert (result['type'], result['uuid']) == ('catalog', audit)
+    assert '<mark>' in result['snippet']
+    assert db.search('') == []
+    db.delete('catalog', audit)
+    assert found(db, 'handbook') == [access]
+
+
+def test_replace_reindexes(open_db):
+    """Replacing a document replaces its entry in the index."""
+    db = open_db()
+    add(db, 'First title', oid='a')
+    obj = documents.catalog('Second title')
+    db.replace('catalog', 'a', documents.dumps(obj).decode('utf-8'))
+    assert found(db, 'first') == []
+    assert found(db, 'second') == ['a']
+
+
+def test_search_index_off(open_db, config):
+    """With search-index off documents are not indexed, the index is dropped, and search is refused with 501."""
+    config(search_index=False)
+    db = open_db()
+    add(db, 'Unindexed', oid='a')
+    db.delete('catalog', 'a')
+    assert db.con.execute("SELECT name FROM sqlite_master WHERE name LIKE 'SEARCH%';").fetchall() == []
+    with pytest.raises(HTTPException) as e:
+        db.search('unindexed')
+    assert e.value.status_code == 501
+
+
+def test_filled_when_turned_on(open_db, config):
+    """Turning search-index back on fills the index with the documents stored meanwhile, in one transaction."""
+    db = open_db()
+    add(db, 'Indexed', oid='a')
+    config(search_index=False)
+    db = open_db()
+    add(db, 'Meanwhile', oid='b')
+    config(search_index=True)
+    commits = []
+    original = Db._backfill_search
+
+    def backfill(self):
+        self.con.set_trace_callback(commits.append)
+        original(self)
+        self.con.set_trace_callback(None)
+
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(Db, '_backfill_search', backfill)
+        db = open_db()
+    assert found(db, 'indexed') == ['a']
+    assert found(db, 'meanwhile') == ['b']
+    assert commits.count('COMMIT') == 1
+
+
+def test_memory_engine_not_refilled(open_db, config, monkeypatch):
+    """With the memory engine the index of the documents of a previous process is emptied, not refilled."""
+    config(db_engine='memory')
+    db = open_db()
+    add(db, 'Forgotten', oid='a')
+    assert found(db, 'forgotten') == ['a']
+
+    def backfill(self):
+        raise AssertionError('refilled')
+
+    monkeypatch.setattr(Db, '_backfill_search', backfill)
+    db = open_db()
+    assert found(db, 'forgotten') == []
+
+
+def test_search_endpoint(client):
+    """The search endpoint finds documents of model type, limited in number."""
+    word = f'w{uuid.uuid4().hex}'
+    for _ in range(3):
+        obj = documents.catalog(f'Searched {word}')
+        client.post('/catalogs', files={'catalog': documents.dumps(obj)}, headers=authorize)
+    result = client.get('/search', params={'query': word, 'model_type': 'catalog', 'limit': 2}).json()
+    assert len(result) == 2
+    assert client.get('/search', params={'query': word, 'model_type': 'profile'}).json() == []
+    assert client.get('/search', params={'query': word, 'model_type': 'bogus'}).status_code == 400
@@ -0,0 +1,191 @@
+# -*- mode:python; coding:utf-8 -*-
+
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests of the sqlite engine spread over several database files."""
+import json
+
+import pytest
+
+tname = 'CATALOGS'
+oids = [f'doc-{n:02}' for n in range(20)]
+
+
+@pytest.fixture
+def sharded(open_engine, config):
+    """Get sharded engine, catalogs split into three files and profiles in one of their own."""
+    config(db_shards={tname: 3, 'PROFILES': 1})
+    return open_engine('sharded')
+
+
+def summary(n):
+    """Get summary of document number n."""
+    return {'title': f'Title {n % 7}', 'size': n, 'counts': {}}
+
+
+def add_all(engine):
+    """Add the documents of oids, with summaries."""
+    for n, oid in enumerate(oids):
+        engine.add(tname, oid, json.dumps({'n': n}), summary=summary(n))
+
+
+def test_files(sharded, tmp_path):
+    """Documents are hashed over the files of their table, other tables stay in db-path."""
+    add_all(sharded)
+    engines = sharded.shards[tname]
+    assert all(engine.get_id_list(tname)[0] for engine in engines)
+    assert sorted(oid for engine in engines for oid in engine.get_id_list(tname)[0]) == oids
+    names = sorted(path.name for path in tmp_path.iterdir() if path.suffix == '.sqlite')
+    assert names == [
+        'oscal-catalogs-0.sqlite',
+        'oscal-catalogs-1.sqlite',
+        'oscal-catalogs-2.sqlite',
+        'oscal-profiles.sqlite',
+        'oscal.sqlite',
+    ]
+    sharded.add('SYSTEM_SECURITY_PLANS', 'ssp', '{}')
+    assert sharded.default.get('SYSTEM_SECURITY_PLANS', 'ssp') == '{}'
+
+
+def test_routing(sharded):
+    """Documents are got, replaced and deleted in the file they were added to."""
+    add_all(sharded)
+    for n, oid in enumerate(oids):
+        assert sharded.get(tname, oid) == json.dumps({'n': n})
+    assert sharded.replace(tname, 'doc-03', '{}') == 'doc-03'
+    assert sharded.get(tname, 'doc-03') == '{}'
+    assert sharded.delete(tname, 'doc-04') == 'doc-04'
+    assert sharded.get(tname, 'doc-04') is None
+    assert sharded.replace(tname, 'doc-04', '{}') is None
+
+
+@pytest.mark.parametrize('limit', [1, 3, 7, 20, 50])
+def test_id_list_pages(sharded, limit):
+    """Pages of ids of the files are merged by id, and paged by cursor across the files."""
+    add_all(sharded)
+    ids = []
+    cursor = None
+    while True:
+        page, cursor = sharded.get_id_list(tname, limit, cursor)
+        assert len(page) <= limit
+        ids.extend(page)
+        if cursor is None:
+            break
+    assert ids == oids
+
+
+def test_id_list_by_insertion(sharded):
+    """Tables split into files list ids by id only, tables of a single file also by insertion."""
+    with pytest.raises(NotImplementedError):
+        sharded.get_id_list(tname, order='inserted')
+    for oid in ['b', 'a']:
+        sharded.add('PROFILES', oid, '{}')
+    assert sharded.get_id_list('PROFILES', order='inserted') == (['b', 'a'], None)
+
+
+@pytest.mark.parametrize('sort, descending', [('id', True), ('title', False), ('size', True)])
+def test_summary_pages(sharded, sort, descending):
+    """Pages of summaries of the files are merged by sort, and paged by cursor across the files."""
+    add_all(sharded)
+    expected, cursor = sharded.list_summaries(tname, sort=sort, descending=descending)
+    assert cursor is None
+    assert sorted(item['id'] for item in expected) == oids
+    items = []
+    while True:
+        page, cursor = sharded.list_summaries(tname, sort=sort, descending=descending, limit=3, cursor=cursor)
+        items.extend(page)
+        if cursor is None:
+            break
+    assert items == expected
+    key = {'id': 'id', 'title': 'title', 'size': 'size'}[sort]
+    values = [(item[key], item['id']) for item in items]
+    assert values == sorted(values, reverse=descending)
+
+
+def test_add_many(sharded):
+    """Bulk adds report the rows not added in the order of the rows."""
+    rows = [(tname, oid, '{}', None, None, None) for oid in ['x', 'doc-01', 'y', 'doc-02']]
+    sharded.add('CATALOGS', 'doc-01', '{}')
+    sharded.add('CATALOGS', 'doc-02', '{}')
+    assert sharded.add_many(rows) == [None, 'doc-01 already exists', None, 'doc-02 already exists']
+    assert sharded.get(tname, 'y') == '{}'
+
+
+@pytest.mark.parametrize(
+    'shards, message',
+    [({'BOGUS': 2}, 'unknown table'), ({tname: 0}, 'expected a number'), ({tname: '2'}, 'expected a number')],
+)
+def test_invalid_shards(open_engine, config, shards, message):
+    """Unknown tables and file counts other than positive numbers are refused."""
+    config(db_shards=shards)
+    with pytest.raises(ValueError, match=message):
+        open_engine('sharded')
+
+
+def test_db_of_sharded(open_db, config):
+    """Db stores documents and revisions with the sharded engine."""
+    config(db_engine='sharded', db_shards={tname: 2})
+    db = open_db()
+    for oid in oids[:4]:
+        db.add('catalog', oid, json.dumps({'catalog': {'uuid': oid}}))
+    db.replace('catalog', 'doc-01', json.dumps({'catalog': {'uuid': 'replaced'}}))
+    page = db.get_id_list('catalog', limit=3)
+    assert page['ids'] == oids[:3]
+    assert db.get_id_list('catalog', limit=3, cursor=page['next-cursor']) == {'ids': oids[3:4], 'next-cursor': None}
+    assert json.loads(db.get_revision('catalog', 'doc-01', 1)) == {'catalog': {'uuid': 'doc-01'}}
+
+
+def revision_rows(engine, oid=None):
+    """Get (table, id, revision) rows of the revisions kept in the file of engine."""
+    query = 'SELECT table_name, doc_id, revision FROM REVISIONS ORDER BY doc_id, revision;'
+    return [row for row in engine.con.execute(query).fetchall() if oid is None or row[1] == oid]
+
+
+def test_revisions_beside_documents(open_db, config):
+    """Revisions are kept in the file of their document, committed in the transaction writing it."""
+    config(db_engine='sharded', db_shards={tname: 2})
+    db = open_db()
+    for oid in oids[:4]:
+        db.add('catalog', oid, json.dumps({'catalog': {'uuid': oid}}))
+        db.replace('catalog', oid, json.dumps({'catalog': {'uuid': oid, 'n': 1}}))
+    for oid in oids[:4]:
+        engine = db.engine.document_engine(tname, oid)
+        assert revision_rows(engine, oid) == [(tname, oid, 1)]
+        assert db._revision_con(tname, oid) is engine.con
+    assert revision_rows(db.engine.default) == []
+    statements = []
+    engine = db.engine.document_engine(tname, 'doc-00')
+    engine.con.set_trace_callback(statements.append)
+    db.replace('catalog', 'doc-00', json.dumps({'catalog': {'uuid': 'doc-00', 'n': 2}}))
+    engine.con.set_trace_callback(None)
+    assert [statement for statement in statements if statement in ['BEGIN IMMEDIATE;', 'COMMIT']] == [
+        'BEGIN IMMEDIATE;', 'COMMIT'
+    ]
+    assert any(statement.startswith('INSERT INTO REVISIONS') for statement in statements)
+    db.delete('catalog', 'doc-00')
+    assert revision_rows(engine, 'doc-00') == []
+
+
+def test_revisions_moved_to_files(open_db, config):
+    """Revisions of a split table kept in db-path by a previous version are moved to the files of their documents."""
+    config(db_engine='sharded', db_shards={tname: 2})
+    db = open_db()
+    db.add('catalog', 'doc-00', json.dumps({'catalog': {'uuid': 'doc-00'}}))
+    with db.con as con:
+        query = 'INSERT INTO REVISIONS (table_name, doc_id, revision, kind, codec, payload) VALUES (?, ?, ?, ?, ?, ?);'
+        con.execute(query, [tname, 'doc-00', 1, 'snapshot', None, b'{"catalog": {}}'])
+    db = open_db()
+    assert revision_rows(db.engine.default) == []
+    assert revision_rows(db.engine.document_engine(tname, 'doc-00')) == [(tname, 'doc-00', 1)]
+    assert db.get_revision('catalog', 'doc-00', 1) == '{"catalog": {}}'
@@ -0,0 +1,67 @@
+# -*- mode:python; coding:utf-8 -*-
+
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests of deferred model loading and warm-up."""
+import asyncio
+import os
+import subprocess  # noqa: S404
+import sys
+
+from conftest import dir_app, logger
+
+from ingest import warm_up
+
+from registry import Model, models
+
+from workers import Workers
+
+imported = """
+import sys
+import main
+print(sorted(name for name in sys.modules if name.startswith('trestle.oscal.')))
+"""
+
+
+def test_import_skips_models(tmp_path):
+    """Importing the app does not import the trestle OSCAL models."""
+    env = dict(os.environ, PYTHONPATH=str(dir_app))
+    result = subprocess.run(  # noqa: S603
+        [sys.executable, '-c', imported], cwd=tmp_path, env=env, capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.splitlines()[-1] == '[]'
+
+
+def test_model_type_on_first_use():
+    """The trestle type of a model is resolved on first use, once."""
+    model = Model('catalog', 'CATALOGS', 'catalogs', 'catalog.json')
+    assert 'obm_type' not in vars(model)
+    assert model.obm_type.__name__ == 'Catalog'
+    assert model.obm_type is vars(model)['obm_type']
+
+
+def test_warm_up():
+    """Warm-up loads the type of every model."""
+    assert warm_up() == os.getpid()
+    assert all('obm_type' in vars(model) for model in models.values())
+
+
+def test_workers_warm_up():
+    """Warm-up runs once per process pool worker, at least once."""
+    workers = Workers(logger, 0, 2, 1)
+    try:
+        assert asyncio.run(workers.warm_up(os.getpid)) == [os.getpid()]
+    finally:
+        workers.shutdown()
@@ -0,0 +1,113 @@
+# -*- mode:python; coding:utf-8 -*-
+
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests of the storage engines, each held to the same behavior."""
+from conftest import logger
+
+from fastapi import HTTPException
+
+import pytest
+
+from storage import engines, get_engine
+
+tname = 'CATALOGS'
+
+
+def test_add_get(engine):
+    """Documents are got as added, and added once."""
+    assert engine.add(tname, 'a', '{"a": 1}') == 'a'
+    assert engine.get(tname, 'a') == '{"a": 1}'
+    assert engine.get(tname, 'b') is None
+    with pytest.raises(HTTPException) as e:
+        engine.add(tname, 'a', '{"a": 2}')
+    assert e.value.status_code == 400
+    assert engine.get(tname, 'a') == '{"a": 1}'
+
+
+def test_add_many(engine):
+    """Each row of a bulk add gets its own result."""
+    engine.add(tname, 'a', '{}')
+    rows = [(tname, oid, '{}', None, None, None) for oid in ['b', 'a', 'c']]
+    results = engine.add_many(rows)
+    assert results[0] is None and results[2] is None
+    assert results[1] is not None
+    assert engine.get_id_list(tname)[0] == ['a', 'b', 'c']
+
+
+def test_replace_upsert_delete(engine):
+    """Replace and delete find the document or return None, upsert adds or replaces."""
+    assert engine.replace(tname, 'a', '{"a": 1}') is None
+    assert engine.upsert(tname, 'a', '{"a": 1}') == 'a'
+    assert engine.upsert(tname, 'a', '{"a": 2}') == 'a'
+    assert engine.replace(tname, 'a', '{"a": 3}') == 'a'
+    assert engine.get(tname, 'a') == '{"a": 3}'
+    assert engine.delete(tname, 'a') == 'a'
+    assert engine.delete(tname, 'a') is None
+    assert engine.get(tname, 'a') is None
+
+
+def test_get_by_column(engine):
+    """Documents are found by the value of a secondary index column."""
+    engine.add('PROFILES', 'a', '{"a": 1}', {'profile_mnemonic': 'x'})
+    engine.add('PROFILES', 'b', '{"b": 1}', {'profile_mnemonic': 'y'})
+    engine.replace('PROFILES', 'b', '{"b": 2}', {'profile_mnemonic': 'x'})
+    assert sorted(engine.get_by_column('PROFILES', 'profile_mnemonic', 'x')) == ['{"a": 1}', '{"b": 2}']
+
+
+def test_get_stream(engine):
+    """Documents are streamed in chunks of at most chunk size."""
+    payload = '{"a": "' + 'x' * 100 + '"}'
+    engine.add(tname, 'a', payload)
+    assert engine.get_stream(tname, 'b', 16) is None
+    size, stream = engine.get_stream(tname, 'a', 16)
+    try:
+        chunks = list(stream)
+    finally:
+        stream.close()
+    assert size in (None, len(payload))
+    assert b''.join(chunks) == payload.encode('utf-8')
+    assert max(len(chunk) for chunk in chunks) <= 16
+
+
+def test_filesystem_layout(open_engine, tmp_path):
+    """The filesystem engine stores documents in a trestle workspace layout."""
+    engine = open_engine('filesystem')
+    engine.add(tname, 'a', '{"catalog": {}}')
+    assert (tmp_path / 'oxp.workspace' / 'catalogs' / 'a' / 'catalog.json').read_text() == '{"catalog": {}}'
+    with pytest.raises(HTTPException):
+        engine.get(tname, '../a')
+
+
+@pytest.mark.parametrize('write', ['add', 'upsert'])
+def test_filesystem_failed_add(open_engine, tmp_path, write):
+    """A document the filesystem engine fails to write leaves no directory, so it can be added after."""
+    engine = open_engine('filesystem')
+    with pytest.raises(UnicodeDecodeError):
+        getattr(engine, write)(tname, 'a', b'\xff', {'catalog_id': 'x'})
+    assert not (tmp_path / 'oxp.workspace' / 'catalogs' / 'a').exists()
+    assert engine.add(tname, 'a', '{}') == 'a'
+
+
+def test_engines_persist(open_engine):
+    """Sqlite and filesystem engines keep documents when reopened."""
+    for name in ['sqlite', 'filesystem']:
+        open_engine(name).add(tname, 'a', '{}')
+        assert open_engine(name).get(tname, 'a') == '{}'
+
+
+def test_unknown_engine():
+    """An unknown engine is refused, naming the known ones."""
+    with pytest.raises(ValueError, match=', '.join(engines)):
+        get_engine(logger, 'unknown')
@@ -0,0 +1,101 @@
+# -*- mode:python; coding:utf-8 -*-
+
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests of streaming documents in chunks."""
+from conftest import authorize
+
+import documents
+
+import pytest
+
+tname = 'CATALOGS'
+
+
+def read(opened):
+    """Get (size, chunks) of opened stream, closing it."""
+    size, stream = opened
+    try:
+        return size, list(stream)
+    finally:
+        stream.close()
+
+
+@pytest.mark.parametrize('compression', ['none', 'zlib'])
+def test_blob_stream(open_engine, config, compression):
+    """Payloads over chunk size are read incrementally, in chunks of at most chunk size, with the document size."""
+    config(db_compression=compression)
+    engine = open_engine('sqlite')
+    payload = documents.dumps(documents.catalog(controls=20))
+    engine.add(tname, 'a', payload)
+    size, chunks = read(engine.get_stream(tname, 'a', 256))
+    assert size == len(payload)
+    assert b''.join(chunks) == payload
+    assert len(chunks) > 1
+    assert max(len(chunk) for chunk in chunks) <= 256
+
+
+def test_stream_reads_snapshot(open_engine):
+    """An open stream keeps reading the document as it was when opened."""
+    engine = open_engine('sqlite')
+    payload = documents.dumps(documents.catalog(controls=20))
+    engine.add(tname, 'a', payload)
+    size, stream = engine.get_stream(tname, 'a', 256)
+    first = next(stream)
+    engine.replace(tname, 'a', '{}')
+    try:
+        assert first + b''.join(stream) == payload
+    finally:
+        stream.close()
+    assert engine.get(tname, 'a') == '{}'
+
+
+def test_streams_reuse_connections(open_engine, config):
+    """Streams reuse pooled connections, pooling at most the configured number."""
+    config(db_pooled_connections=1)
+    engine = open_engine('sqlite')
+    engine.add(tname, 'a', documents.dumps(documents.catalog(controls=20)))
+    engine.get(tname, 'a')
+    connections = engine.connections
+    opened = len(connections.connections)
+    for _ in range(3):
+        read(engine.get_stream(tname, 'a', 256))
+    assert len(connections.connections) == opened + 1
+    streams = [engine.get_stream(tname, 'a', 256) for _ in range(2)]
+    assert len(connections.connections) == opened + 2
+    for stream in streams:
+        read(stream)
+    assert (len(connections.connections), len(connections.idle)) == (opened + 1, 1)
+
+
+def test_reset_drops_pooled(open_engine):
+    """Pooled connections opened before a reset are not reused after it."""
+    engine = open_engine('sqlite')
+    connections = engine.connections
+    con = connections.acquire()
+    connections.release(con)
+    connections.reset()
+    assert connections.acquire() is not con
+    assert con not in connections.connections
+
+
+def test_get_streams(client, config):
+    """GET streams the stored document with its Content-Length."""
+    config(download_chunk_size=256)
+    obj = documents.catalog(controls=20)
+    client.post('/catalogs', files={'catalog': documents.dumps(obj)}, headers=authorize)
+    response = client.get('/catalogs/catalog-id', params={'catalog_id': documents.oid(obj)})
+    assert response.headers['content-type'] == 'application/json'
+    assert int(response.headers['content-length']) == len(response.content)
+    assert response.json() == obj
@@ -0,0 +1,208 @@
+# -*- mode:python; coding:utf-8 -*-
+
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests of document summaries, stored at ingest and listed without reading documents."""
+import hashlib
+import uuid
+
+from conftest import authorize
+
+import documents
+
+from fastapi import HTTPException
+
+import pytest
+
+from registry import models, utc_timestamp
+
+import storage
+
+tname = 'CATALOGS'
+model = models['catalog']
+
+
+def summarized(title, version='1.0', last_modified='2022-05-09T07:59:38.490+00:00', controls=3):
+    """Get (payload, summary) of catalog."""
+    obj = documents.catalog(title, controls=controls)
+    obj['catalog']['metadata'].update({'version': version, 'last-modified': last_modified})
+    payload = documents.dumps(obj).decode('utf-8')
+    return payload, model.summarize(payload)
+
+
+def add(engine, specs):
+    """Add catalogs of (oid, title, version, last_modified, controls) specs."""
+    for oid, title, version, last_modified, controls in specs:
+        payload, summary = summarized(title, version, last_modified, controls)
+        engine.add(tname, oid, payload, summary=summary)
+
+
+specs = [
+    ('a', 'Zeta', '1.0', '2022-01-01T00:00:00+00:00', 1),
+    ('b', 'alpha', '2.0', '2022-03-01T00:00:00+02:00', 4),
+    ('c', 'Beta', '1.0', '2022-02-01T00:00:00+00:00', 2),
+    ('d', 'Gamma alpha', '1.0', '2022-04-01T00:00:00+00:00', 3),
+]
+
+
+def test_summarize():
+    """Summaries hold the metadata fields, utc last-modified, size, digest and element counts."""
+    payload, summary = summarized('Summarized', '2.1', '2022-05-09T09:00:00+02:00', controls=4)
+    assert summary == {
+        'title': 'Summarized',
+        'version': '2.1',
+        'oscal-version': '1.0.2',
+        'last-modified': '2022-05-09T07:00:00.000000+00:00',
+        'size': len(payload.encode('utf-8')),
+        'digest': hashlib.sha256(payload.encode('utf-8')).hexdigest(),
+        'counts': {'groups': 2, 'controls': 8, 'params': 8},
+    }
+
+
+def test_utc_timestamp():
+    """Timestamps are normalized to utc, without zone taken as utc, and non timestamps to None."""
+    assert utc_timestamp('2022-05-09T07:59:38-05:00') == '2022-05-09T12:59:38.000000+00:00'
+    assert utc_timestamp('2022-05-09T07:59:38') == '2022-05-09T07:59:38.000000+00:00'
+    assert utc_timestamp('yesterday') is None
+    assert utc_timestamp(None) is None
+
+
+def listed_ids(engine, **kwargs):
+    """Get ids of all summaries listed, a page at a time."""
+    ids = []
+    cursor = None
+    while True:
+        summaries, cursor = engine.list_summaries(tname, limit=1, cursor=cursor, **kwargs)
+        ids.extend(summary['id'] for summary in summaries)
+        if cursor is None:
+            return ids
+
+
+@pytest.mark.parametrize(
+    'sort, descending, expected',
+    [
+        ('id', False, ['a', 'b', 'c', 'd']),
+        ('id', True, ['d', 'c', 'b', 'a']),
+        ('title', False, ['c', 'd', 'a', 'b']),
+        ('version', True, ['b', 'd', 'c', 'a']),
+        ('last-modified', False, ['a', 'c', 'b', 'd']),
+        ('size', True, ['b', 'd', 'c', 'a']),
+    ],
+)
+def test_sort(engine, sort, descending, expected):
+    """Summaries are sorted by field, ties by id, and paged by cursor."""
+    add(engine, specs)
+    assert listed_ids(engine, sort=sort, descending=descending) == expected
+    summaries, cursor = engine.list_summaries(tname, sort=sort, descending=descending)
+    assert [summary['id'] for summary in summaries] == expected
+    assert cursor is None
+
+
+@pytest.mark.parametrize(
+    'filters, expected',
+    [
+        ({'title': 'ALPHA'}, ['b', 'd']),
+        ({'title': '%'}, []),
+        ({'version': '1.0'}, ['a', 'c', 'd']),
+        ({'oscal-version': '1.0.2'}, ['a', 'b', 'c', 'd']),
+        ({'modified-after': '2022-02-01T00:00:00.000000+00:00'}, ['b', 'd']),
+        ({'modified-before': '2022-03-01T00:00:00.000000+00:00', 'version': '1.0'}, ['a', 'c']),
+    ],
+)
+def test_filter(engine, filters, expected):
+    """Summaries are filtered by title substring ignoring case, version, oscal-version and last-modified range."""
+    add(engine, specs)
+    assert listed_ids(engine, filters=filters) == expected
+
+
+def test_summary_follows_document(engine):
+    """Replacing a document replaces its summary, deleting it deletes it."""
+    add(engine, specs[:2])
+    payload, summary = summarized('Replaced')
+    engine.replace(tname, 'a', payload, summary=summary)
+    engine.delete(tname, 'b')
+    summaries, _ = engine.list_summaries(tname)
+    assert summaries == [{'id': 'a', **summary}]
+
+
+def test_cursor_of_other_order(engine):
+    """A cursor is refused by a listing of another order."""
+    add(engine, specs)
+    _, cursor = engine.list_summaries(tname, sort='title', limit=1)
+    with pytest.raises(HTTPException) as e:
+        engine.list_summaries(tname, sort='size', limit=1, cursor=cursor)
+    assert e.value.status_code == 400
+
+
+def test_sqlite_reads_no_payload(open_engine):
+    """The sqlite engine lists summaries from the summaries side table alone."""
+    engine = open_engine('sqlite')
+    add(engine, specs)
+    statements = []
+    engine.con.set_trace_callback(statements.append)
+    engine.list_summaries(tname, sort='title', limit=2)
+    engine.con.set_trace_callback(None)
+    assert statements
+    assert not any(f'FROM {tname}' in statement or 'payload' in statement for statement in statements)
+
+
+def test_sqlite_backfill(open_engine):
+    """Summaries of documents stored before the summaries side table existed are filled in on start."""
+    engine = open_engine('sqlite')
+    add(engine, specs[:2])
+    with engine.con:
+        engine.con.execute('DROP TABLE SUMMARIES;')
+    engine.close()
+    engine = open_engine('sqlite')
+    summaries, _ = engine.list_summaries(tname)
+    assert [summary['title'] for summary in summaries] == ['Zeta', 'alpha']
+    assert summaries[1]['last-modified'] == '2022-02-28T22:00:00.000000+00:00'
+
+
+def test_sqlite_backfill_in_batches(open_engine, monkeypatch):
+    """The summaries backfill reads the stored documents a batch at a time, not all at once."""
+    monkeypatch.setattr(storage, 'backfill_batch_size', 2)
+    engine = open_engine('sqlite')
+    add(engine, specs)
+    with engine.con:
+        engine.con.execute('DROP TABLE SUMMARIES;')
+    engine.close()
+    fetched = []
+    rows = storage.SqliteEngine._stored_rows
+
+    def stored_rows(self, tname):
+        for row in rows(self, tname):
+            fetched.append(row[0])
+            yield row
+
+    monkeypatch.setattr(storage.SqliteEngine, '_stored_rows', stored_rows)
+    engine = open_engine('sqlite')
+    assert fetched == ['a', 'b', 'c', 'd']
+    assert listed_ids(engine) == ['a', 'b', 'c', 'd']
+
+
+def test_summary_list_endpoint(client):
+    """The summary-list endpoint lists summaries of uploaded documents, filtered and sorted."""
+    title = f'Summary {uuid.uuid4()}'
+    for number in range(3):
+        obj = documents.catalog(f'{title} {number}', controls=number + 1)
+        client.post('/catalogs', files={'catalog': documents.dumps(obj)}, headers=authorize)
+    params = {'title': title, 'sort': 'size', 'descending': True, 'limit': 2}
+    page = client.get('/catalogs/summary-list', params=params).json()
+    assert [summary['title'] for summary in page['summaries']] == [f'{title} 2', f'{title} 1']
+    assert page['summaries'][0]['counts'] == {'groups': 2, 'controls': 6, 'params': 6}
+    page = client.get('/catalogs/summary-list', params={**params, 'cursor': page['next-cursor']}).json()
+    assert [summary['title'] for summary in page['summaries']] == [f'{title} 0']
+    assert page['next-cursor'] is None
+    assert client.get('/catalogs/summary-list', params={'sort': 'bogus'}).status_code == 422
@@ -0,0 +1,131 @@
+# -*- mode:python; coding:utf-8 -*-
+
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests of bounded upload reading and the incremental json check."""
+import asyncio
+import io
+
+import documents
+
+from fastapi import FastAPI, HTTPException, UploadFile
+from fastapi.testclient import TestClient
+
+import pytest
+
+from upload import JsonScanError, JsonScanner, UploadLimit, form_overhead, read_upload
+
+
+def scan(contents, chunk_size):
+    """Scan contents in chunks of chunk size."""
+    scanner = JsonScanner()
+    for offset in range(0, len(contents), chunk_size):
+        scanner.feed(contents[offset:offset + chunk_size])
+    scanner.close()
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7, 64, 1 << 20])
+def test_scan_valid(chunk_size):
+    """Valid documents pass in chunks of any size, splitting strings, escapes and multibyte characters."""
+    obj = documents.catalog(title='Quote \\" brace { bracket ] and café ✓')
+    scan(documents.dumps(obj), chunk_size)
+    scan('{"title": "café \\\\", "n": [1, -2.5e3, true, null]}'.encode('utf-8'), chunk_size)
+
+
+@pytest.mark.parametrize(
+    'contents, message',
+    [
+        (b'[1, 2]', 'not an object'),
+        (b'{"a": 1}}', 'unbalanced brackets'),
+        (b'{"a": 1} {"b": 2}', 'content after end of document'),
+        (b'{"a": x}', 'unexpected character'),
+        (b'{"a": "b', 'incomplete document'),
+        (b'{"a": "\xff"}', 'not utf-8'),
+    ],
+)
+def test_scan_invalid(contents, message):
+    """Malformed documents are rejected."""
+    with pytest.raises(JsonScanError, match=message):
+        scan(contents, 3)
+
+
+def read(contents, max_size, chunk_size=4):
+    """Read contents as an upload."""
+    return asyncio.run(read_upload('catalog', UploadFile(io.BytesIO(contents)), max_size, chunk_size))
+
+
+def test_read_upload():
+    """The contents are read whole, with their sha256 digest."""
+    import hashlib
+
+    contents = documents.dumps(documents.catalog())
+    assert read(contents, len(contents)) == (contents, hashlib.sha256(contents).hexdigest())
+
+
+def test_read_upload_too_large():
+    """Contents over max size are refused with 413."""
+    with pytest.raises(HTTPException) as e:
+        read(b'{"a": "' + b'x' * 100 + b'"}', 64)
+    assert e.value.status_code == 413
+
+
+def test_read_upload_malformed():
+    """Malformed contents are refused with 400."""
+    with pytest.raises(HTTPException) as e:
+        read(b'{"a": 1}}', 64)
+    assert e.value.status_code == 400
+
+
+@pytest.fixture
+def limited():
+    """Get client of an app with uploads limited to 16 bytes beyond the form overhead, counting files parsed."""
+    app = FastAPI()
+    app.add_middleware(UploadLimit, max_size=16)
+    parsed = []
+
+    @app.post('/upload')
+    async def upload(document: UploadFile):
+        parsed.append(document.filename)
+        return len(await document.read())
+
+    with TestClient(app) as client:
+        yield client, parsed
+
+
+def test_upload_limit_content_length(limited):
+    """A body with a Content-Length over the limit is refused before its form is parsed."""
+    client, parsed = limited
+    response = client.post('/upload', files={'document': b'x' * (form_overhead + 17)})
+    assert response.status_code == 413
+    assert parsed == []
+
+
+def test_upload_limit_streamed(limited):
+    """A body without Content-Length is refused once more than the limit has been received."""
+    client, parsed = limited
+    head = b'--b\r\nContent-Disposition: form-data; name="document"; filename="a.json"\r\n\r\n'
+    chunks = [head] + [b'x' * 4096] * (form_overhead // 4096 + 1) + [b'\r\n--b--\r\n']
+    headers = {'Content-Type': 'multipart/form-data; boundary=b'}
+    response = client.post('/upload', content=iter(chunks), headers=headers)
+    assert response.status_code == 413
+    assert parsed == []
+
+
+def test_upload_limit_within(limited):
+    """A body within the limit is parsed."""
+    client, parsed = limited
+    response = client.post('/upload', files={'document': ('a.json', b'x' * 1000)})
+    assert response.status_code == 200
+    assert response.json() == 1000
+    assert parsed == ['a.json']
@@ -0,0 +1,84 @@
+# -*- mode:python; coding:utf-8 -*-
+
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests of the validation cache of uploads keyed by content hash."""
+from cache import ValidationCache
+
+from conftest import authorize, logger
+
+import documents
+
+from ingest import Validated
+
+
+def validated(payload):
+    """Get validated entry of payload."""
+    return Validated('id', payload, [], {}, {})
+
+
+def test_key_by_model_type():
+    """The same contents are cached apart per model type."""
+    cache = ValidationCache(logger, 4, 1024)
+    cache.put(cache.key('catalog', 'digest'), validated('a'))
+    assert cache.get(cache.key('catalog', 'digest')).payload == 'a'
+    assert cache.get(cache.key('profile', 'digest')) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_evict_least_recently_used():
+    """Entries beyond max entries evict the least recently used."""
+    cache = ValidationCache(logger, 2, 1024)
+    for name in 'abc':
+        if name == 'c':
+            cache.get(cache.key('catalog', 'a'))
+        cache.put(cache.key('catalog', name), validated(name))
+    assert cache.get(cache.key('catalog', 'b')) is None
+    assert cache.get(cache.key('catalog', 'a')) is not None
+    assert cache.evictions == 1
+
+
+def test_evict_by_bytes():
+    """Entries beyond max bytes are evicted, and an entry over it is not cached."""
+    cache = ValidationCache(logger, 8, 10)
+    cache.put(cache.key('catalog', 'a'), validated('x' * 6))
+    cache.put(cache.key('catalog', 'b'), validated('x' * 6))
+    assert cache.stats()['entries'] == 1
+    assert cache.stats()['bytes'] == 6
+    cache.put(cache.key('catalog', 'c'), validated('x' * 11))
+    assert cache.get(cache.key('catalog', 'c')) is None
+
+
+def test_identical_upload_skips_validation(client, monkeypatch):
+    """Uploading the same contents again is not validated again."""
+    import main
+
+    calls = []
+
+    def validate(oscal_path, contents):
+        calls.append(oscal_path)
+        return main_validate(oscal_path, contents)
+
+    main_validate = main.validate
+    monkeypatch.setattr(main, 'validate', validate)
+    obj = documents.catalog()
+    contents = documents.dumps(obj)
+    oid = documents.oid(obj)
+    assert client.post('/catalogs', files={'catalog': contents}, headers=authorize).status_code == 200
+    params = {'catalog_id': oid}
+    response = client.put('/catalogs/catalog-id', params=params, files={'catalog': contents}, headers=authorize)
+    assert response.status_code == 200
+    assert calls == ['catalog']
+    stats = client.get('/statistics/validation-cache').json()
+    assert stats['hits'] >= 1
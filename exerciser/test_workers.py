@@ -0,0 +1,86 @@
+# -*- mode:python; coding:utf-8 -*-
+
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests of the worker pools keeping validation off the event loop."""
+import asyncio
+import threading
+
+from conftest import logger
+
+from fastapi import HTTPException
+
+import pytest
+
+from workers import Workers
+
+
+@pytest.fixture
+def workers():
+    """Get workers without processes, cpu work running in the thread pool."""
+    workers = Workers(logger, 0, 2, 1)
+    yield workers
+    workers.shutdown()
+
+
+def test_cpu_off_event_loop(workers):
+    """Work runs in a worker thread, not that of the event loop."""
+
+    async def run():
+        return threading.get_ident(), await workers.cpu(threading.get_ident)
+
+    loop_thread, worker_thread = asyncio.run(run())
+    assert loop_thread != worker_thread
+
+
+def test_io_arguments(workers):
+    """Arguments are passed through to the work."""
+    assert asyncio.run(workers.io(divmod, 7, 2)) == (3, 1)
+
+
+def test_queue_full(workers):
+    """Work beyond the queue depth is refused with 503, and the queue drains."""
+    started = threading.Event()
+    release = threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    async def run():
+        pending = asyncio.ensure_future(workers.cpu(block))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        with pytest.raises(HTTPException) as e:
+            await workers.cpu(block)
+        release.set()
+        await pending
+        return e.value.status_code, workers.pending['cpu']
+
+    assert asyncio.run(run()) == (503, 0)
+
+
+def test_cpu_map(workers):
+    """Batches are all run, results in batch order."""
+    assert asyncio.run(workers.cpu_map(sum, [[1, 2], [3], []])) == [3, 3, 0]
+
+
+def test_process_pool():
+    """With processes, cpu work runs in another process."""
+    import os
+
+    workers = Workers(logger, 1, 1, 4)
+    try:
+        assert asyncio.run(workers.cpu(os.getpid)) != os.getpid()
+    finally:
+        workers.shutdown()
@@ -0,0 +1,64 @@
+# -*- mode:python; coding:utf-8 -*-
+
+# Copyright (c) 2022 IBM Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests of single-statement writes and upserts."""
+from conftest import authorize
+
+import documents
+
+tname = 'CATALOGS'
+
+
+def test_sqlite_single_statement_writes(open_engine):
+    """Replace and delete are each one statement, reading no payload to check the document exists."""
+    engine = open_engine('sqlite')
+    engine.add(tname, 'a', '{}')
+    statements = []
+    engine.con.set_trace_callback(statements.append)
+    assert engine.replace(tname, 'a', '{"a": 1}') == 'a'
+    assert engine.replace(tname, 'b', '{"b": 1}') is None
+    assert engine.delete(tname, 'b') is None
+    engine.con.set_trace_callback(None)
+    reads = [statement for statement in statements if statement.startswith('SELECT') and 'payload' in statement]
+    assert reads == []
+
+
+def test_replace_keeps_insertion_order(open_engine):
+    """A replaced document keeps its place in the insertion order."""
+    engine = open_engine('sqlite')
+    for oid in ['a', 'b']:
+        engine.add(tname, oid, '{}')
+    engine.replace(tname, 'a', '{"a": 1}')
+    engine.upsert(tname, 'b', '{"b": 1}')
+    assert engine.get_id_list(tname, None, None, 'inserted')[0] == ['a', 'b']
+
+
+def test_put_create(client):
+    """PUT adds an absent document only when create is set, and its uuid is the id."""
+    obj = documents.catalog()
+    oid = documents.oid(obj)
+    files = {'catalog': documents.dumps(obj)}
+    path = '/catalogs/catalog-id'
+    assert client.put(path, params={'catalog_id': oid}, files=files, headers=authorize).status_code == 404
+    params = {'catalog_id': 'other', 'create': True}
+    assert client.put(path, params=params, files=files, headers=authorize).status_code == 400
+    params = {'catalog_id': oid, 'create': True}
+    response = client.put(path, params=params, files=files, headers=authorize)
+    assert (response.status_code, response.json()) == (200, oid)
+    assert client.get(path, params={'catalog_id': oid}).json() == obj
+    obj['catalog']['metadata']['title'] = 'Upserted'
+    files = {'catalog': documents.dumps(obj)}
+    assert client.put(path, params=params, files=files, headers=authorize).status_code == 200
+    assert client.get(path, params={'catalog_id': oid}).json() == obj
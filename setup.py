@@ -34,9 +34,15 @@ setup(
     packages=find_packages(),
     install_requires=[
         'compliance-trestle',
+        'fastjsonschema',
         'fastapi>=0.73.0',
+        'orjson',
         'uvicorn[standard]',
         'pre-commit',
         'python-multipart',
     ],
+    extras_require={
+        'zstd': ['zstandard'],
+        'test': ['pytest', 'httpx'],
+    },
 )